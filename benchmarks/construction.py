@@ -0,0 +1,156 @@
+"""
+Benchmarks of AST construction.
+
+Usage: python benchmarks/construction.py [benchmark ...]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+
+_CONSTRUCTION_SCRIPT = """
+import sys
+import time
+import claripy
+from claripy.ast.bv import BV
+
+def run(n):
+    xs = [claripy.BVS('x' + str(i), 64, explicit_name=True) for i in range(16)]
+    start = time.perf_counter()
+    keep = []
+    for i in range(n):
+        # raw construction, bypassing the simplifiers, so that only Base.__new__ is measured
+        a = BV('__add__', (xs[i % 16], claripy.BVV(i, 64)), length=64)
+        b = BV('__xor__', (a, xs[(i * 7) % 16]), length=64)
+        c = BV('Extract', (31, 0, b), length=32)
+        keep.append(BV('__mul__', (c, c), length=32))
+        # and a hit for every miss
+        BV('__add__', (xs[i % 16], claripy.BVV(i, 64)), length=64)
+    return 5 * n / (time.perf_counter() - start)
+
+print(max(run(int(sys.argv[1])) for _ in range(3)))
+"""
+
+def bench_hash_engines(n=20000):
+    """
+    The construction rate of ASTs with each hash engine (each in a fresh interpreter).
+    """
+    import claripy
+    for engine in claripy.ast.base.hash_engines:
+        env = dict(os.environ, CLARIPY_HASH_ENGINE=engine)
+        rate = float(subprocess.check_output([sys.executable, '-c', _CONSTRUCTION_SCRIPT, str(n)], env=env))
+        print("%s hash engine: %.0f nodes/sec" % (engine, rate))
+
+_MEMORY_SCRIPT = """
+import gc
+import sys
+import tracemalloc
+import claripy
+from claripy.ast.base import Base
+
+def build(n):
+    # a symbolic-execution-like trace: register updates mixing arithmetic, byte-wise memory loads and branches
+    regs = [ claripy.BVS('r' + str(i), 64) for i in range(8) ]
+    mem = [ claripy.BVS('m' + str(i), 8) for i in range(16) ]
+    constraints = [ ]
+    for i in range(n):
+        load = claripy.Concat(*[ mem[(i + k) % 16] for k in range(8) ])
+        e = (regs[i % 8] + regs[(i * 3 + 1) % 8] * (i + 1)) ^ load
+        e = claripy.If(e[31:0] == i, e + 1, e - i)
+        regs[i % 8] = claripy.ZeroExt(32, e[63:32]) + claripy.SignExt(32, e[31:0])
+        constraints.append(regs[i % 8] == regs[(i + 5) % 8])
+    return constraints
+
+gc.collect()
+tracemalloc.start()
+before = tracemalloc.get_traced_memory()[0]
+keep = build(int(sys.argv[1]))
+gc.collect()
+after = tracemalloc.get_traced_memory()[0]
+print((after - before) / (len(Base._hash_cache) + len(Base._leaf_cache)))
+"""
+
+def bench_memory(n=5000):
+    """
+    The memory used per live AST node (including its args and variable sets) for a typical expression DAG.
+    """
+    per_node = float(subprocess.check_output([sys.executable, '-c', _MEMORY_SCRIPT, str(n)]))
+    print("%.0f bytes/node" % per_node)
+
+def bench_fast_path(n=20000):
+    """
+    The construction rate of ASTs from unannotated arguments (the fast path of Base.__new__()) and from annotated ones
+    (the general path).
+    """
+    import claripy
+    from claripy.ast.bv import BV
+
+    class Marker(claripy.Annotation):
+        eliminatable = True
+        relocatable = False
+
+    for kind in ('unannotated', 'annotated'):
+        xs = [ claripy.BVS('x', 64) for _ in range(16) ]
+        if kind == 'annotated':
+            xs = [ x.annotate(Marker()) for x in xs ]
+        keep = [ ]
+        start = time.perf_counter()
+        for i in range(n):
+            a = BV('__add__', (xs[i % 16], xs[(i + 3) % 16]), length=64)
+            b = BV('__xor__', (a, xs[(i * 7) % 16]), length=64)
+            keep.append(BV('Extract', (31, 0, b), length=32))
+        print("%s construction: %.0f nodes/sec" % (kind, 3 * n / (time.perf_counter() - start)))
+
+def bench_constants(n=5000):
+    """
+    The construction rate of constant-heavy expressions, like the flag computations of lifted x86 code.
+    """
+    import claripy
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    start = time.perf_counter()
+    for i in range(n):
+        a = x + i
+        r = a + y
+        cf = claripy.If(claripy.ULT(r, a), claripy.BVV(1, 1), claripy.BVV(0, 1))
+        zf = claripy.If(r == 0, claripy.BVV(1, 1), claripy.BVV(0, 1))
+        sf = claripy.LShR(r, 31) & 1
+        of = claripy.LShR((a ^ r) & (y ^ r), 31) & 1
+        flags = (of << 11) | (sf << 7) | (zf.zero_extend(31) << 6) | cf.zero_extend(31) | (r & 0xff) | 2
+    print("flag computations: %.0f/sec" % (n / (time.perf_counter() - start)))
+
+def bench_operations(n=20000):
+    """
+    The construction rate of some common operations.
+    """
+    import claripy
+    xs = [ claripy.BVS('x', 32) for _ in range(16) ]
+    bs = [ x == 1 for x in xs ]
+    ops = {
+        '__add__': lambda i: xs[i % 16] + xs[(i + 1) % 16],
+        '__add__ (int)': lambda i: xs[i % 16] + i,
+        '__and__': lambda i: xs[i % 16] & xs[(i + 5) % 16],
+        'Extract': lambda i: xs[i % 16][i % 32:0],
+        'Concat': lambda i: claripy.Concat(xs[i % 16], xs[(i + 3) % 16]),
+        'If': lambda i: claripy.If(bs[i % 16], xs[(i + 1) % 16], xs[(i + 2) % 16]),
+        '__eq__': lambda i: xs[i % 16] == xs[(i + 7) % 16],
+    }
+    for name, f in ops.items():
+        start = time.perf_counter()
+        for i in range(n):
+            f(i)
+        print("%s: %.0f/sec" % (name, n / (time.perf_counter() - start)))
+
+BENCHMARKS = {
+    'hash_engines': bench_hash_engines,
+    'memory': bench_memory,
+    'fast_path': bench_fast_path,
+    'constants': bench_constants,
+    'operations': bench_operations,
+}
+
+if __name__ == '__main__':
+    for _name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[_name]()
@@ -0,0 +1,55 @@
+"""
+Compares converting constraints that share most of their subexpressions one at a time (with Backend.convert) to
+converting them in a batch (with Backend.convert_list), with a z3 backend that does not cache converted objects.
+
+Usage: python benchmarks/convert_list.py [n]
+"""
+
+import sys
+import time
+
+import claripy
+from claripy.backends import BackendZ3
+
+
+class CountingZ3(BackendZ3):
+    """
+    A Z3 backend that does not cache converted objects (like BackendZ3Parallel), and counts the operations that it
+    converts.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._cache_objects = False
+        self.calls = 0
+
+    def _call(self, op, args):
+        self.calls += 1
+        return super()._call(op, args)
+
+def _shared_constraints(n):
+    x = claripy.BVS('x', 32)
+    base = x
+    for i in range(20):
+        base = (base * 7 + i) ^ (base >> 3)
+    return [ (base + i)[7:0] != i for i in range(n) ]
+
+def bench_convert_list(n=3000):
+    b = CountingZ3()
+    cs = _shared_constraints(n)
+
+    start = time.perf_counter()
+    for c in cs:
+        b.convert(c)
+    separate_time, separate_calls = time.perf_counter() - start, b.calls
+
+    b.calls = 0
+    start = time.perf_counter()
+    b.convert_list(cs)
+    batch_time, batch_calls = time.perf_counter() - start, b.calls
+
+    return { 'convert': (separate_calls, separate_time), 'convert_list': (batch_calls, batch_time) }
+
+if __name__ == '__main__':
+    for _kind, (_calls, _time) in bench_convert_list(int(sys.argv[1]) if len(sys.argv) > 1 else 3000).items():
+        print("%s: %d operations in %.3fs" % (_kind, _calls, _time))
@@ -0,0 +1,47 @@
+"""
+Compares the size and load time of the serializer to those of pickle.
+
+Usage: python benchmarks/serialize.py [n]
+"""
+
+import gc
+import pickle
+import sys
+import time
+
+import claripy
+from claripy import serialize
+
+
+def bench_serialize(n=2000):
+    xs = [ claripy.BVS('x%d' % i, 32) for i in range(8) ]
+    asts = [ ]
+    for i in range(n):
+        e = xs[i % 8]
+        for j in range(10):
+            e = claripy.If(e > i + j, e + xs[(i + j) % 8], e * j)
+        asts.append(e)
+
+    pickled = pickle.dumps(asts)
+    serialized = serialize.dumps(asts)
+
+    # the ASTs must really be rebuilt by both loaders
+    keepalive = claripy.ast.set_keepalive_size(0)
+    del asts
+    gc.collect()
+
+    start = time.perf_counter()
+    pickle.loads(pickled)
+    t_pickle = time.perf_counter() - start
+    gc.collect()
+
+    start = time.perf_counter()
+    serialize.loads(serialized)
+    t_serialize = time.perf_counter() - start
+    claripy.ast.set_keepalive_size(keepalive)
+
+    return len(pickled), t_pickle, len(serialized), t_serialize
+
+if __name__ == '__main__':
+    print("pickle: %d bytes, %f seconds; serialize: %d bytes, %f seconds"
+          % bench_serialize(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
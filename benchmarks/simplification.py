@@ -0,0 +1,106 @@
+"""
+Benchmarks of the simplifiers.
+
+Usage: python benchmarks/simplification.py [benchmark ...]
+"""
+
+import sys
+import time
+
+import claripy
+
+
+def bench_rewrite(n=20000, extra_rules=500):
+    """
+    How fast operations are rewritten by the default rules plus `extra_rules` domain rules, looking up the applicable
+    rules in the index versus trying every rule in turn.
+    """
+    from claripy.rewrite_rules import P, V
+
+    sm = claripy.simplifications.SimplificationManager(cache_size=0)
+    for i in range(extra_rules):
+        # rules for shapes that do not occur below
+        sm.add_rule(P('__add__', P('BVV', i, 32), P('__mul__', V('a'), V('b'))), lambda a, b: a)
+        sm.add_rule(P('Not', P('ULT', V('a'), P('BVV', i, 32))), lambda a: a == i)
+    rules = sm.rules
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    ops = [
+        ('Not', (claripy.ULT(x, y),)),
+        ('Not', (claripy.ULT(x, claripy.BVV(1000, 32)),)),
+        ('Reverse', (x.reversed,)),
+        ('__eq__', (claripy.BVV(1, 32), x)),
+        ('__add__', (x, y)),
+        ('Extract', (31, 0, x)),
+        ('ZeroExt', (8, x.zero_extend(8))),
+    ]
+
+    def indexed():
+        for op, args in ops:
+            rules.rewrite(op, args)
+
+    def linear():
+        for op, args in ops:
+            for rule in rules.rules:
+                if rule.apply(op, args) is not None:
+                    break
+
+    for name, f in (('indexed', indexed), ('linear', linear)):
+        start = time.perf_counter()
+        for _ in range(n // len(ops)):
+            f()
+        print("%s rule lookup: %.0f rewrites/sec" % (name, n / (time.perf_counter() - start)))
+
+def _lifted_constraints(n, seed=0):
+    """
+    Constraints like the ones that symbolic execution of a small interpreter loop produces, after some of the inputs
+    were concretized with replace_dict().
+    """
+    import random
+    rng = random.Random(seed)
+    regs = [ claripy.BVS('fix_r%d' % i, 32) for i in range(6) ]
+    inputs = list(regs)
+    constraints = [ ]
+    for i in range(n):
+        a, b = rng.sample(range(len(regs)), 2)
+        k = rng.getrandbits(8)
+        regs[a] = rng.choice([
+            lambda: regs[a] + regs[b] * 4,
+            lambda: claripy.If(regs[b] == k, regs[a] ^ k, regs[a] - 1),
+            lambda: claripy.ZeroExt(24, claripy.Extract(7, 0, regs[a] | regs[b])),
+            lambda: claripy.Concat(regs[a][15:0], regs[b][31:16]),
+            lambda: (regs[a] & 0xff) << 8,
+        ])()
+        constraints.append(claripy.ULT(regs[a], regs[b] + k) if i % 2 else regs[a] != k)
+    concrete = { r.cache_key: claripy.BVV(rng.getrandbits(32), 32) for r in inputs[:3] }
+    return [ c.replace_dict(concrete) for c in constraints ]
+
+def bench_fixpoint(n=2000):
+    """
+    The pure-Python simplification pass compared with Z3's simplifier, on the speed and on the size of the simplified
+    constraints.
+    """
+    constraints = _lifted_constraints(n)
+    print("original: %d nodes" % sum(c.dag_size for c in constraints))
+    for method in ('rules', 'backend'):
+        # each simplification is measured from scratch
+        claripy.simplifications.simpleton.clear_cache()
+        claripy.backends.z3.downsize()
+        start = time.perf_counter()
+        if method == 'rules':
+            # the pass shares its work between the constraints
+            simplified = claripy.simplifications.simpleton.fixpoint(constraints)
+        else:
+            simplified = [ claripy.simplify(c, method=method) for c in constraints ]
+        elapsed = time.perf_counter() - start
+        print("%s: %.3fs, %d nodes" % (method, elapsed, sum(c.dag_size for c in simplified)))
+
+BENCHMARKS = {
+    'rewrite': bench_rewrite,
+    'fixpoint': bench_fixpoint,
+}
+
+if __name__ == '__main__':
+    for _name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[_name]()
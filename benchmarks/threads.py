@@ -0,0 +1,69 @@
+"""
+Reports the aggregate throughput of independent analyses (building expressions and solving them) run on 1 to N threads
+that share the AST caches. Without the GIL, the rates should scale with the number of threads.
+
+Usage: python benchmarks/threads.py [n] [max_threads]
+"""
+
+import os
+import sys
+import threading
+import time
+
+import claripy
+
+
+def _build_trace(prefix, n):
+    xs = [ claripy.BVS(prefix + str(i), 32, explicit_name=True) for i in range(8) ]
+    out = [ ]
+    for i in range(n):
+        e = (xs[i % 8] + i) ^ xs[(i * 3) % 8]
+        out.append(claripy.If(e[15:0] == i, e * 3, e - xs[(i + 1) % 8]))
+    return out
+
+def _threaded_rate(threads, work, n):
+    barrier = threading.Barrier(threads + 1)
+    done = threading.Barrier(threads + 1)
+    retire = [ threading.Event() for _ in range(threads) ]
+
+    def run(t):
+        barrier.wait()
+        work(t, n)
+        done.wait()
+        # z3 can deadlock when several threads tear down their contexts at once, so threads exit one at a time
+        retire[t].wait()
+
+    workers = [ threading.Thread(target=run, args=(t,)) for t in range(threads) ]
+    for w in workers: w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    done.wait()
+    elapsed = time.perf_counter() - start
+    for r, w in zip(retire, workers):
+        r.set()
+        w.join()
+    return threads * n / elapsed
+
+def bench_threads(n=2000, max_threads=4):
+    def construct(t, n):
+        _build_trace('threaded_construct_%d_' % t, n)
+
+    def solve(t, n):
+        x = claripy.BVS('threaded_solve_%d' % t, 32, explicit_name=True)
+        s = claripy.Solver()
+        for i in range(n):
+            s.satisfiable(extra_constraints=((x * (i + 3)) ^ i == i + 1,))
+
+    rates = { }
+    threads = 1
+    while threads <= max_threads:
+        rates['construct/%d' % threads] = _threaded_rate(threads, construct, n)
+        rates['solve/%d' % threads] = _threaded_rate(threads, solve, n // 10)
+        threads *= 2
+    return rates
+
+if __name__ == '__main__':
+    _n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    _max_threads = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    for _kind, _rate in bench_threads(_n, _max_threads).items():
+        print("%s threads: %.0f/sec" % (_kind, _rate))
@@ -0,0 +1,42 @@
+"""
+Compares the generic post-order walker to a hand-written (non-memoizing) recursive walk, on trees without sharing.
+
+Usage: python benchmarks/traversal.py [n]
+"""
+
+import sys
+import time
+
+import claripy
+from claripy.ast import traversal
+
+
+def bench_traversal(n=2000):
+    xs = [ claripy.BVS('x', 32) for _ in range(8) ]
+    es = [ ]
+    for i in range(n):
+        e = xs[i % 8]
+        for j in range(20):
+            e = (e + xs[(i + j) % 8]) * (j + 1)
+        es.append(e)
+
+    def recursive(ast, out):
+        for a in ast.args:
+            if isinstance(a, claripy.ast.Base):
+                recursive(a, out)
+        out.append(ast)
+
+    start = time.perf_counter()
+    for e in es:
+        recursive(e, [ ])
+    t_recursive = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for e in es:
+        list(traversal.postorder(e))
+    t_postorder = time.perf_counter() - start
+
+    return t_recursive, t_postorder
+
+if __name__ == '__main__':
+    print("recursive: %f seconds, postorder: %f seconds" % bench_traversal(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -87,6 +87,7 @@ from .frontend import Frontend as _Frontend
 from . import frontends
 from . import frontend_mixins
 from .solvers import *
+from . import serialize
 
 #
 # Convenient button
@@ -97,7 +98,10 @@ def reset():
     Attempt to refresh any caching state associated with the module
     """
     downsize()
+    from . import simplifications  # pylint:disable=redefined-outer-name
+    simplifications.simpleton.clear_cache()
     from .ast import bv  # pylint:disable=redefined-outer-name
     bv._bvv_cache.clear()
+    bv._intern_constants()
 
 from .debug import set_debug
@@ -12,6 +12,8 @@ if TYPE_CHECKING:
     from .base import Base
     from .strings import String
     from .. import ops as all_operations
+    from .base import cache_stats, reset_cache_stats, set_keepalive_size
+    from .traversal import postorder, preorder, leaves, Rewriter, rewrite
 else:
     Bits = lambda *args, **kwargs: None
     BV = lambda *args, **kwargs: None
@@ -24,10 +26,20 @@ else:
     false = lambda *args, **kwargs: None
     String = lambda *args, **kwargs: None
     all_operations = None
+    cache_stats = lambda *args, **kwargs: None
+    reset_cache_stats = lambda *args, **kwargs: None
+    set_keepalive_size = lambda *args, **kwargs: None
+    postorder = lambda *args, **kwargs: None
+    preorder = lambda *args, **kwargs: None
+    leaves = lambda *args, **kwargs: None
+    Rewriter = lambda *args, **kwargs: None
+    rewrite = lambda *args, **kwargs: None
 
 
 def _import():
     global Bits, BV, VS, FP, Bool, Int, Base, String, true, false, all_operations
+    global cache_stats, reset_cache_stats, set_keepalive_size
+    global postorder, preorder, leaves, Rewriter, rewrite
 
     from .bits import Bits
     from .bv import BV
@@ -38,3 +50,5 @@ def _import():
     from .base import Base
     from .strings import String
     from .. import ops as all_operations
+    from .base import cache_stats, reset_cache_stats, set_keepalive_size
+    from .traversal import postorder, preorder, leaves, Rewriter, rewrite
@@ -1,10 +1,15 @@
+import functools
+import gc
 import itertools
 import logging
 import math
+import operator
 import os
 import struct
+import sys
+import threading
 import weakref
-from collections import OrderedDict, deque
+from collections import Counter, OrderedDict, deque
 from typing import Optional
 
 try:
@@ -28,6 +33,8 @@ md5_unpacker = struct.Struct('2Q')
 
 
 class ASTCacheKey:
+    __slots__ = ('ast', '__weakref__')
+
     def __init__(self, a):
         self.ast = a
 
@@ -35,7 +42,8 @@ class ASTCacheKey:
         return hash(self.ast)
 
     def __eq__(self, other):
-        return type(self) is type(other) and self.ast._hash == other.ast._hash
+        # ASTs are hash-consed, so equal ASTs are the same object, while ASTs whose hashes collide are not
+        return type(self) is type(other) and self.ast is other.ast
 
     def __repr__(self):
         return '<Key %s %s>' % (self.ast._type_name(), self.ast.__repr__(inner=True))
@@ -53,6 +61,529 @@ def _make_name(name, size, explicit_name=False, prefix=""):
     else:
         return name
 
+#
+# Process-stable hashing
+#
+
+def _stable_digest(data: bytes) -> int:
+    return md5_unpacker.unpack(md5.md5(data).digest())[0]
+
+@functools.lru_cache(maxsize=0x10000)
+def _stable_name_hash(name) -> int:
+    """
+    Returns a process-independent 64-bit hash of a variable name.
+    """
+    return _stable_digest(name.encode())
+
+_pack_digest = struct.Struct("<Q").pack
+
+def _stable_object_hash(obj, _active=None) -> int:
+    """
+    Returns a process-independent 64-bit hash of an arbitrary AST argument or annotation, computed from its structure
+    rather than through `hash()`, which depends on the per-process string hash seed (and, for objects that compare by
+    identity, on their address). Containers are hashed from the hashes of their elements, with sets and dicts sorted
+    by them, and other objects from their class and the state they pickle, so equal-looking objects of the same class
+    get the same hash even if they compare by identity. This is sound, since `Base.__new__()` checks every hash-cons
+    hit against the arguments and annotations of the AST. Objects whose state cannot be retrieved (or that contain
+    themselves) are hashed by their class alone.
+    """
+    if isinstance(obj, Base):
+        return obj._hash
+    serialized = Base._arg_serialize(obj)
+    if serialized is not None:
+        return _stable_digest(serialized)
+
+    t = type(obj)
+    if t is int:
+        return _stable_digest(b'n' + obj.to_bytes((obj.bit_length() + 8) // 8, 'little', signed=True))
+    elif t is bytes:
+        return _stable_digest(b'b' + obj)
+    elif t is str:
+        return _stable_name_hash(obj)
+    elif isinstance(obj, type) or callable(obj) and hasattr(obj, '__qualname__'):
+        return _stable_digest(b'g' + ('%s.%s' % (obj.__module__, obj.__qualname__)).encode())
+
+    if _active is None:
+        _active = set()
+    elif id(obj) in _active:
+        return _stable_digest(b'r')
+    _active.add(id(obj))
+    try:
+        if t in (tuple, list):
+            return _stable_digest(b'(' + b''.join(_pack_digest(_stable_object_hash(e, _active)) for e in obj))
+        elif t in (frozenset, set):
+            return _stable_digest(b'{' + b''.join(map(_pack_digest, sorted(_stable_object_hash(e, _active) for e in obj))))
+        elif t is dict:
+            items = sorted((_stable_object_hash(k, _active), _stable_object_hash(v, _active)) for k, v in obj.items())
+            return _stable_digest(b':' + b''.join(_pack_digest(k) + _pack_digest(v) for k, v in items))
+
+        cls_name = ('%s.%s' % (t.__module__, t.__qualname__)).encode()
+        try:
+            reduced = obj.__reduce_ex__(4)
+        except Exception:  # pylint:disable=broad-except
+            l.debug("Object %r cannot be reduced, hashing it by its class", obj)
+            return _stable_digest(b'o' + cls_name)
+        if isinstance(reduced, str):
+            # a global singleton, pickled by name
+            return _stable_digest(b'o' + cls_name + b'.' + reduced.encode())
+        # the constructor arguments and the state, plus the items of list and dict subclasses
+        state = (reduced[1], reduced[2] if len(reduced) > 2 else None,
+                 list(reduced[3]) if len(reduced) > 3 and reduced[3] is not None else None,
+                 dict(reduced[4]) if len(reduced) > 4 and reduced[4] is not None else None)
+        return _stable_digest(b'o' + cls_name + _pack_digest(_stable_object_hash(state, _active)))
+    finally:
+        _active.discard(id(obj))
+
+def _stable_hash(obj) -> int:
+    """
+    Returns a process-independent 64-bit hash of `obj`.
+    """
+    return _stable_object_hash(obj)
+
+def _variables_hash(variables) -> int:
+    """
+    Returns an order-independent, process-independent hash of a set of variable names.
+    """
+    if type(variables) is VariableSet:
+        return variables._vhash
+    return sum(map(_stable_name_hash, variables)) & 0xffff_ffff_ffff_ffff
+
+#
+# Interned variable sets
+#
+
+class VariableSet(frozenset):
+    """
+    An interned, immutable set of variable names, used as the `variables` of every AST.
+
+    Variable sets are deduplicated through a (weak) intern table, so that all ASTs over the same variables share one
+    set object. Since most ASTs have the same variables as one of their children, `Base.__new__()` can usually reuse a
+    child's set instead of building a new one, and comparing the variables of two ASTs is usually an identity check.
+    """
+
+    __slots__ = ('_vhash',)
+
+    def __reduce__(self):
+        return _intern_variables, (frozenset(self),)
+
+_variable_sets = weakref.WeakValueDictionary()
+_variable_sets_lock = threading.RLock()
+
+def _intern_variables(variables) -> VariableSet:
+    """
+    Returns the interned :class:`VariableSet` that is equal to `variables`.
+    """
+    if type(variables) is VariableSet:
+        return variables
+    if not variables:
+        return EMPTY_VARIABLES
+
+    h = sum(map(_stable_name_hash, variables)) & 0xffff_ffff_ffff_ffff
+    interned = _variable_sets.get(h, None)
+    if interned is not None and len(interned) == len(variables) and interned == variables:
+        return interned
+
+    vs = VariableSet(map(sys.intern, variables))
+    vs._vhash = h
+    if interned is None:
+        with _variable_sets_lock:
+            interned = _variable_sets.get(h, None)
+            if interned is None:
+                _variable_sets[h] = vs
+        if interned is not None and len(interned) == len(variables) and interned == variables:
+            # another thread interned the same set first
+            return interned
+    return vs
+
+EMPTY_VARIABLES = VariableSet()
+EMPTY_VARIABLES._vhash = 0
+
+@functools.lru_cache(maxsize=0x1000)
+def _union_variables(a, b) -> VariableSet:
+    """
+    Returns the interned union of two interned variable sets. The same few unions are computed over and over while
+    building an expression, so they are memoized.
+    """
+    return _intern_variables(a | b)
+
+def _annotations_hash(annotations) -> int:
+    """
+    Returns a process-independent hash of a tuple of annotations.
+    """
+    if not annotations:
+        return 0
+    return _stable_digest(b''.join(struct.pack("<Q", _stable_hash(a) & 0xffff_ffff_ffff_ffff) for a in annotations))
+
+#
+# Hash-consing engines
+#
+
+class HashEngine:
+    """
+    A hash engine computes the structural hash that ASTs are hash-consed by. Engines must be deterministic and
+    process-independent: the hash of an AST may only depend on its operation, its arguments (through the hashes of
+    child ASTs) and its `length`, `variables`, `symbolic` and `annotations` keywords.
+
+    The engine in use is selected with :func:`set_hash_engine`, or through the `CLARIPY_HASH_ENGINE` environment
+    variable (one of the names in `hash_engines`).
+    """
+
+    name = None
+
+    def hash(self, op, args, keywords):
+        """
+        Calculates the hash of an AST.
+
+        :param op:          The operation.
+        :param args:        The arguments to the operation.
+        :param keywords:    A dict including the 'symbolic', 'variables', and 'length' items.
+        :returns:           An integer hash.
+        """
+        raise NotImplementedError()
+
+
+class MD5HashEngine(HashEngine):
+    """
+    Hashes a byte serialization of the AST with md5, yielding 64-bit hashes.
+    """
+
+    name = 'md5'
+
+    def hash(self, op, args, keywords):
+        args_tup = tuple(a if type(a) in (int, float, str, bool) or a is None else
+                         a._hash if isinstance(a, Base) else _stable_hash(a) for a in args)
+        # HASHCONS: these attributes key the cache
+        # BEFORE CHANGING THIS, SEE ALL OTHER INSTANCES OF "HASHCONS" IN THIS FILE
+
+        to_hash = Base._ast_serialize(op, args_tup, keywords)
+        if to_hash is None:
+            # fall back to pickle.dumps
+            to_hash = (
+                op, tuple(_stable_hash(a) for a in args_tup),
+                str(keywords.get('length', None)),
+                _variables_hash(keywords['variables']),
+                keywords['symbolic'],
+                _annotations_hash(keywords.get('annotations', None)),
+            )
+            to_hash = pickle.dumps(to_hash, 4)
+
+        # Why do we use md5 when it's broken? Because speed is more important
+        # than cryptographic integrity here. Then again, look at all those
+        # allocations we're doing here... fast python is painful.
+        hd = md5.md5(to_hash).digest()
+        return md5_unpacker.unpack(hd)[0] # 64 bits
+
+
+_MASK64 = 0xffff_ffff_ffff_ffff
+_MASK128 = (1 << 128) - 1
+_MIX_MUL = 0x9e3779b97f4a7c15_f39cc0605cedc835  # odd, from the golden ratio and a random 64-bit prime
+_MIX_FIN = 0xff51afd7ed558ccd_c4ceb9fe1a85ec53
+_TAG_INT = 0x1f83d9abfb41bd6b_5be0cd19137e2179
+_TAG_NEG = 0x6a09e667f3bcc908_bb67ae8584caa73b
+_TAG_FLOAT = 0x3c6ef372fe94f82b_a54ff53a5f1d36f1
+_TAG_STR = 0x510e527fade682d1_9b05688c2b3e6c1f
+_TAG_TUPLE = 0xcbbb9d5dc1059ed8_629a292a367cd507
+_TAG_OBJ = 0x9159015a3070dd17_152fecd8f70e5939
+_TAG_NONE = 0x67332667ffc00b31_8eb44a8768581511
+_TAG_TRUE = 0xdb0c2e0d64f98fa7_47b5481dbefa4fa4
+_TAG_FALSE = 0x243f6a8885a308d3_13198a2e03707344
+_float_packer = struct.Struct('<d')
+_float_unpacker = struct.Struct('<Q')
+
+@functools.lru_cache(maxsize=None)
+def _op_id(op):
+    """
+    Returns a process-stable 128-bit identifier for an operation name.
+    """
+    return int.from_bytes(md5.md5(op.encode()).digest(), 'little')
+
+def _mix_arg(a) -> int:
+    """
+    Maps a non-AST argument to a 128-bit integer for :class:`MixHashEngine`.
+    """
+    ta = type(a)
+    if ta is int:
+        if 0 <= a <= _MASK128:
+            return a ^ _TAG_INT
+        elif -_MASK128 <= a < 0:
+            return -a ^ _TAG_NEG
+        return _stable_digest(a.to_bytes((a.bit_length() + 8) // 8, 'little', signed=True)) ^ _TAG_INT
+    elif a is None:
+        return _TAG_NONE
+    elif a is True:
+        return _TAG_TRUE
+    elif a is False:
+        return _TAG_FALSE
+    elif ta is str:
+        return _stable_name_hash(a) ^ _TAG_STR
+    elif ta is float:
+        return _float_unpacker.unpack(_float_packer.pack(a))[0] ^ _TAG_FLOAT
+    elif ta is tuple:
+        h = _TAG_TUPLE
+        for e in a:
+            h = ((h ^ (e._hash if isinstance(e, Base) else _mix_arg(e))) * _MIX_MUL) & _MASK128
+        return h
+    return _stable_hash(a) ^ _TAG_OBJ
+
+
+class MixHashEngine(HashEngine):
+    """
+    A non-cryptographic engine that folds the hashes of child ASTs, the operation ID and the keywords into a 128-bit
+    hash with a multiply-xor mixing function. This avoids serializing the arguments to bytes, and is considerably
+    faster than :class:`MD5HashEngine`. Since it is not collision resistant, `Base.__new__` checks every cache hit
+    against the structure of the AST being built.
+    """
+
+    name = 'mix'
+
+    def hash(self, op, args, keywords):
+        h = _op_id(op)
+        for a in args:
+            h = ((h ^ (a._hash if isinstance(a, Base) else _mix_arg(a))) * _MIX_MUL) & _MASK128
+
+        # HASHCONS: these attributes key the cache
+        # BEFORE CHANGING THIS, SEE ALL OTHER INSTANCES OF "HASHCONS" IN THIS FILE
+        length = keywords.get('length', None)
+        h = ((h ^ (_TAG_NONE if length is None else _mix_arg(length))) * _MIX_MUL) & _MASK128
+        variables = keywords['variables']
+        if variables:
+            h = ((h ^ _variables_hash(variables)) * _MIX_MUL) & _MASK128
+        if keywords['symbolic']:
+            h = ((h ^ _TAG_TRUE) * _MIX_MUL) & _MASK128
+        annotations = keywords.get('annotations', None)
+        if annotations:
+            h = ((h ^ _annotations_hash(annotations)) * _MIX_MUL) & _MASK128
+
+        # finalize, so that the high bits influence the low bits (which are used by dicts)
+        h ^= h >> 64
+        h = (h * _MIX_FIN) & _MASK128
+        h ^= h >> 61
+        return h
+
+hash_engines = {
+    MD5HashEngine.name: MD5HashEngine,
+    MixHashEngine.name: MixHashEngine,
+}
+
+def set_hash_engine(engine):
+    """
+    Selects the engine used to hash-cons ASTs.
+
+    The hash of an AST is built from the hashes of its children, so the engine cannot be switched while any non-leaf
+    AST is alive. The hashes of the live leaves (such as the preloaded constants) are recomputed with the new engine,
+    and the caches that claripy keys by hash are dropped, so that ASTs get the same hashes as in a process that used
+    the new engine from the start. Dicts keyed by ASTs outside of claripy must not be kept across the switch.
+
+    :param engine:  A :class:`HashEngine` instance, or the name of one of the engines in `hash_engines`.
+    :returns:       The previously used engine.
+    :raises ClaripyOperationError: If non-leaf ASTs are alive.
+    """
+    if isinstance(engine, str):
+        engine = hash_engines[engine]()
+    with _keepalive_lock:
+        if _keepalive is not None:
+            _keepalive.clear()
+    gc.collect()
+    alive = len(list(Base._hash_cache.values()))
+    if alive:
+        raise ClaripyOperationError("cannot switch the hash engine while %d non-leaf ASTs are alive" % alive)
+
+    old = Base._hash_engine
+    Base._hash_engine = engine
+    Base._hash_collisions.clear()
+    for leaf in list(Base._leaf_cache.values()):
+        leaf._hash = engine.hash(leaf.op, leaf.args, {
+            'length': leaf.length, 'variables': leaf.variables, 'symbolic': leaf.symbolic,
+            'annotations': leaf.annotations,
+        })
+    backends.downsize()
+    simplifications.simpleton.clear_cache()
+    _canonical_constraints_cache.clear()
+    return old
+
+#
+# Hash-consing statistics and the keep-alive tier
+#
+
+class HashConsStats:
+    """
+    Counters of hash-consing lookups in `Base.__new__()`.
+
+    The counters are bumped without a lock, to keep lookups lock-free. When ASTs are built on several threads at once,
+    some increments can be lost, so the counts (and the hit rates derived from them) are only approximate.
+    """
+
+    __slots__ = ('leaf_hits', 'leaf_misses', 'interior_hits', 'interior_misses', 'collisions', 'keepalive_evictions')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.leaf_hits = 0
+        self.leaf_misses = 0
+        self.interior_hits = 0
+        self.interior_misses = 0
+        self.collisions = 0
+        self.keepalive_evictions = 0
+
+_hashcons_stats = HashConsStats()
+
+# Publishing a new AST in the hash-cons caches is serialized by a lock, picked by the AST's key. Lookups are lock-free,
+# and ASTs with different keys can be published concurrently (unless their keys share a lock).
+_HASHCONS_LOCK_MASK = 0x3f
+_hashcons_locks = tuple(threading.RLock() for _ in range(_HASHCONS_LOCK_MASK + 1))
+
+def _hashcons_lock(cache_key):
+    return _hashcons_locks[hash(cache_key) & _HASHCONS_LOCK_MASK]
+
+# A strong-reference LRU of recently built or looked-up ASTs, keyed by id(). Without it, a subexpression whose last
+# reference dies is freed, and has to be rebuilt (re-hashed, re-simplified, re-converted by the backends) the next
+# time it is needed. Disabled (None) by default. Reads and updates are serialized by `_keepalive_lock`.
+_keepalive = None
+_keepalive_size = 0
+_keepalive_lock = threading.RLock()
+
+def _keep_alive(ast):
+    with _keepalive_lock:
+        keepalive = _keepalive
+        if keepalive is None:
+            return
+        k = id(ast)
+        if k in keepalive:
+            keepalive.move_to_end(k)
+        else:
+            keepalive[k] = ast
+            if len(keepalive) > _keepalive_size:
+                keepalive.popitem(last=False)
+                _hashcons_stats.keepalive_evictions += 1
+
+def set_keepalive_size(size):
+    """
+    Configures the strong-reference "keep-alive" tier of the hash-cons caches: the `size` most recently built or
+    looked-up ASTs are kept alive even when nothing else references them.
+
+    :param size:    The number of ASTs to keep alive. 0 disables the tier.
+    :returns:       The previous size.
+    """
+    global _keepalive, _keepalive_size #pylint:disable=global-statement
+    old = _keepalive_size
+    if size < 0:
+        raise ValueError("keep-alive size must be non-negative")
+    with _keepalive_lock:
+        if not size:
+            _keepalive = None
+        else:
+            if _keepalive is None:
+                _keepalive = OrderedDict()
+            while len(_keepalive) > size:
+                _keepalive.popitem(last=False)
+        _keepalive_size = size
+    return old
+
+def cache_stats(by_op=True):
+    """
+    Reports the state of the hash-cons caches.
+
+    :param by_op:   Whether to break down the live ASTs by operation and type. This walks the caches, so it is linear
+                    in the number of live ASTs.
+    :returns:       A dict with the counts of live leaf and interior ASTs, the hit/miss counters of hash-consing (see
+                    :class:`HashConsStats`), their hit rates, and the state of the keep-alive tier.
+    """
+    leaves = list(Base._leaf_cache.values())
+    interior = list(Base._hash_cache.values())
+    st = _hashcons_stats
+    leaf_lookups = st.leaf_hits + st.leaf_misses
+    interior_lookups = st.interior_hits + st.interior_misses
+
+    stats = {
+        'live': len(leaves) + len(interior),
+        'live_leaves': len(leaves),
+        'live_interior': len(interior),
+        'leaf_hits': st.leaf_hits,
+        'leaf_misses': st.leaf_misses,
+        'leaf_hit_rate': st.leaf_hits / leaf_lookups if leaf_lookups else 0.0,
+        'interior_hits': st.interior_hits,
+        'interior_misses': st.interior_misses,
+        'interior_hit_rate': st.interior_hits / interior_lookups if interior_lookups else 0.0,
+        'hit_rate': (st.leaf_hits + st.interior_hits) / (leaf_lookups + interior_lookups) if leaf_lookups + interior_lookups else 0.0,
+        'collisions': st.collisions,
+        'keepalive_size': _keepalive_size,
+        'keepalive_count': len(_keepalive) if _keepalive is not None else 0,
+        'keepalive_evictions': st.keepalive_evictions,
+    }
+
+    if by_op:
+        stats['by_op'] = dict(Counter(a.op for a in itertools.chain(leaves, interior)))
+        stats['by_type'] = dict(Counter(type(a).__name__ for a in itertools.chain(leaves, interior)))
+
+    return stats
+
+def reset_cache_stats():
+    """
+    Resets the hit/miss counters reported by :func:`cache_stats`.
+    """
+    _hashcons_stats.reset()
+
+#
+# Rarely-used AST fields
+#
+
+class _SideTable:
+    """
+    A table of rarely-set AST fields, keyed by node identity.
+
+    Most ASTs never have their ITE-excavated form computed, are not created in under-constrained mode, and carry no
+    annotations, so storing these fields in slots on every node wastes memory. Entries are dropped when their node
+    dies.
+    """
+
+    __slots__ = ('_entries',)
+
+    _SELF = object()
+
+    def __init__(self):
+        self._entries = { }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, ast, field, default=None):
+        entry = self._entries.get(id(ast), None)
+        if entry is None:
+            return default
+        value = entry[1].get(field, default)
+        return ast if value is _SideTable._SELF else value
+
+    def set(self, ast, field, value):
+        i = id(ast)
+        entry = self._entries.get(i, None)
+        if value is None:
+            if entry is not None:
+                entry[1].pop(field, None)
+            return
+        if entry is None:
+            # setdefault, so that two threads adding the first field of a node do not drop each other's entry
+            entry = self._entries.setdefault(i, (weakref.ref(ast, functools.partial(self._entries.pop, i)), { }))
+        # a node referring to itself (e.g., an AST that is its own excavated form) would otherwise never die
+        entry[1][field] = _SideTable._SELF if value is ast else value
+
+_side_table = _SideTable()
+
+# Layout of Base._flags
+_FLAG_SYMBOLIC = 0x1
+_FLAG_SIMPLIFIED_SHIFT = 1
+_FLAG_SIMPLIFIED_MASK = 0x3 << _FLAG_SIMPLIFIED_SHIFT
+_FLAG_UNINITIALIZED_SHIFT = 3
+_FLAG_UNINITIALIZED_MASK = 0x3 << _FLAG_UNINITIALIZED_SHIFT
+# the remaining bits record the backends that failed to convert the AST (see Backend._errored_flag)
+ERRORED_FLAG_BASE = 0x20
+_FLAG_ERRORED_MASK = ~(ERRORED_FLAG_BASE - 1)
+
+_EMPTY_ANNOTATIONS = frozenset()
+
+# the keyword arguments that Base.__new__() handles on its fast path
+_FAST_PATH_KWARGS = frozenset(('length', 'uninitialized'))
+
 def _d(h, cls, state):
     """
     This function is the deserializer for ASTs.
@@ -81,12 +612,15 @@ class Base:
     :ivar args:                     The arguments that are being used
     """
 
-    __slots__ = [ 'op', 'args', 'variables', 'symbolic', '_hash', '_simplified', '_cached_encoded_name',
-                  '_cache_key', '_errored', '_eager_backends', 'length', '_excavated', '_burrowed', '_uninitialized',
-                  '_uc_alloc_depth', 'annotations', 'simplifiable', '_uneliminatable_annotations', '_relocatable_annotations',
-                  'depth', '__weakref__']
+    # Rarely-used fields (the ITE-excavated and -burrowed forms, the UC allocation depth, and the annotation sets
+    # that only exist on annotated ASTs) live in _side_table, and boolean-ish state is packed into _flags.
+    __slots__ = [ 'op', 'args', 'variables', 'length', 'annotations', 'depth', '_hash', '_flags', '_cache_key_obj',
+                  '__weakref__']
     _hash_cache = weakref.WeakValueDictionary()
+    # the other ASTs whose hashes collide with the one in _hash_cache, as lists of weak references keyed by the hash
+    _hash_collisions = { }
     _leaf_cache = weakref.WeakValueDictionary()
+    _hash_engine = None
 
     FULL_SIMPLIFY=1
     LITE_SIMPLIFY=2
@@ -121,6 +655,35 @@ class Base:
 
         a_args = args if type(args) is tuple else tuple(args)
 
+        # Fast path for the common case of an operation (not a leaf) that is built from unannotated arguments, with no
+        # keyword arguments other than length/uninitialized. Besides skipping the keyword checks, this avoids all the
+        # annotation bookkeeping below.
+        if hash is None and add_variables is None and (not kwargs or _FAST_PATH_KWARGS.issuperset(kwargs)) and \
+                op not in operations.leaf_operations:
+            flags = 0
+            variables = EMPTY_VARIABLES
+            arg_max_depth = 0
+            for a in a_args:
+                if not isinstance(a, Base): continue
+                if a.annotations: break
+                flags |= a._flags
+                av = a.variables
+                if av is not variables and av:
+                    if not variables or variables <= av:
+                        variables = av
+                    elif not av <= variables:
+                        variables = _union_variables(variables, av)
+                if arg_max_depth < a.depth: arg_max_depth = a.depth
+            else:
+                # concrete ASTs might still be evaluated eagerly, which is left to the general path
+                if flags & _FLAG_SYMBOLIC or not backends._eager_backends:
+                    kwargs['symbolic'] = bool(flags & _FLAG_SYMBOLIC)
+                    kwargs['variables'] = variables
+                    kwargs['errored'] = flags & _FLAG_ERRORED_MASK
+                    kwargs['annotations'] = ()
+                    return cls._hashcons(op, a_args, kwargs, cls._hash_cache, Base._calc_hash(op, a_args, kwargs),
+                                         None, arg_max_depth + 1, _EMPTY_ANNOTATIONS, _EMPTY_ANNOTATIONS)
+
         # initialize the following properties: symbolic, variables and errored
         need_symbolic = 'symbolic' not in kwargs
         need_variables = 'variables' not in kwargs
@@ -131,28 +694,34 @@ class Base:
         # there.
         arg_max_depth = 0
         if need_symbolic or need_variables or need_errored:
-            symbolic_flag = False
-            variables_set = set()
-            errored_set = set()
+            flags = 0
+            variables = EMPTY_VARIABLES
             for a in a_args:
                 if not isinstance(a, Base): continue
-                if need_symbolic and not symbolic_flag: symbolic_flag |= a.symbolic
-                if need_variables: variables_set |= a.variables
-                if need_errored: errored_set |= a._errored
+                flags |= a._flags
+                if need_variables:
+                    # the variables of most ASTs are the variables of one of their children, so we avoid building a
+                    # new set unless we have to
+                    av = a.variables
+                    if av is not variables and av:
+                        if not variables or variables <= av:
+                            variables = av
+                        elif not av <= variables:
+                            variables = _union_variables(variables, av)
                 if args_have_annotations is not True:
                     args_have_annotations = args_have_annotations or bool(a.annotations)
                 if arg_max_depth < a.depth: arg_max_depth = a.depth
 
-            if need_symbolic: kwargs['symbolic'] = symbolic_flag
-            if need_variables: kwargs['variables'] = frozenset(variables_set)
-            if need_errored: kwargs['errored'] = errored_set
-
-        if type(kwargs['variables']) is not frozenset:  #pylint:disable=unidiomatic-typecheck
-            kwargs['variables'] = frozenset(kwargs['variables'])
+            if need_symbolic: kwargs['symbolic'] = bool(flags & _FLAG_SYMBOLIC)
+            if need_variables: kwargs['variables'] = variables
+            if need_errored: kwargs['errored'] = flags & _FLAG_ERRORED_MASK
 
         if add_variables:
             kwargs['variables'] = kwargs['variables'] | add_variables
 
+        if type(kwargs['variables']) is not VariableSet:  #pylint:disable=unidiomatic-typecheck
+            kwargs['variables'] = _intern_variables(kwargs['variables'])
+
         eager_backends = list(backends._eager_backends) if 'eager_backends' not in kwargs else kwargs['eager_backends']
 
         if not kwargs['symbolic'] and eager_backends is not None and op not in operations.leaf_operations:
@@ -188,8 +757,8 @@ class Base:
             skip_child_annotations = False
 
         if not annotations and not args_have_annotations:
-            uneliminatable_annotations = frozenset()
-            relocatable_annotations = frozenset()
+            uneliminatable_annotations = _EMPTY_ANNOTATIONS
+            relocatable_annotations = _EMPTY_ANNOTATIONS
         else:
             ast_args = tuple(a for a in a_args if isinstance(a, Base))
             uneliminatable_annotations = frozenset(itertools.chain(
@@ -209,38 +778,122 @@ class Base:
 
         kwargs['annotations'] = annotations
 
-        cache = cls._hash_cache
-        if hash is not None:
-            h = hash
-        elif op in {'BVS', 'BVV', 'BoolS', 'BoolV', 'FPS', 'FPV'} and not annotations:
+        if op in {'BVS', 'BVV', 'BoolS', 'BoolV', 'FPS', 'FPV'} and not annotations:
             if op == "FPV" and a_args[0] == 0.0 and math.copysign(1, a_args[0]) < 0:
                 # Python does not distinguish between +0.0 and -0.0 so we add sign to tuple to distinguish
-                h = (op, kwargs.get('length', None), ("-",) + a_args)
+                cache_key = (op, kwargs.get('length', None), ("-",) + a_args)
             elif op == "FPV" and math.isnan(a_args[0]):
                 # cannot compare nans
-                h = (op, kwargs.get('length', None), ('nan',) + a_args[1:])
+                cache_key = (op, kwargs.get('length', None), ('nan',) + a_args[1:])
             else:
-                h = (op, kwargs.get('length', None), a_args)
+                cache_key = (op, kwargs.get('length', None), a_args)
 
             cache = cls._leaf_cache
         else:
-            h = Base._calc_hash(op, a_args, kwargs) if hash is None else hash
-        self = cache.get(h, None)
-        if self is None:
-            self = super(Base, cls).__new__(cls)
-            depth = arg_max_depth + 1
-            self.__a_init__(op, a_args, depth=depth,
-                            uneliminatable_annotations=uneliminatable_annotations,
-                            relocatable_annotations=relocatable_annotations,
-                            **kwargs)
-            self._hash = h
-            cache[h] = self
-        #else:
-        #   if self.args != a_args or self.op != op or self.variables != kwargs['variables']:
-        #       raise Exception("CRAP -- hash collision")
+            cache_key = Base._calc_hash(op, a_args, kwargs) if hash is None else hash
+            cache = cls._hash_cache
+        return cls._hashcons(op, a_args, kwargs, cache, cache_key, hash, arg_max_depth + 1,
+                             uneliminatable_annotations, relocatable_annotations)
+
+    @classmethod
+    def _hashcons(cls, op, a_args, kwargs, cache, cache_key, hash, depth, uneliminatable_annotations,
+                  relocatable_annotations): #pylint:disable=redefined-builtin
+        """
+        Returns the AST stored under `cache_key` in `cache` if there is one (and it really is the AST described by
+        the other arguments), or creates and stores it otherwise.
+        """
+        interior = cache is cls._hash_cache
+        self = cache.get(cache_key, None)
+        if self is not None and (not interior or self._hashcons_matches(op, a_args, kwargs)):
+            if interior:
+                _hashcons_stats.interior_hits += 1
+            else:
+                _hashcons_stats.leaf_hits += 1
+        else:
+            # a colliding AST may hold the slot, or the AST that held it may be gone while colliding ones are alive
+            self = cls._hashcons_chained(cache_key, op, a_args, kwargs) if interior else None
+            if self is not None:
+                _hashcons_stats.interior_hits += 1
+            else:
+                self = cls._hashcons_publish(op, a_args, kwargs, cache, cache_key, hash, depth,
+                                             uneliminatable_annotations, relocatable_annotations)
+        if _keepalive is not None:
+            _keep_alive(self)
 
         return self
 
+    @classmethod
+    def _hashcons_chained(cls, h, op, args, kwargs):
+        """
+        Looks for the AST described by the arguments among the ASTs that collide on the hash `h`.
+        """
+        chain = cls._hash_collisions.get(h, None)
+        if chain is None:
+            return None
+        for ref in chain:
+            a = ref()
+            if a is not None and a._hashcons_matches(op, args, kwargs):
+                return a
+        return None
+
+    @classmethod
+    def _hashcons_publish(cls, op, a_args, kwargs, cache, cache_key, hash, depth, uneliminatable_annotations,
+                          relocatable_annotations): #pylint:disable=redefined-builtin
+        """
+        Creates the AST described by the arguments, and publishes it in the hash-cons caches, unless another thread
+        published it first.
+
+        Structurally different ASTs whose hashes collide keep their (equal) hashes: the first one goes to `cache`,
+        and the others to a chain in `_hash_collisions`, so that hashes never depend on the order in which ASTs are
+        built.
+        """
+        interior = cache is cls._hash_cache
+        # The AST is built outside of the lock, and only published if no other thread has published one in the
+        # meantime. The losing thread's AST is dropped, so that every structure has exactly one live AST.
+        new = super(Base, cls).__new__(cls)
+        new.__a_init__(op, a_args, depth=depth,
+                       uneliminatable_annotations=uneliminatable_annotations,
+                       relocatable_annotations=relocatable_annotations,
+                       **kwargs)
+        with _hashcons_lock(cache_key):
+            head = cache.get(cache_key, None)
+            if head is not None and (not interior or head._hashcons_matches(op, a_args, kwargs)):
+                self = head
+            else:
+                self = cls._hashcons_chained(cache_key, op, a_args, kwargs) if interior else None
+            if self is not None:
+                if interior:
+                    _hashcons_stats.interior_hits += 1
+                else:
+                    _hashcons_stats.leaf_hits += 1
+                return self
+
+            if interior:
+                new._hash = cache_key
+            else:
+                # leaves are keyed by their arguments, but still get a process-stable structural hash
+                new._hash = Base._calc_hash(op, a_args, kwargs) if hash is None else hash
+
+            if head is None:
+                cache[cache_key] = new
+                chain = cls._hash_collisions.get(cache_key, None) if interior else None
+                if chain is not None and all(r() is None for r in chain):
+                    del cls._hash_collisions[cache_key]
+            else:
+                l.warning("Hash collision between %s and a new %s AST", head.op, op)
+                _hashcons_stats.collisions += 1
+                chain = cls._hash_collisions.get(cache_key, None)
+                if chain is None:
+                    chain = cls._hash_collisions[cache_key] = [ ]
+                chain[:] = [ r for r in chain if r() is not None ]
+                chain.append(weakref.ref(new))
+
+        if interior:
+            _hashcons_stats.interior_misses += 1
+        else:
+            _hashcons_stats.leaf_misses += 1
+        return new
+
     def __reduce__(self):
         # HASHCONS: these attributes key the cache
         # BEFORE CHANGING THIS, SEE ALL OTHER INSTANCES OF "HASHCONS" IN THIS FILE
@@ -252,40 +905,44 @@ class Base:
     @staticmethod
     def _calc_hash(op, args, keywords):
         """
-        Calculates the hash of an AST, given the operation, args, and kwargs.
+        Calculates the hash of an AST, given the operation, args, and kwargs, using the current hash engine.
 
         :param op:                  The operation.
         :param args:                The arguments to the operation.
         :param keywords:            A dict including the 'symbolic', 'variables', and 'length' items.
         :returns:                   a hash.
 
-        We do it using md5 to avoid hash collisions.
-        (hash(-1) == hash(-2), for example)
+        The resulting hash only depends on the structure of the AST, and never on Python's per-process (randomized)
+        `hash()`, so it is identical across processes (that use the same engine) and can be used as a key in
+        cross-process or on-disk caches.
+        """
+        return Base._hash_engine.hash(op, args, keywords)
+
+    def _hashcons_matches(self, op, args, keywords):
+        """
+        Checks whether this AST is the one that `Base.__new__()` is being asked to build. Used to detect hash
+        collisions on cache hits.
         """
-        args_tup = tuple(a if type(a) in (int, float) else getattr(a, '_hash', hash(a)) for a in args)
         # HASHCONS: these attributes key the cache
         # BEFORE CHANGING THIS, SEE ALL OTHER INSTANCES OF "HASHCONS" IN THIS FILE
-
-        to_hash = Base._ast_serialize(op, args_tup, keywords)
-        if to_hash is None:
-            # fall back to pickle.dumps
-            to_hash = (
-                op, args_tup,
-                str(keywords.get('length', None)),
-                hash(keywords['variables']),
-                keywords['symbolic'],
-                hash(keywords.get('annotations', None)),
-            )
-            to_hash = pickle.dumps(to_hash, -1)
-
-        # Why do we use md5 when it's broken? Because speed is more important
-        # than cryptographic integrity here. Then again, look at all those
-        # allocations we're doing here... fast python is painful.
-        hd = md5.md5(to_hash).digest()
-        return md5_unpacker.unpack(hd)[0] # 64 bits
+        # `length` is left out: it is determined by the operation and its arguments, and some subclasses (String)
+        # rescale it in __init__()
+        if self.op != op or len(self.args) != len(args):
+            return False
+        for a, b in zip(self.args, args):
+            if a is not b and (type(a) is not type(b) or isinstance(a, Base) or a != b):
+                return False
+        # variable sets are interned, but the interning table hands out uninterned sets when their hashes collide
+        variables = keywords['variables']
+        return self.symbolic == keywords['symbolic'] and (self.variables is variables or self.variables == variables) \
+            and self.annotations == keywords['annotations']
 
     @staticmethod
     def _arg_serialize(arg) -> Optional[bytes]:
+        """
+        Serializes a (possibly nested) AST argument into a bytestring for hashing. Every value is prefixed with a type tag
+        so that different argument tuples never serialize to the same bytes.
+        """
         if arg is None:
             return b'\x0f'
         elif arg is True:
@@ -295,31 +952,33 @@ class Base:
         elif type(arg) is int:
             if arg < 0:
                 if arg >= -0x7fff:
-                    return b'-' + struct.pack("<h", arg)
+                    return b'h' + struct.pack("<h", arg)
                 elif arg >= -0x7fff_ffff:
-                    return b'-' + struct.pack("<i", arg)
+                    return b'i' + struct.pack("<i", arg)
                 elif arg >= -0x7fff_ffff_ffff_ffff:
-                    return b'-' + struct.pack("<q", arg)
+                    return b'q' + struct.pack("<q", arg)
                 return None
             else:
                 if arg <= 0xffff:
-                    return struct.pack("<H", arg)
+                    return b'H' + struct.pack("<H", arg)
                 elif arg <= 0xffff_ffff:
-                    return struct.pack("<I", arg)
+                    return b'I' + struct.pack("<I", arg)
                 elif arg <= 0xffff_ffff_ffff_ffff:
-                    return struct.pack("<Q", arg)
+                    return b'Q' + struct.pack("<Q", arg)
                 return None
         elif type(arg) is str:
-            return arg.encode()
+            encoded = arg.encode()
+            return b's' + struct.pack("<I", len(encoded)) + encoded
         elif type(arg) is float:
-            return struct.pack('f', arg)
+            return b'd' + struct.pack('<d', arg)
         elif type(arg) is tuple:
-            arr = [ ]
+            arr = [ b'(' ]
             for elem in arg:
                 b = Base._arg_serialize(elem)
                 if b is None:
                     return None
                 arr.append(b)
+            arr.append(b')')
             return b"".join(arr)
 
         return None
@@ -346,10 +1005,10 @@ class Base:
         else:
             length = b'none'
 
-        variables = struct.pack("<Q", hash(keywords['variables']) & 0xffff_ffff_ffff_ffff)
+        variables = struct.pack("<Q", _variables_hash(keywords['variables']))
         symbolic = b'\x01' if keywords['symbolic'] else b'\x00'
         if 'annotations' in keywords:
-            annotations = struct.pack("<Q", hash(keywords['annotations']) & 0xffff_ffff_ffff_ffff)
+            annotations = struct.pack("<Q", _annotations_hash(keywords['annotations']))
         else:
             annotations = b'\xf9'
 
@@ -371,27 +1030,33 @@ class Base:
         self.op = op
         self.args = args if type(args) is tuple else tuple(args)
         self.length = length
-        self.variables = frozenset(variables) if type(variables) is not frozenset else variables
-        self.symbolic = symbolic
+        self.variables = _intern_variables(variables) if type(variables) is not VariableSet else variables
         self.annotations = annotations
-        self._uneliminatable_annotations = uneliminatable_annotations
-        self._relocatable_annotations = relocatable_annotations
-
 
         self.depth = depth if depth is not None else 1
 
-        self._eager_backends = eager_backends
-        self._cached_encoded_name = encoded_name
-
-        self._errored = errored if errored is not None else set()
-
-        self._simplified = simplified
-        self._cache_key = ASTCacheKey(self)
-        self._excavated = None
-        self._burrowed = None
-
-        self._uninitialized = uninitialized
-        self._uc_alloc_depth = uc_alloc_depth
+        flags = _FLAG_SYMBOLIC if symbolic else 0
+        flags |= simplified << _FLAG_SIMPLIFIED_SHIFT
+        if uninitialized is not None:
+            flags |= (2 if uninitialized else 1) << _FLAG_UNINITIALIZED_SHIFT
+        overflow = None
+        if errored:
+            if type(errored) is not int:
+                overflow = frozenset(b for b in errored if not b._errored_flag)
+                errored = functools.reduce(operator.or_, (b._errored_flag for b in errored), 0)
+            flags |= errored
+        self._flags = flags
+        self._cache_key_obj = None
+
+        if overflow:
+            _side_table.set(self, '_errored_backends', overflow)
+
+        if uneliminatable_annotations:
+            _side_table.set(self, '_uneliminatable_annotations', uneliminatable_annotations)
+        if relocatable_annotations:
+            _side_table.set(self, '_relocatable_annotations', relocatable_annotations)
+        if uc_alloc_depth is not None:
+            _side_table.set(self, '_uc_alloc_depth', uc_alloc_depth)
 
         if len(self.args) == 0:
             raise ClaripyOperationError("AST with no arguments!")
@@ -399,23 +1064,172 @@ class Base:
     #pylint:enable=attribute-defined-outside-init
 
     def __hash__(self):
-        res = self._hash
-        if type(self._hash) is not int:
-            res = hash(self._hash)
-        return res
+        return self._hash
 
     @property
     def cache_key(self):
         """
         A key that refers to this AST - this value is appropriate for usage as a key in dictionaries.
         """
-        return self._cache_key
+        key = self._cache_key_obj
+        if key is None:
+            key = self._cache_key_obj = ASTCacheKey(self)  # pylint:disable=attribute-defined-outside-init
+        return key
+
+    _cache_key = cache_key
 
     @property
     def _encoded_name(self):
-        if self._cached_encoded_name is None:
-            self._cached_encoded_name = self.args[0].encode()  # pylint: disable=attribute-defined-outside-init
-        return self._cached_encoded_name
+        # only needed when a leaf is converted, so it is not worth a slot or a side-table entry
+        return self.args[0].encode()
+
+    #
+    # Size metrics
+    #
+
+    def _size_metrics(self):
+        """
+        Returns the tree size and the DAG size of this AST. Both are computed in one walk over the AST when they are
+        first needed, and cached. The walk reuses the tree sizes of subexpressions whose metrics were cached before.
+        """
+        if self.depth == 1:
+            return 1, 1
+        metrics = _side_table.get(self, '_size_metrics')
+        if metrics is None:
+            metrics = self._uncached_size_metrics()
+            _side_table.set(self, '_size_metrics', metrics)
+        return metrics
+
+    def _uncached_size_metrics(self):
+        """
+        Computes the tree size and the DAG size of this AST like :meth:`_size_metrics`, but without caching them (for
+        callers, like profiling, that should not add side-table entries to the ASTs they look at).
+        """
+        if self.depth == 1:
+            return 1, 1
+        metrics = _side_table.get(self, '_size_metrics')
+        if metrics is not None:
+            return metrics
+        tree_sizes = { }
+        dag_size = 0
+        for ast in traversal.postorder(self):
+            dag_size += 1
+            cached = _side_table.get(ast, '_size_metrics') if ast.depth > 1 else (1, 1)
+            if cached is not None:
+                tree_sizes[id(ast)] = cached[0]
+            else:
+                tree_sizes[id(ast)] = 1 + sum(tree_sizes[id(a)] for a in ast.args if isinstance(a, Base))
+        return tree_sizes[id(self)], dag_size
+
+    @property
+    def tree_size(self):
+        """
+        The number of nodes in this AST if it were a tree, i.e., counting a shared subexpression once for every path to
+        it. Like :attr:`dag_size`, this is computed when it is first needed, and cached, which makes it a cheap cost
+        estimate for ASTs that are looked at repeatedly (like constraints).
+        """
+        return self._size_metrics()[0]
+
+    @property
+    def dag_size(self):
+        """
+        The number of distinct nodes (i.e., subexpressions, including this AST) in this AST.
+        """
+        return self._size_metrics()[1]
+
+    #
+    # Packed and side-table fields
+    #
+
+    @property
+    def symbolic(self):
+        return bool(self._flags & _FLAG_SYMBOLIC)
+
+    @symbolic.setter
+    def symbolic(self, v):
+        self._flags = (self._flags | _FLAG_SYMBOLIC) if v else (self._flags & ~_FLAG_SYMBOLIC)  # pylint:disable=attribute-defined-outside-init
+
+    @property
+    def _simplified(self):
+        return (self._flags & _FLAG_SIMPLIFIED_MASK) >> _FLAG_SIMPLIFIED_SHIFT
+
+    @_simplified.setter
+    def _simplified(self, v):
+        self._flags = (self._flags & ~_FLAG_SIMPLIFIED_MASK) | (int(v) << _FLAG_SIMPLIFIED_SHIFT)  # pylint:disable=attribute-defined-outside-init
+
+    @property
+    def _uninitialized(self):
+        v = (self._flags & _FLAG_UNINITIALIZED_MASK) >> _FLAG_UNINITIALIZED_SHIFT
+        return None if v == 0 else v == 2
+
+    @_uninitialized.setter
+    def _uninitialized(self, v):
+        bits = 0 if v is None else (2 if v else 1)
+        self._flags = (self._flags & ~_FLAG_UNINITIALIZED_MASK) | (bits << _FLAG_UNINITIALIZED_SHIFT)  # pylint:disable=attribute-defined-outside-init
+
+    @property
+    def _errored(self):
+        """
+        The set of backends that are known to be unable to handle this AST.
+        """
+        errored = self._flags & _FLAG_ERRORED_MASK
+        overflow = _side_table.get(self, '_errored_backends', frozenset())
+        if not errored:
+            return overflow
+        return frozenset(b for b in backends._all_backends if errored & b._errored_flag) | overflow
+
+    def _set_errored(self, backend):
+        if backend._errored_flag:
+            self._flags |= backend._errored_flag  # pylint:disable=attribute-defined-outside-init
+        else:
+            # a backend without a bit of its own
+            errored = _side_table.get(self, '_errored_backends', frozenset())
+            _side_table.set(self, '_errored_backends', errored | { backend })
+
+    def _is_errored(self, backend):
+        if backend._errored_flag:
+            return bool(self._flags & backend._errored_flag)
+        return backend in _side_table.get(self, '_errored_backends', frozenset())
+
+    @property
+    def _uc_alloc_depth(self):
+        return _side_table.get(self, '_uc_alloc_depth')
+
+    @_uc_alloc_depth.setter
+    def _uc_alloc_depth(self, v):
+        _side_table.set(self, '_uc_alloc_depth', v)
+
+    @property
+    def _uneliminatable_annotations(self):
+        return _side_table.get(self, '_uneliminatable_annotations', _EMPTY_ANNOTATIONS)
+
+    @_uneliminatable_annotations.setter
+    def _uneliminatable_annotations(self, v):
+        _side_table.set(self, '_uneliminatable_annotations', v if v else None)
+
+    @property
+    def _relocatable_annotations(self):
+        return _side_table.get(self, '_relocatable_annotations', _EMPTY_ANNOTATIONS)
+
+    @_relocatable_annotations.setter
+    def _relocatable_annotations(self, v):
+        _side_table.set(self, '_relocatable_annotations', v if v else None)
+
+    @property
+    def _excavated(self):
+        return _side_table.get(self, '_excavated')
+
+    @_excavated.setter
+    def _excavated(self, v):
+        _side_table.set(self, '_excavated', v)
+
+    @property
+    def _burrowed(self):
+        return _side_table.get(self, '_burrowed')
+
+    @_burrowed.setter
+    def _burrowed(self, v):
+        _side_table.set(self, '_burrowed', v)
 
     #
     # Collapsing and simplification
@@ -679,21 +1493,7 @@ class Base:
         """
         Return an iterator over the leaf ASTs.
         """
-        seen = set()
-
-        ast_queue = deque([self])
-        while ast_queue:
-
-            ast = ast_queue.pop()
-            if isinstance(ast, Base) and id(ast.cache_key) not in seen:
-                seen.add(id(ast.cache_key))
-
-                if ast.depth == 1:
-                    yield ast
-                    continue
-
-                ast_queue.extend(ast.args)
-                continue
+        return _leaves_last_first((self,))
 
     # TODO: Deprecate this property
     @property
@@ -787,29 +1587,32 @@ class Base:
 
         # TODO: Convert a and b into canonical forms
 
-        if self.op != o.op:
-            return False
-
-        if len(self.args) != len(o.args):
-            return False
-
-        for arg_a, arg_b in zip(self.args, o.args):
-            if not isinstance(arg_a, Base):
-                if type(arg_a) != type(arg_b):
-                    return False
-                # They are not ASTs
-                if arg_a != arg_b:
+        # shared subexpressions are only compared once
+        matched = set()
+        stack = [ (self, o) ]
+        while stack:
+            a, b = stack.pop()
+            if (id(a), id(b)) in matched:
+                continue
+            matched.add((id(a), id(b)))
+
+            if a.op != b.op or len(a.args) != len(b.args):
+                return False
+
+            for arg_a, arg_b in zip(a.args, b.args):
+                if not isinstance(arg_a, Base):
+                    if type(arg_a) != type(arg_b):
+                        return False
+                    # They are not ASTs
+                    if arg_a != arg_b:
+                        return False
+                elif arg_a.op in operations.leaf_operations:
+                    if arg_a is not arg_b:
+                        return False
+                elif not isinstance(arg_b, Base):
                     return False
                 else:
-                    continue
-
-            if arg_a.op in operations.leaf_operations:
-                if arg_a is not arg_b:
-                    return False
-
-            else:
-                if not arg_a.structurally_match(arg_b):
-                    return False
+                    stack.append((arg_a, arg_b))
 
         return True
 
@@ -824,65 +1627,10 @@ class Base:
         :param leaf_operation:      An operation that should be applied to the leaf nodes.
         :returns:                   An AST with all instances of ast's in replacements.
         """
-        if variable_set is None:
-            variable_set = set()
-
-        if leaf_operation is None:
-            leaf_operation = lambda x: x
-
-        arg_queue = [iter([self])]
-        rep_queue = []
-        ast_queue = []
-
-        while arg_queue:
-            try:
-                ast = next(arg_queue[-1])
-                repl = ast
-
-                if not isinstance(ast, Base):
-                    rep_queue.append(repl)
-                    continue
-
-                elif ast.cache_key in replacements:
-                    repl = replacements[ast.cache_key]
-
-                elif ast.variables >= variable_set:
-
-                    if ast.op in operations.leaf_operations:
-                        repl = leaf_operation(ast)
-                        if repl is not ast:
-                            replacements[ast.cache_key] = repl
-
-                    elif ast.depth > 1:
-                        arg_queue.append(iter(ast.args))
-                        ast_queue.append(ast)
-                        continue
-
-                rep_queue.append(repl)
-                continue
-
-            except StopIteration:
-                arg_queue.pop()
+        def _record(old, new):
+            replacements[old.cache_key] = new
 
-                if ast_queue:
-                    ast = ast_queue.pop()
-                    repl = ast
-
-                    args = rep_queue[-len(ast.args):]
-                    del rep_queue[-len(ast.args):]
-
-                    # Check if replacement occurred.
-                    if any((a is not b for a, b in zip(ast.args, args))):
-                        repl = ast.make_like(ast.op, tuple(args))
-                        replacements[ast.cache_key] = repl
-
-                    rep_queue.append(repl)
-
-        assert len(arg_queue) == 0, "arg_queue is not empty"
-        assert len(ast_queue) == 0, "ast_queue is not empty"
-        assert len(rep_queue) == 1, ("rep_queue has unexpected length", len(rep_queue))
-
-        return rep_queue.pop()
+        return _replacement_rewriter(replacements, variable_set, leaf_operation, on_change=_record).rewrite(self)
 
     def replace(self, old, new, variable_set=None, leaf_operation=None):   # pylint:disable=unused-argument
         """
@@ -912,15 +1660,39 @@ class Base:
                     arg._identify_vars(all_vars, counter)
 
     def canonicalize(self, var_map=None, counter=None):
-        counter = itertools.count() if counter is None else counter
-        var_map = { } if var_map is None else var_map
+        """
+        Renames the variables of this AST to canonical_0, canonical_1, ..., in the order they first appear in, so that
+        ASTs that only differ in the names of their variables have the same canonical form. Without `var_map` and
+        `counter`, the canonical form is cached.
 
-        for v in self.leaf_asts():
-            if v.cache_key not in var_map and v.op in { 'BVS', 'BoolS', 'FPS' }:
-                new_name = 'canonical_%d' % next(counter)
-                var_map[v.cache_key] = v._rename(new_name)
+        :returns:   A tuple of the map from cache keys of the original variables to the renamed ones, the counter that
+                    was used to name them, and the canonicalized AST.
+        """
+        if var_map is not None or counter is not None:
+            var_map, counter, (canonicalized,) = canonicalize_many((self,), var_map=var_map, counter=counter)
+            return var_map, counter, canonicalized
+
+        canonicalized = _side_table.get(self, '_canonical')
+        if canonicalized is not None:
+            var_map = _matching_variables((self,), (canonicalized,))
+            return var_map, itertools.count(len(var_map)), canonicalized
 
-        return var_map, counter, self.replace_dict(var_map)
+        var_map, counter, (canonicalized,) = canonicalize_many((self,))
+        _side_table.set(self, '_canonical', canonicalized)
+        # a canonical form is its own canonical form
+        _side_table.set(canonicalized, '_canonical', canonicalized)
+        return var_map, counter, canonicalized
+
+    @property
+    def canonical_hash(self):
+        """
+        A hash of this AST that does not depend on the names of its variables: ASTs that only differ in the names of
+        their variables have the same canonical hash.
+        """
+        canonicalized = _side_table.get(self, '_canonical')
+        if canonicalized is None:
+            canonicalized = self.canonicalize()[-1]
+        return canonicalized._hash
 
     #
     # This code handles burrowing ITEs deeper into the ast and excavating
@@ -964,82 +1736,44 @@ class Base:
         return old_true.__class__(old_true.op, new_args, length=self.length)
 
     def _excavate_ite(self):
-        ast_queue = [iter([self])]
-        arg_queue = []
-        op_queue = []
-
-        while ast_queue:
-            try:
-                ast = next(ast_queue[-1])
-
-                if not isinstance(ast, Base):
-                    arg_queue.append(ast)
-                    continue
-
-                if ast.op in operations.leaf_operations:
-                    arg_queue.append(ast)
-                    continue
-
-                if ast.annotations:
-                    arg_queue.append(ast)
-                    continue
-
-                op_queue.append(ast)
-                ast_queue.append(iter(ast.args))
+        return traversal.Rewriter(cutoff=lambda ast: bool(ast.annotations), rebuild=Base._excavate_args).rewrite(self)
 
-            except StopIteration:
-                ast_queue.pop()
-
-                if op_queue:
-                    op = op_queue.pop()
-
-                    args = arg_queue[-len(op.args):]
-                    del arg_queue[-len(op.args):]
-
-                    ite_args = [isinstance(a, Base) and a.op == 'If' for a in args]
-
-                    if op.op == 'If':
-                        # if we are an If, call the If handler so that we can take advantage of its simplifiers
-                        excavated = If(*args)
+    @staticmethod
+    def _excavate_args(op, args):
+        """
+        Rebuilds `op` from its (already excavated) `args`, pulling Ifs in the args out to the surface.
+        """
+        ite_args = [isinstance(a, Base) and a.op == 'If' for a in args]
+
+        if op.op == 'If':
+            # if we are an If, call the If handler so that we can take advantage of its simplifiers
+            return If(*args)
+
+        if ite_args.count(True) == 0:
+            # if there are no ifs that came to the surface, there's nothing more to do
+            return op.swap_args(args, simplify=True)
+
+        # this gets called when we're *not* in an If, but there are Ifs in the args.
+        # it pulls those Ifs out to the surface.
+        cond = args[ite_args.index(True)].args[0]
+        new_true_args = []
+        new_false_args = []
+
+        for a in args:
+            if not isinstance(a, Base) or a.op != 'If':
+                new_true_args.append(a)
+                new_false_args.append(a)
+            elif a.args[0] is cond:
+                new_true_args.append(a.args[1])
+                new_false_args.append(a.args[2])
+            elif a.args[0] is Not(cond):
+                new_true_args.append(a.args[2])
+                new_false_args.append(a.args[1])
+            else:
+                # weird conditions -- giving up!
+                return op.swap_args(args, simplify=True)
 
-                    elif ite_args.count(True) == 0:
-                        # if there are no ifs that came to the surface, there's nothing more to do
-                        excavated = op.swap_args(args, simplify=True)
-
-                    else:
-                        # this gets called when we're *not* in an If, but there are Ifs in the args.
-                        # it pulls those Ifs out to the surface.
-                        cond = args[ite_args.index(True)].args[0]
-                        new_true_args = []
-                        new_false_args = []
-
-                        for a in args:
-                            if not isinstance(a, Base) or a.op != 'If':
-                                new_true_args.append(a)
-                                new_false_args.append(a)
-                            elif a.args[0] is cond:
-                                new_true_args.append(a.args[1])
-                                new_false_args.append(a.args[2])
-                            elif a.args[0] is Not(cond):
-                                new_true_args.append(a.args[2])
-                                new_false_args.append(a.args[1])
-                            else:
-                                # weird conditions -- giving up!
-                                excavated = op.swap_args(args, simplify=True)
-                                break
-
-                        else:
-                            excavated = If(cond, op.swap_args(new_true_args, simplify=True),
-                                           op.swap_args(new_false_args, simplify=True))
-
-                    # continue
-                    arg_queue.append(excavated)
-
-        assert len(op_queue) == 0, "op_queue is not empty"
-        assert len(ast_queue) == 0, "ast_queue is not empty"
-        assert len(arg_queue) == 1, ("arg_queue has unexpected length", len(arg_queue))
-
-        return arg_queue.pop()
+        return If(cond, op.swap_args(new_true_args, simplify=True), op.swap_args(new_false_args, simplify=True))
 
     @property
     def ite_burrowed(self):
@@ -1073,7 +1807,7 @@ class Base:
 
     def _first_backend(self, what):
         for b in backends._all_backends:
-            if b in self._errored or b.is_smt_backend:
+            if self._is_errored(b) or b.is_smt_backend:
                 continue
 
             try: return getattr(b, what)(self)
@@ -1143,10 +1877,228 @@ class Base:
         except BackendError:
             return self
 
-def simplify(e):
+Base._hash_engine = hash_engines[os.environ.get('CLARIPY_HASH_ENGINE', MixHashEngine.name)]()
+
+def _replacement_rewriter(replacements, variable_set=None, leaf_operation=None, on_change=None):
+    def _replacement(ast):
+        return replacements.get(ast.cache_key, None)
+
+    rewriter = traversal.Rewriter(pre=_replacement, variables=variable_set, on_change=on_change)
+    if leaf_operation is not None:
+        for op in operations.leaf_operations:
+            rewriter.register(op, leaf_operation)
+    return rewriter
+
+def replace_dict_many(asts, replacements, variable_set=None, leaf_operation=None):
+    """
+    Returns `asts` with subexpressions replaced by those that can be found in `replacements`, like
+    :meth:`Base.replace_dict`, but for many ASTs at once: subexpressions shared between the ASTs are only rewritten
+    once. Intermediate results are only memoized for the duration of the call, and `replacements` is not modified.
+
+    :param asts:                The ASTs (non-AST values are returned as is).
+    :param replacements:        A dictionary of cache keys to their replacements.
+    :param variable_set:        For optimization, ast's without these variables are not checked for replacing.
+    :param leaf_operation:      An operation that should be applied to the leaf nodes.
+    :returns:                   A list of the ASTs with all instances of ast's in replacements replaced.
+    """
+    return _replacement_rewriter(replacements, variable_set, leaf_operation).rewrite_many(asts)
+
+_CANONICAL_VARIABLE_OPS = frozenset(('BVS', 'BoolS', 'FPS'))
+
+def _leaves_last_first(asts):
+    """
+    Yields every distinct leaf AST in `asts`, depth-first, from the last argument of every AST to the first. This is
+    the order of :meth:`Base.leaf_asts`, and the order in which variables get their canonical names.
+    """
+    seen = set()
+    for root in asts:
+        stack = [ root ]
+        while stack:
+            ast = stack.pop()
+            if not isinstance(ast, Base) or id(ast) in seen:
+                continue
+            seen.add(id(ast))
+            if ast.depth == 1:
+                yield ast
+            else:
+                stack.extend(ast.args)
+
+def _canonical_variables(asts, var_map, counter):
+    """
+    Assigns canonical names to the variables in `asts` that are not in `var_map` yet.
+    """
+    for v in _leaves_last_first(asts):
+        if v.op in _CANONICAL_VARIABLE_OPS and v.cache_key not in var_map:
+            new_name = 'canonical_%d' % next(counter)
+            var_map[v.cache_key] = v._rename(new_name)
+    return var_map, counter
+
+def _matching_variables(asts, canonicalized):
+    """
+    Maps the variables of `asts` to the variables of their canonical forms, without renaming them again. Renaming
+    variables preserves the shape of the DAG, so the leaves of both come in the same order.
+    """
+    var_map = { }
+    for v, cv in zip(_leaves_last_first(asts), _leaves_last_first(canonicalized)):
+        if v.op in _CANONICAL_VARIABLE_OPS:
+            var_map[v.cache_key] = cv
+    return var_map
+
+def canonicalize_many(asts, var_map=None, counter=None):
+    """
+    Canonicalizes the variable names of several ASTs at once (see :meth:`Base.canonicalize`), consistently across the
+    ASTs.
+
+    :returns:   A tuple of the map from cache keys of the original variables to the renamed ones, the counter that was
+                used to name them, and a list of the canonicalized ASTs.
+    """
+    counter = itertools.count() if counter is None else counter
+    var_map = { } if var_map is None else var_map
+    _canonical_variables(asts, var_map, counter)
+    return var_map, counter, replace_dict_many(asts, var_map)
+
+def canonicalize_constraints(constraints):
+    """
+    Canonicalizes a set of constraints, such that constraint sets that only differ in the names of their variables and
+    in the order of their independent constraints (those that share no variables) have the same canonical form.
+
+    The constraints are split into groups of dependent constraints. The constraints in a group are ordered by their
+    canonical hashes, the groups are ordered by the canonical hashes of their constraints, and the variables are then
+    named in that order. Constraints with equal canonical hashes keep their relative order. Results are cached for as
+    long as the constraints are alive.
+
+    :returns:   A tuple of the map from cache keys of the original variables to the renamed ones, the tuple of
+                canonicalized constraints, and a hash of the canonicalized constraints.
+    """
+    key = tuple(c._hash for c in constraints)
+    entry = _canonical_constraints_cache.get(key, None)
+    if entry is None:
+        entry = _canonicalize_constraints(constraints)
+        _canonical_constraints_cache[key] = entry
+        # the entry lives as long as one of the constraints does
+        for c in constraints:
+            _side_table.set(c, '_canonical_constraints', entry)
+
+    variables = entry.variables
+    var_map = { v.cache_key: variables[v._hash] for v in traversal.leaves(constraints)
+                if v.op in _CANONICAL_VARIABLE_OPS }
+    return var_map, entry.canonicalized, entry.hash
+
+class _CanonicalConstraints:
+    """
+    The cached canonical form of a constraint set.
+
+    :ivar canonicalized:    The canonicalized constraints.
+    :ivar variables:        A dict from the structural hashes of the original variables to the renamed ones.
+    :ivar hash:             The hash of the canonicalized constraints.
+    """
+
+    __slots__ = ('canonicalized', 'variables', 'hash', '__weakref__')
+
+    def __init__(self, canonicalized, variables, h):
+        self.canonicalized = canonicalized
+        self.variables = variables
+        self.hash = h
+
+# canonical forms of constraint sets, keyed by the structural hashes of their constraints
+_canonical_constraints_cache = weakref.WeakValueDictionary()
+
+def _canonicalize_constraints(constraints):
+    position = { }
+    for i, c in enumerate(constraints):
+        position.setdefault(id(c), i)
+
+    groups, concrete = _dependent_groups(constraints)
+    c_lists = [ c_list for _, c_list in groups ]
+    if concrete:
+        c_lists.append(concrete)
+
+    def _order(c):
+        return c.canonical_hash, position[id(c)]
+
+    ordered = [ ]
+    for group in sorted((sorted(c_list, key=_order) for c_list in c_lists),
+                        key=lambda g: (tuple(c.canonical_hash for c in g), position[id(g[0])])):
+        ordered.extend(group)
+
+    var_map, _, canonicalized = canonicalize_many(ordered)
+    canonicalized = tuple(canonicalized)
+    h = _stable_digest(b''.join(c._hash.to_bytes(16, 'little') for c in canonicalized))
+    return _CanonicalConstraints(canonicalized, { k.ast._hash: v for k, v in var_map.items() }, h)
+
+def _dependent_groups(asts):
+    """
+    Splits ASTs into groups of ASTs that (transitively) share variables.
+
+    :returns:   A list of (set of variable names, list of ASTs) tuples, one per group, and the list of the ASTs that
+                have no variables.
+    """
+    # ASTs over the same variables share an interned variable set, so we group them by that set first and only then
+    # union the (much fewer) distinct sets together
+    concrete = [ ]
+    by_set = { }
+    for a in asts:
+        if not a.variables:
+            concrete.append(a)
+            continue
+        try:
+            by_set[id(a.variables)][1].append(a)
+        except KeyError:
+            by_set[id(a.variables)] = (a.variables, [ a ])
+
+    # union-find over the variable names
+    parents = { }
+    def _find(v):
+        root = v
+        while parents[root] is not root:
+            root = parents[root]
+        while parents[v] is not root:
+            parents[v], v = root, parents[v]
+        return root
+
+    for variables, _ in by_set.values():
+        root = None
+        for v in variables:
+            if v not in parents:
+                parents[v] = v
+            r = _find(v)
+            if root is None:
+                root = r
+            elif r is not root:
+                parents[r] = root
+
+    merged = { }
+    for variables, a_list in by_set.values():
+        root = _find(next(iter(variables)))
+        try:
+            entry = merged[root]
+        except KeyError:
+            entry = merged[root] = (set(), [ ])
+        entry[0].update(variables)
+        entry[1].extend(a_list)
+
+    return list(merged.values()), concrete
+
+def simplify(e, method=None, timeout=None, max_nodes=None):
+    """
+    Simplifies an AST.
+
+    :param method:      How to simplify it: 'backend' (the default) has the first backend that can (usually Z3)
+                        simplify it, and 'rules' runs the pure-Python simplification pass of
+                        :meth:`SimplificationManager.fixpoint`, which is much cheaper on large ASTs, but not as
+                        thorough.
+    :param timeout:     The time budget of the 'rules' method, in seconds.
+    :param max_nodes:   The maximum number of subexpressions that the 'rules' method simplifies.
+    """
+    if method not in (None, 'backend', 'rules'):
+        raise ClaripyValueError("unknown simplification method %r" % (method,))
+
     if isinstance(e, Base) and e.op in operations.leaf_operations:
         return e
 
+    if method == 'rules':
+        return simplifications.simpleton.fixpoint((e,), timeout=timeout, max_nodes=max_nodes)[0]
+
     s = e._first_backend('simplify')
     if s is None:
         l.debug("Unable to simplify expression")
@@ -1159,9 +2111,10 @@ def simplify(e):
 
         return s
 
-from ..errors import BackendError, ClaripyOperationError, ClaripyReplacementError
+from ..errors import BackendError, ClaripyOperationError, ClaripyReplacementError, ClaripyValueError
 from .. import operations
 from ..backend_manager import backends
 from ..ast.bool import If, Not, BoolS
 from ..ast.bv import BV
 from .. import simplifications
+from . import traversal
@@ -49,6 +49,10 @@ def BoolS(name, explicit_name=None):
     return Bool('BoolS', (n,), variables={n}, symbolic=True)
 
 def BoolV(val):
+    if val is True:
+        return true
+    if val is False:
+        return false
     try:
         return _boolv_cache[(val)]
     except KeyError:
@@ -60,8 +64,10 @@ def BoolV(val):
 # some standard ASTs
 #
 
-true = BoolV(True)
-false = BoolV(False)
+true = Bool('BoolV', (True,))
+false = Bool('BoolV', (False,))
+_boolv_cache[True] = true
+_boolv_cache[False] = false
 
 #
 # Bound operations
@@ -152,6 +158,9 @@ def is_true(e, exact=None): #pylint:disable=unused-argument
         try: return b.is_true(e)
         except BackendError: pass
 
+    if known_bits.concrete_value(e) is True:
+        return True
+
     l.debug("Unable to tell the truth-value of this expression")
     return False
 
@@ -160,6 +169,9 @@ def is_false(e, exact=None): #pylint:disable=unused-argument
         try: return b.is_false(e)
         except BackendError: pass
 
+    if known_bits.concrete_value(e) is False:
+        return True
+
     l.debug("Unable to tell the truth-value of this expression")
     return False
 
@@ -251,3 +263,4 @@ from ..backend_manager import backends
 from ..errors import ClaripyOperationError, ClaripyTypeError, BackendError
 from .bits import Bits
 from .bv import BVS
+from . import known_bits
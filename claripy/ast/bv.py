@@ -7,8 +7,15 @@ from .bool import If
 
 l = logging.getLogger("claripy.ast.bv")
 
+# A table of constants, keyed by (value, size). It is preloaded with frequently used constants (see
+# _intern_constants()), which are also keyed by their negative (two's complement) aliases, so that BVV() can look them
+# up before normalizing its arguments.
 _bvv_cache = dict()
 
+# the constants in _bvv_cache: all bytes, small integers, masks and sign bits at the common sizes, and single bits
+_INTERNED_SIZES = (8, 16, 32, 64)
+_INTERNED_SMALL = range(0x41)
+
 # This is a hilarious hack to get around some sort of bug in z3's python bindings, where
 # under some circumstances stuff gets destructed out of order
 def cleanup():
@@ -246,6 +253,11 @@ def BVV(value, size=None, **kwargs):
     :returns:       A BV object representing this value.
     """
 
+    # fast path for the interned constants
+    if not kwargs and type(value) is int:
+        try: return _bvv_cache[(value, size)]
+        except KeyError: pass
+
     if type(value) in (bytes, bytearray, memoryview, str):
         if type(value) is str:
             l.warning("BVV value is a unicode string, encoding as utf-8")
@@ -276,6 +288,22 @@ def BVV(value, size=None, **kwargs):
     _bvv_cache[(value, size)] = result
     return result
 
+def _intern_constants():
+    """
+    Preloads the table of constants with frequently used ones.
+    """
+    values = [ (0, 1), (1, 1) ]
+    for size in _INTERNED_SIZES:
+        mask = (1 << size) - 1
+        values.extend((v, size) for v in (range(0x100) if size == 8 else _INTERNED_SMALL))
+        values.extend(((mask, size), (1 << (size - 1), size), (mask >> 1, size)))
+
+    for value, size in values:
+        ast = BV('BVV', (value, size), length=size)
+        _bvv_cache[(value, size)] = ast
+        if value >= 1 << (size - 1):
+            _bvv_cache[(value - (1 << size), size)] = ast
+
 def SI(name=None, bits=0, lower_bound=None, upper_bound=None, stride=None, to_conv=None, explicit_name=None,
        discrete_set=False, discrete_set_max_card=None):
     name = 'unnamed' if name is None else name
@@ -442,3 +470,5 @@ BV.intersection = operations.op('intersection', (BV, BV), BV, extra_check=operat
 from . import fp
 from .. import vsa
 from ..errors import ClaripyValueError
+
+_intern_constants()
@@ -0,0 +1,392 @@
+"""
+A cheap analysis of the bits and the unsigned range of bitvector ASTs.
+
+For every BV AST, the analysis finds the bits that are known to be 0 or 1, and bounds on its unsigned value, no matter
+what the values of its variables are. For example, the high 24 bits of `x & 0xff` are known zeros, and it is at most
+`0xff`. From these facts, it decides some comparisons (like `(x & 0xff) < 0x100` or `ZeroExt(32, y) >> 40 == 0`)
+without a solver.
+
+The facts of an AST are computed when they are first needed, and cached along with the AST, so every subexpression
+is only analyzed once.
+"""
+
+
+class KnownBitsStats:
+    """
+    Counters of the queries that the frontends and the simplifiers asked the analysis.
+
+    :ivar queries:      The number of symbolic queries of the frontends (like `is_true()` or `eval()` of a symbolic
+                        AST) that were looked at.
+    :ivar decided:      The number of these queries that were answered from the facts, without a solver.
+    :ivar simplified:   The number of operations that the simplifiers decided from the facts of their arguments.
+    """
+
+    __slots__ = ('queries', 'decided', 'simplified')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.decided = 0
+        self.simplified = 0
+
+    def as_dict(self):
+        return { 'queries': self.queries, 'decided': self.decided, 'simplified': self.simplified }
+
+stats = KnownBitsStats()
+
+def reset_stats():
+    """
+    Resets the counters in :data:`stats`.
+    """
+    stats.reset()
+
+#
+# Facts of bitvectors
+#
+# The facts of a bitvector of length n are a tuple (zeros, ones, lo, hi): the masks of its bits that are known to be 0
+# and 1, and the bounds of its unsigned value. The facts of a Bool are its truth value (True, False, or None if it is
+# unknown).
+#
+
+def _unknown(length):
+    return (0, 0, 0, (1 << length) - 1)
+
+def _normalize(length, zeros, ones, lo, hi):
+    """
+    Tightens the known bits and the range of a bitvector with each other.
+    """
+    mask = (1 << length) - 1
+    zeros &= mask
+    ones &= mask
+    lo = max(lo, ones)
+    hi = min(hi, mask & ~zeros)
+    if lo > hi or zeros & ones:
+        # only possible in unreachable code (e.g., the branch of an If that is never taken)
+        return _unknown(length)
+    # the bits that lo and hi have in common are the same in every value in between
+    common = mask & ~((1 << (lo ^ hi).bit_length()) - 1)
+    zeros |= common & ~lo
+    ones |= common & lo
+    return (zeros, ones, max(lo, ones), min(hi, mask & ~zeros))
+
+def _trailing_zeros(length, zeros):
+    # the number of low bits that are known to be zero
+    return min(length, (~zeros & (zeros + 1)).bit_length() - 1)
+
+def _exact(f):
+    return f[2] if f[2] == f[3] else None
+
+def _bitwise(op, length, facts):
+    zeros, ones, lo, hi = facts[0]
+    for z, o, l, h in facts[1:]:
+        if op == '__and__':
+            zeros, ones, lo, hi = zeros | z, ones & o, 0, min(hi, h)
+        elif op == '__or__':
+            zeros, ones, lo, hi = zeros & z, ones | o, max(lo, l), (1 << length) - 1
+        else:
+            zeros, ones, lo, hi = (zeros & z) | (ones & o), (zeros & o) | (ones & z), 0, (1 << length) - 1
+    return _normalize(length, zeros, ones, lo, hi)
+
+def _arithmetic(op, length, facts):
+    mask = (1 << length) - 1
+    if op == '__add__':
+        tz = min(_trailing_zeros(length, f[0]) for f in facts)
+        lo, hi = sum(f[2] for f in facts), sum(f[3] for f in facts)
+    elif op == '__mul__':
+        tz = sum(_trailing_zeros(length, f[0]) for f in facts)
+        lo, hi = 1, 1
+        for f in facts:
+            lo, hi = lo * f[2], hi * f[3]
+    else:
+        a, b = facts
+        tz = min(_trailing_zeros(length, a[0]), _trailing_zeros(length, b[0]))
+        lo, hi = (a[2] - b[3], a[3] - b[2]) if a[2] >= b[3] else (0, mask)
+    if hi > mask:
+        # it might overflow
+        lo, hi = 0, mask
+    return _normalize(length, (1 << min(tz, length)) - 1, 0, lo, hi)
+
+def _shift(op, length, x, s):
+    mask = (1 << length) - 1
+    zeros, ones, lo, hi = x
+    sign = 1 << (length - 1)
+    if op == '__rshift__' and not zeros & sign:
+        # an arithmetic shift of a value that might be negative
+        s = min(s, length - 1)
+        filled = mask & ~(mask >> s)
+        zeros, ones = zeros >> s, ones >> s
+        if ones & (sign >> s):
+            ones |= filled
+        return _normalize(length, zeros, ones, 0, mask)
+    if s >= length:
+        return (mask, 0, 0, 0)
+    if op == '__lshift__':
+        lo, hi = (lo << s, hi << s) if hi << s <= mask else (0, mask)
+        return _normalize(length, (zeros << s) | ((1 << s) - 1), ones << s, lo, hi)
+    return _normalize(length, (zeros >> s) | (mask & ~(mask >> s)), ones >> s, lo >> s, hi >> s)
+
+def _bv_facts(ast, get):
+    op = ast.op
+    args = ast.args
+    length = ast.length
+    mask = (1 << length) - 1
+
+    if op == 'BVV':
+        if args[0] is None:
+            # an empty strided interval (ESI)
+            return _unknown(length)
+        v = args[0] & mask
+        return (mask & ~v, v, v, v)
+    if op in ('__and__', '__or__', '__xor__'):
+        return _bitwise(op, length, [ get(a) for a in args ])
+    if op in ('__add__', '__mul__', '__sub__'):
+        return _arithmetic(op, length, [ get(a) for a in args ])
+    if op == '__invert__':
+        zeros, ones, lo, hi = get(args[0])
+        return (ones, zeros, mask - hi, mask - lo)
+    if op in ('__lshift__', 'LShR', '__rshift__'):
+        s = _exact(get(args[1]))
+        if s is None:
+            return _unknown(length)
+        return _shift(op, length, get(args[0]), s)
+    if op == 'ZeroExt':
+        zeros, ones, lo, hi = get(args[1])
+        return (zeros | (mask & ~((1 << args[1].length) - 1)), ones, lo, hi)
+    if op == 'SignExt':
+        zeros, ones, lo, hi = get(args[1])
+        sign = 1 << (args[1].length - 1)
+        extension = mask & ~((1 << args[1].length) - 1)
+        if zeros & sign:
+            return (zeros | extension, ones, lo, hi)
+        if ones & sign:
+            return (zeros, ones | extension, lo | extension, hi | extension)
+        return _normalize(length, zeros, ones, 0, mask)
+    if op == 'Extract':
+        high, low, x = args
+        zeros, ones, lo, hi = get(x)
+        if hi >> low <= mask:
+            lo, hi = lo >> low, hi >> low
+        else:
+            lo, hi = 0, mask
+        return _normalize(length, zeros >> low, ones >> low, lo, hi)
+    if op == 'Concat':
+        zeros, ones, lo, hi = 0, 0, 0, 0
+        for a in args:
+            z, o, l, h = get(a)
+            n = a.length
+            zeros, ones, lo, hi = (zeros << n) | z, (ones << n) | o, (lo << n) | l, (hi << n) | h
+        return (zeros, ones, lo, hi)
+    if op == '__floordiv__':
+        a, b = get(args[0]), get(args[1])
+        if b[2] == 0:
+            # division by zero is all ones
+            return _unknown(length)
+        return _normalize(length, 0, 0, a[2] // b[3], a[3] // b[2])
+    if op == '__mod__':
+        a, b = get(args[0]), get(args[1])
+        # the remainder of a division by zero is the dividend
+        hi = min(a[3], b[3] - 1) if b[2] > 0 else a[3]
+        return _normalize(length, 0, 0, 0, hi)
+    if op == 'If':
+        t = get(args[0])
+        if t is True:
+            return get(args[1])
+        if t is False:
+            return get(args[2])
+        a, b = get(args[1]), get(args[2])
+        return (a[0] & b[0], a[1] & b[1], min(a[2], b[2]), max(a[3], b[3]))
+    return _unknown(length)
+
+def _signed_range(length, f):
+    sign = 1 << (length - 1)
+    if f[3] < sign:
+        return f[2], f[3]
+    if f[2] >= sign:
+        return f[2] - (sign << 1), f[3] - (sign << 1)
+    return -sign, sign - 1
+
+def _compare(op, a, b, fa, fb, length):
+    """
+    Decides the comparison `op` of the bitvectors `a` and `b`, given their facts.
+    """
+    if op in ('__eq__', '__ne__'):
+        if a is b:
+            equal = True
+        elif fa[0] & fb[1] or fa[1] & fb[0] or fa[3] < fb[2] or fb[3] < fa[2]:
+            equal = False
+        elif fa[2] == fa[3] == fb[2] == fb[3]:
+            equal = True
+        else:
+            return None
+        return equal if op == '__eq__' else not equal
+
+    if op in ('SLT', 'SLE', 'SGT', 'SGE'):
+        (alo, ahi), (blo, bhi) = _signed_range(length, fa), _signed_range(length, fb)
+        op = _SIGNED_TO_UNSIGNED[op]
+    else:
+        alo, ahi, blo, bhi = fa[2], fa[3], fb[2], fb[3]
+
+    if op in ('__gt__', '__ge__', 'UGT', 'UGE'):
+        alo, ahi, blo, bhi = blo, bhi, alo, ahi
+        strict = op in ('__gt__', 'UGT')
+    else:
+        strict = op in ('__lt__', 'ULT')
+    # now, decide whether a < b (or a <= b)
+    if ahi < blo or (not strict and ahi == blo):
+        return True
+    if alo > bhi or (strict and alo == bhi):
+        return False
+    return None
+
+_SIGNED_TO_UNSIGNED = { 'SLT': '__lt__', 'SLE': '__le__', 'SGT': '__gt__', 'SGE': '__ge__' }
+
+COMPARISONS = frozenset((
+    '__eq__', '__ne__', '__lt__', '__le__', '__gt__', '__ge__',
+    'ULT', 'ULE', 'UGT', 'UGE', 'SLT', 'SLE', 'SGT', 'SGE',
+))
+
+def _bool_facts(ast, get):
+    op = ast.op
+    args = ast.args
+
+    if op == 'BoolV':
+        return args[0]
+    if op == 'Not':
+        t = get(args[0])
+        return None if t is None else not t
+    if op in ('And', 'Or'):
+        short, unknown = (op == 'Or'), False
+        for a in args:
+            t = get(a)
+            if t is short:
+                return short
+            if t is None:
+                unknown = True
+        return None if unknown else not short
+    if op in COMPARISONS:
+        a, b = args
+        if isinstance(a, BV):
+            return _compare(op, a, b, get(a), get(b), a.length)
+        if op in ('__eq__', '__ne__') and isinstance(a, Bool):
+            ta, tb = get(a), get(b)
+            if ta is None or tb is None:
+                return None
+            return (ta == tb) == (op == '__eq__')
+    return None
+
+_BV_OPS = frozenset((
+    'BVV', '__and__', '__or__', '__xor__', '__add__', '__mul__', '__sub__', '__invert__', '__lshift__', 'LShR',
+    '__rshift__', 'ZeroExt', 'SignExt', 'Extract', 'Concat', '__floordiv__', '__mod__', 'If',
+))
+_BOOL_OPS = frozenset(('BoolV', 'Not', 'And', 'Or')) | COMPARISONS
+
+# the cached facts of a Bool whose truth value is unknown (since None cannot be stored in the side table)
+_UNKNOWN_TRUTH = object()
+
+def _modeled(ast):
+    if isinstance(ast, BV):
+        return ast.op in _BV_OPS
+    if isinstance(ast, Bool):
+        return ast.op in _BOOL_OPS
+    return False
+
+def _leaf_facts(ast):
+    """
+    The facts of an AST that are not cached: leaves, and the ASTs whose operations the analysis does not model.
+    """
+    if isinstance(ast, BV):
+        if ast.op == 'BVV' and ast.args[0] is not None:
+            return _bv_facts(ast, None)
+        return _unknown(ast.length)
+    if isinstance(ast, Bool) and ast.op == 'BoolV':
+        return ast.args[0]
+    return None
+
+def _facts(ast):
+    if ast.depth == 1 or not _modeled(ast):
+        return _leaf_facts(ast)
+    f = _side_table.get(ast, '_known_bits')
+    if f is not None:
+        return None if f is _UNKNOWN_TRUTH else f
+
+    def get(a):
+        if a.depth == 1 or not _modeled(a):
+            return _leaf_facts(a)
+        f = _side_table.get(a, '_known_bits')
+        return None if f is _UNKNOWN_TRUTH else f
+
+    # compute the facts of the subexpressions that are not cached yet, children first
+    cutoff = lambda a: not _modeled(a) or _side_table.get(a, '_known_bits') is not None
+    for a in postorder(ast, cutoff=cutoff):
+        if a.depth == 1:
+            continue
+        f = _bv_facts(a, get) if isinstance(a, BV) else _bool_facts(a, get)
+        _side_table.set(a, '_known_bits', _UNKNOWN_TRUTH if f is None else f)
+    return get(ast)
+
+#
+# Queries
+#
+
+def known_bits(ast):
+    """
+    Returns the masks of the bits of the bitvector `ast` that are known to be 0, and to be 1.
+    """
+    f = _facts(ast)
+    return f[0], f[1]
+
+def unsigned_range(ast):
+    """
+    Returns the bounds (inclusive) of the unsigned value of the bitvector `ast`.
+    """
+    f = _facts(ast)
+    return f[2], f[3]
+
+def truth(ast):
+    """
+    Returns the truth value of the Bool `ast` if it follows from the facts of its subexpressions, or None.
+    """
+    return _facts(ast)
+
+def decide(op, args):
+    """
+    Decides the comparison `op` of the bitvectors `args` (before the AST of the comparison is built). Comparisons
+    that hold no matter what their arguments are (like `x >= 0`) are left alone, since they are used as bounds (e.g.,
+    by the balancer) and nothing is known about their arguments anyway.
+
+    :returns:   True or False, or None if it cannot be decided from the facts of the arguments.
+    """
+    a, b = args
+    fa, fb = _facts(a), _facts(b)
+    unknown = _unknown(a.length)
+    if _compare(op, a, b, fa if a.op == 'BVV' else unknown, fb if b.op == 'BVV' else unknown, a.length) is not None:
+        return None
+    r = _compare(op, a, b, fa, fb, a.length)
+    if r is not None:
+        stats.simplified += 1
+    return r
+
+def concrete_value(ast):
+    """
+    Returns the value of the BV or Bool `ast` if it is fully determined by its facts, or None. Symbolic queries are
+    counted in :data:`stats`.
+    """
+    if isinstance(ast, BV):
+        f = _facts(ast)
+        r = _exact(f)
+    elif isinstance(ast, Bool):
+        r = _facts(ast)
+    else:
+        return None
+    if ast.symbolic:
+        stats.queries += 1
+        if r is not None:
+            stats.decided += 1
+    return r
+
+from .base import _side_table
+from .bool import Bool
+from .bv import BV
+from .traversal import postorder
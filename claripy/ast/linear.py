@@ -0,0 +1,181 @@
+"""
+Linear forms of bitvector arithmetic.
+
+The linear form of a tree of `+`, `-`, unary `-`, multiplications by constants and left shifts by constants is a sum
+of terms (the subexpressions that are not such operations), each with a coefficient, plus a constant, modulo 2^n.
+For example, `(rsp - 8) + 16 - 8` is `1*rsp + 0`, and `x*4 + x*4` is `8*x + 0`. Two expressions with the same linear
+form are equal, and two expressions whose linear forms only differ in their constants are never equal, which decides
+many questions about pointer aliasing without a solver.
+"""
+
+
+class LinearForm:
+    """
+    A sum of terms with coefficients, plus a constant, modulo 2^length.
+
+    :ivar length:   The length of the bitvectors.
+    :ivar terms:    A dict from the cache keys of the terms to (term, coefficient) tuples. No coefficient is 0.
+    :ivar constant: The constant.
+    """
+
+    __slots__ = ('length', 'terms', 'constant')
+
+    def __init__(self, length, terms, constant):
+        self.length = length
+        self.terms = terms
+        self.constant = constant
+
+    def __repr__(self):
+        parts = [ '%#x*%s' % (c, t.shallow_repr()) for t, c in self.terms.values() ]
+        parts.append('%#x' % self.constant)
+        return '<LinearForm %s>' % ' + '.join(parts)
+
+    @staticmethod
+    def of_operation(op, args, limit=None):
+        """
+        Computes the linear form of the operation `op` on the bitvectors `args`.
+
+        :param limit:   The maximum number of operations to look at (LINEAR_FORM_LIMIT by default). Since a shared
+                        subexpression is looked at once for every path to it, this bounds the work on DAGs.
+        :returns:       The :class:`LinearForm`, or None if it is too large, or if `op` is not a linear operation.
+        """
+        if op not in LINEAR_OPERATIONS or not all(isinstance(a, BV) for a in args):
+            return None
+        length = args[0].length
+        mask = (1 << length) - 1
+        budget = LINEAR_FORM_LIMIT if limit is None else limit
+
+        terms = { }
+        constant = 0
+        stack = [ ]
+        if not _push(stack, op, args, 1, mask):
+            return None
+
+        while stack:
+            budget -= 1
+            if budget < 0:
+                return None
+            a, c = stack.pop()
+            if a.op == 'BVV':
+                constant += c * a.args[0]
+            elif a.annotations or not _push(stack, a.op, a.args, c, mask):
+                key = a.cache_key
+                entry = terms.get(key, None)
+                terms[key] = (a, c if entry is None else entry[1] + c)
+
+        terms = { k: (t, c & mask) for k, (t, c) in terms.items() if c & mask }
+        return LinearForm(length, terms, constant & mask)
+
+    @staticmethod
+    def of(ast, limit=None):
+        """
+        Computes the linear form of the bitvector `ast`. Any AST has one, even if it is just the AST itself as a term.
+        """
+        form = LinearForm.of_operation(ast.op, ast.args, limit=limit) if not ast.annotations else None
+        if form is None:
+            if ast.op == 'BVV':
+                return LinearForm(ast.length, { }, ast.args[0])
+            return LinearForm(ast.length, { ast.cache_key: (ast, 1) }, 0)
+        return form
+
+    def __sub__(self, other):
+        mask = (1 << self.length) - 1
+        terms = dict(self.terms)
+        for key, (t, c) in other.terms.items():
+            entry = terms.get(key, None)
+            c = (-c if entry is None else entry[1] - c) & mask
+            if c:
+                terms[key] = (t, c)
+            else:
+                del terms[key]
+        return LinearForm(self.length, terms, (self.constant - other.constant) & mask)
+
+    def to_ast(self):
+        """
+        Builds the canonical AST of this linear form: the terms (sorted by their hashes) with "positive" coefficients
+        and the constant, if it is "positive", minus the other terms and constant.
+        """
+        length = self.length
+        half = 1 << (length - 1)
+        modulus = 1 << length
+
+        positive = [ ]
+        negative = [ ]
+        for t, c in sorted(self.terms.values(), key=lambda tc: tc[0]._hash):
+            if c < half:
+                positive.append(_scale(t, c))
+            else:
+                negative.append(_scale(t, modulus - c))
+        if self.constant and (self.constant < half or not positive):
+            positive.append(BVV(self.constant, length))
+        elif self.constant:
+            negative.append(BVV(modulus - self.constant, length))
+
+        if not positive and not negative:
+            return BVV(0, length)
+        if not negative:
+            return _sum(positive)
+        if not positive:
+            return _build('__neg__', (_sum(negative),))
+        return _build('__sub__', (_sum(positive), _sum(negative)))
+
+def _push(stack, op, args, c, mask):
+    """
+    Pushes the arguments of the linear operation `op` (with their coefficients) on the stack.
+
+    :returns:   False if `op` is not a linear operation.
+    """
+    if op == '__add__':
+        stack.extend((a, c) for a in args)
+    elif op == '__sub__':
+        stack.append((args[0], c))
+        stack.append((args[1], -c))
+    elif op == '__neg__':
+        stack.append((args[0], -c))
+    elif op == '__mul__':
+        factor = 1
+        term = None
+        for a in args:
+            if a.op == 'BVV':
+                factor *= a.args[0]
+            elif term is None:
+                term = a
+            else:
+                # a product of two symbolic values
+                return False
+        if term is None:
+            stack.append((BVV(factor & mask, args[0].length), c))
+        else:
+            stack.append((term, c * factor))
+    elif op == '__lshift__':
+        if args[1].op != 'BVV':
+            return False
+        stack.append((args[0], c << min(args[1].args[0], args[0].length)))
+    else:
+        return False
+    return True
+
+def _build(op, args):
+    return BV(op, args, length=args[0].length)
+
+def _scale(t, c):
+    return t if c == 1 else _build('__mul__', (t, BVV(c, t.length)))
+
+def _sum(args):
+    return args[0] if len(args) == 1 else _build('__add__', tuple(args))
+
+def linear_difference(a, b):
+    """
+    Returns `a - b` if it is a constant (i.e., if the linear forms of `a` and `b` have the same terms), or None.
+    """
+    if not isinstance(a, BV) or a.length != b.length:
+        return None
+    d = LinearForm.of(a) - LinearForm.of(b)
+    return None if d.terms else d.constant
+
+# the operations that linear forms are made of
+LINEAR_OPERATIONS = frozenset(('__add__', '__sub__', '__neg__', '__mul__', '__lshift__'))
+# the maximum number of operations that are looked at to compute a linear form
+LINEAR_FORM_LIMIT = 256
+
+from .bv import BV, BVV
@@ -0,0 +1,248 @@
+"""
+DAG-aware traversals of ASTs.
+
+ASTs are hash-consed, so an expression is a DAG in which a subexpression may be shared by many parents. The walkers
+in this module visit every distinct subexpression exactly once (no matter how many paths lead to it), and are
+iterative, so they do not run into the recursion limit on deep ASTs.
+"""
+
+def _cutoff_for(cutoff, variables):
+    """
+    Combines an explicit cutoff predicate with a variable-set cutoff.
+    """
+    if variables is None:
+        return cutoff
+    if not isinstance(variables, frozenset):
+        variables = frozenset(variables)
+    if not variables:
+        return cutoff
+    if cutoff is None:
+        return lambda a: not a.variables >= variables
+    return lambda a: cutoff(a) or not a.variables >= variables
+
+def _roots(asts):
+    return (asts,) if isinstance(asts, Base) else asts
+
+def postorder(asts, cutoff=None, variables=None):
+    """
+    Yields every distinct AST in `asts` (a single AST or an iterable of ASTs) and their subexpressions once, children
+    before their parents.
+
+    :param cutoff:      A predicate. ASTs for which it returns True are not visited, and neither are their
+                        subexpressions (unless they can be reached otherwise).
+    :param variables:   A set of variable names. ASTs that do not contain all of these variables are cut off.
+    """
+    cutoff = _cutoff_for(cutoff, variables)
+    seen = set()
+
+    for root in _roots(asts):
+        if not isinstance(root, Base) or id(root) in seen:
+            continue
+        seen.add(id(root))
+        if cutoff is not None and cutoff(root):
+            continue
+
+        nodes = [ root ]
+        iters = [ iter(root.args) ]
+        while iters:
+            for a in iters[-1]:
+                if isinstance(a, Base):
+                    i = id(a)
+                    if i in seen:
+                        continue
+                    seen.add(i)
+                    if cutoff is not None and cutoff(a):
+                        continue
+                    if a.depth == 1:
+                        yield a
+                        continue
+                    nodes.append(a)
+                    iters.append(iter(a.args))
+                    break
+            else:
+                iters.pop()
+                yield nodes.pop()
+
+def preorder(asts, cutoff=None, variables=None):
+    """
+    Yields every distinct AST in `asts` (a single AST or an iterable of ASTs) and their subexpressions once, parents
+    before their children.
+
+    :param cutoff:      A predicate. ASTs for which it returns True are not visited, and neither are their
+                        subexpressions (unless they can be reached otherwise).
+    :param variables:   A set of variable names. ASTs that do not contain all of these variables are cut off.
+    """
+    cutoff = _cutoff_for(cutoff, variables)
+    seen = set()
+
+    stack = [ a for a in _roots(asts) if isinstance(a, Base) ]
+    stack.reverse()
+    while stack:
+        ast = stack.pop()
+        if id(ast) in seen:
+            continue
+        seen.add(id(ast))
+        if cutoff is not None and cutoff(ast):
+            continue
+
+        yield ast
+        stack.extend(a for a in reversed(ast.args) if isinstance(a, Base) and id(a) not in seen)
+
+def leaves(asts, cutoff=None, variables=None):
+    """
+    Yields every distinct leaf AST (BVS, BVV, BoolS, ...) in `asts`, in pre-order.
+    """
+    for ast in preorder(asts, cutoff=cutoff, variables=variables):
+        if ast.depth == 1:
+            yield ast
+
+
+class Rewriter:
+    """
+    Rebuilds ASTs bottom-up, applying rewrite callbacks to their subexpressions. Every distinct subexpression is
+    rewritten once, and the results are memoized (per call by default, or across calls when a `memo` is passed in).
+
+    For each AST, the following happens:
+
+    1. The pre-callbacks are called with the AST. If one of them returns something other than None, that is the
+       result for the AST, and it is not descended into.
+    2. If the AST is cut off (see `cutoff` and `variables`), it is left as is.
+    3. Otherwise, its arguments are rewritten, and the AST is rebuilt from them with `rebuild` (by default, with
+       `make_like`, and only if an argument changed).
+    4. The post-callbacks are called with the rebuilt AST. If one of them returns something other than None, that
+       is the result for the AST.
+
+    Callbacks can be registered for a specific operation, or (with `op=None`) for all ASTs. Operation-specific
+    callbacks run first.
+    """
+
+    __slots__ = ('_pre', '_post', '_pre_any', '_post_any', 'cutoff', 'rebuild', 'on_change')
+
+    def __init__(self, pre=None, post=None, cutoff=None, variables=None, rebuild=None, on_change=None):
+        """
+        :param pre:         A pre-callback for all ASTs.
+        :param post:        A post-callback for all ASTs.
+        :param cutoff:      A predicate. ASTs for which it returns True are not descended into.
+        :param variables:   A set of variable names. ASTs that do not contain all of these variables are not
+                            descended into.
+        :param rebuild:     A function (ast, new_args) -> AST, used to rebuild an AST from its rewritten arguments.
+        :param on_change:   A function (old, new) that is called for every AST that is rewritten into a different one.
+        """
+        self._pre = { }
+        self._post = { }
+        self._pre_any = [ pre ] if pre is not None else [ ]
+        self._post_any = [ post ] if post is not None else [ ]
+        self.cutoff = _cutoff_for(cutoff, variables)
+        self.rebuild = rebuild if rebuild is not None else self._default_rebuild
+        self.on_change = on_change
+
+    def register(self, op, callback, pre=False):
+        """
+        Registers a rewrite callback.
+
+        :param op:          The operation whose ASTs the callback applies to, or None for all ASTs.
+        :param callback:    A function that takes an AST and returns its replacement, or None to leave it as is.
+        :param pre:         Whether the callback runs before (True) or after (False) the AST's arguments are rewritten.
+        """
+        if op is None:
+            (self._pre_any if pre else self._post_any).append(callback)
+        else:
+            (self._pre if pre else self._post).setdefault(op, [ ]).append(callback)
+        return self
+
+    @staticmethod
+    def _default_rebuild(ast, args):
+        if all(a is b for a, b in zip(ast.args, args)):
+            return ast
+        return ast.make_like(ast.op, args)
+
+    @staticmethod
+    def _apply(callbacks, ast):
+        for c in callbacks:
+            r = c(ast)
+            if r is not None:
+                return r
+        return None
+
+    def rewrite(self, ast, memo=None):
+        """
+        Returns the rewritten `ast`.
+
+        :param memo:    A dict from id(AST) to rewritten AST. The ASTs whose ids are keys must be kept alive for as long
+                        as the memo is used.
+        """
+        return self.rewrite_many((ast,), memo=memo)[0]
+
+    def rewrite_many(self, asts, memo=None):
+        """
+        Rewrites several ASTs at once, sharing the work spent on their common subexpressions.
+
+        :returns:       A list of the rewritten ASTs.
+        """
+        memo = { } if memo is None else memo
+        pre_by_op, post_by_op = self._pre, self._post
+        pre_any, post_any = self._pre_any, self._post_any
+        cutoff, rebuild, on_change = self.cutoff, self.rebuild, self.on_change
+        apply = self._apply
+
+        expanded = set()
+        for root in asts:
+            if not isinstance(root, Base):
+                continue
+
+            stack = [ root ]
+            while stack:
+                ast = stack[-1]
+                i = id(ast)
+                if i in memo:
+                    stack.pop()
+                    continue
+
+                if i not in expanded:
+                    r = None
+                    if pre_by_op:
+                        cbs = pre_by_op.get(ast.op, None)
+                        if cbs is not None:
+                            r = apply(cbs, ast)
+                    if r is None and pre_any:
+                        r = apply(pre_any, ast)
+                    if r is None and cutoff is not None and cutoff(ast):
+                        r = ast
+                    if r is None and ast.depth > 1:
+                        expanded.add(i)
+                        stack.extend(a for a in ast.args if isinstance(a, Base) and id(a) not in memo)
+                        continue
+                    if r is not None:
+                        stack.pop()
+                        memo[i] = r
+                        if on_change is not None and r is not ast:
+                            on_change(ast, r)
+                        continue
+                    new = ast
+                else:
+                    new = rebuild(ast, tuple(memo[id(a)] if isinstance(a, Base) else a for a in ast.args))
+
+                stack.pop()
+                if post_by_op:
+                    cbs = post_by_op.get(new.op, None)
+                    if cbs is not None:
+                        r = apply(cbs, new)
+                        if r is not None:
+                            new = r
+                if post_any:
+                    r = apply(post_any, new)
+                    if r is not None:
+                        new = r
+                memo[i] = new
+                if on_change is not None and new is not ast:
+                    on_change(ast, new)
+
+        return [ memo[id(a)] if isinstance(a, Base) else a for a in asts ]
+
+def rewrite(ast, pre=None, post=None, cutoff=None, variables=None):
+    """
+    Rewrites `ast` with the given callbacks. See :class:`Rewriter`.
+    """
+    return Rewriter(pre=pre, post=post, cutoff=cutoff, variables=variables).rewrite(ast)
+
+from .base import Base
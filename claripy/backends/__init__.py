@@ -1,4 +1,6 @@
 import ctypes
+from collections import OrderedDict
+import itertools
 import weakref
 import operator
 import threading
@@ -7,6 +9,104 @@ import numbers
 import logging
 l = logging.getLogger('claripy.backend')
 
+_backend_ids = itertools.count()
+# the number of backends that get an errored bit in Base._flags. Backends created after that record the ASTs they
+# failed to convert in the side table instead (where the parents of these ASTs do not inherit it), so that _flags stays
+# a small int no matter how many backends are made.
+_ERRORED_FLAG_WIDTH = 25
+
+
+class _Shard:
+    __slots__ = ('entries', 'lock', 'hits', 'misses', 'evictions')
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class SharedObjectCache:
+    """
+    A bounded cache of converted backend objects that is shared by all threads, unlike the per-thread caches of
+    :class:`Backend`. It is keyed by the cache keys of the ASTs, so it keeps the ASTs of its entries alive (and an AST
+    that is rebuilt later is the same object, and still finds its object). The entries are split into shards, each an
+    LRU with its own lock, so that threads that convert different ASTs rarely contend.
+
+    It can stand in for the per-thread caches: its `get()` and `__setitem__()` take the cache keys of ASTs.
+    """
+
+    __slots__ = ('size', '_shards', '_mask', '_shard_size')
+
+    def __init__(self, size, shards=16):
+        if size <= 0:
+            raise ValueError("shared object cache size must be positive")
+        if shards <= 0 or shards & (shards - 1):
+            raise ValueError("the number of shards must be a power of two")
+        self.size = size
+        self._shards = tuple(_Shard() for _ in range(shards))
+        self._mask = shards - 1
+        self._shard_size = max(1, -(-size // shards))
+
+    def __len__(self):
+        return sum(len(s.entries) for s in self._shards)
+
+    def _shard(self, h):
+        return self._shards[hash(h) & self._mask]
+
+    def get(self, cache_key, default=None):
+        shard = self._shard(cache_key.ast._hash)
+        with shard.lock:
+            entries = shard.entries
+            obj = entries.get(cache_key, None)
+            if obj is None:
+                shard.misses += 1
+                return default
+            entries.move_to_end(cache_key)
+            shard.hits += 1
+            return obj
+
+    def __setitem__(self, cache_key, obj):
+        shard = self._shard(cache_key.ast._hash)
+        with shard.lock:
+            entries = shard.entries
+            entries[cache_key] = obj
+            entries.move_to_end(cache_key)
+            if len(entries) > self._shard_size:
+                entries.popitem(last=False)
+                shard.evictions += 1
+
+    def clear(self):
+        """
+        Drops all the cached objects, and resets the counters.
+        """
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.hits = 0
+                shard.misses = 0
+                shard.evictions = 0
+
+    def stats(self):
+        """
+        Reports the state of the cache.
+
+        :returns:   A dict with the size, number of shards and entries, hits, misses, evictions and hit rate of the cache.
+        """
+        hits = sum(s.hits for s in self._shards)
+        misses = sum(s.misses for s in self._shards)
+        return {
+            'size': self.size,
+            'shards': len(self._shards),
+            'entries': len(self),
+            'hits': hits,
+            'misses': misses,
+            'evictions': sum(s.evictions for s in self._shards),
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
 class Backend:
     """
     Backends are Claripy's workhorses. Claripy exposes ASTs (claripy.ast.Base objects)
@@ -48,9 +148,16 @@ class Backend:
     _convert() to see if the backend can handle that type of object.
     """
 
-    __slots__ = ('_op_raw', '_op_expr', '_cache_objects', '_solver_required', '_tls', '_true_cache', '_false_cache', )
+    __slots__ = ('_op_raw', '_op_expr', '_cache_objects', '_solver_required', '_tls', '_true_cache', '_false_cache',
+                 '_errored_flag', '_shared_cache', )
+
+    # whether the objects of this backend can be used by several threads, and so be kept in a SharedObjectCache
+    _shareable_objects = False
 
     def __init__(self, solver_required=None):
+        # the bit in Base._flags that records that an AST could not be converted by this backend (0 if the bits ran out)
+        backend_id = next(_backend_ids)
+        self._errored_flag = ERRORED_FLAG_BASE << backend_id if backend_id < _ERRORED_FLAG_WIDTH else 0
         self._op_raw = { }
         self._op_expr = { }
         self._cache_objects = True
@@ -59,6 +166,7 @@ class Backend:
         self._tls = threading.local()
         self._true_cache = weakref.WeakKeyDictionary()
         self._false_cache = weakref.WeakKeyDictionary()
+        self._shared_cache = None
 
     @property
     def is_smt_backend(self):
@@ -72,6 +180,30 @@ class Backend:
             self._tls.object_cache = weakref.WeakKeyDictionary()
             return self._tls.object_cache
 
+    def set_shared_object_cache_size(self, size, shards=16):
+        """
+        Makes all threads share one cache of converted objects, instead of each converting (and caching) ASTs on its
+        own. The cache is bounded, and evicts the least recently used objects. Only backends whose objects can be used
+        from any thread support this.
+
+        :param size:    The maximum number of cached objects. 0 goes back to the per-thread caches.
+        :param shards:  The number of independently locked parts of the cache (a power of two).
+        :returns:       The previous size (0 if the cache was not shared).
+        """
+        if size < 0:
+            raise ValueError("shared object cache size must be non-negative")
+        if size and not self._shareable_objects:
+            raise BackendError("%s objects cannot be shared between threads" % self.__class__.__name__)
+        old = self._shared_cache.size if self._shared_cache is not None else 0
+        self._shared_cache = SharedObjectCache(size, shards=shards) if size else None
+        return old
+
+    def shared_object_cache_stats(self):
+        """
+        Reports the state of the shared object cache (see :meth:`SharedObjectCache.stats`), or None if it is disabled.
+        """
+        return self._shared_cache.stats() if self._shared_cache is not None else None
+
     def _make_raw_ops(self, op_list, op_dict=None, op_module=None):
         for o in op_list:
             if op_dict is not None:
@@ -122,6 +254,8 @@ class Backend:
         Clears all caches associated with this backend.
         """
         self._object_cache.clear()
+        if self._shared_cache is not None:
+            self._shared_cache.clear()
         self._true_cache.clear()
         self._false_cache.clear()
 
@@ -143,32 +277,74 @@ class Backend:
         Resolves a claripy.ast.Base into something usable by the backend.
 
         :param expr:    The expression.
-        :param save:    Save the result in the expression's object cache
         :return:        A backend object.
         """
-        ast_queue = [[expr]]
-        arg_queue = []
-        op_queue = []
+        try:
+            return self._convert_many([ expr ])[0]
+        except BackendError:
+            if isinstance(expr, Base):
+                expr._set_errored(self)
+            raise
+
+    def convert_list(self, args):
+        """
+        Resolves a sequence of claripy.ast.Base (and numbers, which are left as they are) into backend objects. This
+        converts the subexpressions that the ASTs share only once, even in backends that do not cache converted
+        objects.
+
+        :param args:    The expressions.
+        :return:        A list of backend objects.
+        """
+        exprs = [ a for a in args if not isinstance(a, numbers.Number) ]
+        converted = self._convert_many(exprs)
+        if len(exprs) == len(args):
+            return converted
+        converted = iter(converted)
+        return [ a if isinstance(a, numbers.Number) else next(converted) for a in args ]
+
+    def _convert_many(self, exprs):
+        """
+        Converts the expressions `exprs` in a single walk over the DAG of all of them.
+
+        :returns:   The list of their backend objects.
+        """
+        # the lists of ASTs to convert are reversed, so that they are converted left to right by popping from the end
+        ast_queue = [ list(reversed(exprs)) ]
+        arg_queue = [ ]
+        op_queue = [ ]
+        cache = self._shared_cache
+        if cache is None and self._cache_objects:
+            cache = self._object_cache
+        # the objects converted during this call, so that each shared subexpression is converted (and looked up in the
+        # cache) only once
+        memo = { }
+        errored_flag = self._errored_flag
 
         try:
             while ast_queue:
                 args_list = ast_queue[-1]
 
                 if args_list:
-                    ast = args_list.pop(0)
+                    ast = args_list.pop()
 
                     if type(ast) in {bool, int, str, float} or not isinstance(ast, Base):
                         converted = self._convert(ast)
                         arg_queue.append(converted)
                         continue
 
-                    if self in ast._errored:
+                    converted = memo.get(id(ast), None)
+                    if converted is not None:
+                        arg_queue.append(converted)
+                        continue
+
+                    if (ast._flags & errored_flag) if errored_flag else ast._is_errored(self):
                         raise BackendError("%s can't handle operation %s (%s) due to a failed "
                                            "conversion on a child node" % (self, ast.op, ast.__class__.__name__))
 
-                    if self._cache_objects:
-                        cached_obj = self._object_cache.get(ast._cache_key, None)
+                    if cache is not None:
+                        cached_obj = cache.get(ast._cache_key, None)
                         if cached_obj is not None:
+                            memo[id(ast)] = cached_obj
                             arg_queue.append(cached_obj)
                             continue
 
@@ -176,7 +352,7 @@ class Backend:
                     if ast.op in self._op_expr:
                         ast_queue.append(None)
                     else:
-                        ast_queue.append(list(ast.args))
+                        ast_queue.append(list(reversed(ast.args)))
 
                 else:
                     ast_queue.pop()
@@ -200,8 +376,9 @@ class Backend:
                         for a in ast.annotations:
                             r = self.apply_annotation(r, a)
 
-                        if self._cache_objects:
-                            self._object_cache[ast._cache_key] = r
+                        if cache is not None:
+                            cache[ast._cache_key] = r
+                        memo[id(ast)] = r
 
                         arg_queue.append(r)
 
@@ -210,20 +387,15 @@ class Backend:
 
         except BackendError:
             for ast in op_queue:
-                ast._errored.add(self)
-            if isinstance(expr, Base):
-                expr._errored.add(self)
+                ast._set_errored(self)
             raise
 
         # Note: Uncomment the following assertions if you are touching the above implementation
         # assert len(op_queue) == 0, "op_queue is not empty"
         # assert len(ast_queue) == 0, "ast_queue is not empty"
-        # assert len(arg_queue) == 1, ("arg_queue has unexpected length", len(arg_queue))
+        # assert len(arg_queue) == len(exprs), ("arg_queue has unexpected length", len(arg_queue))
 
-        return arg_queue.pop()
-
-    def convert_list(self, args):
-        return [ a if isinstance(a, numbers.Number) else self.convert(a) for a in args ]
+        return arg_queue
 
     #
     # These functions provide support for applying operations to expressions.
@@ -529,10 +701,12 @@ class Backend:
         if self._solver_required and solver is None:
             raise BackendError("%s requires a solver for batch evaluation" % self.__class__.__name__)
 
-        converted_exprs = [ self.convert(ex) for ex in exprs ]
+        # the expressions and the extra constraints are converted together, so that they share their subexpressions
+        converted = self.convert_list(tuple(exprs) + tuple(extra_constraints))
+        converted_exprs = converted[:len(exprs)]
 
         return self._batch_eval(
-            converted_exprs, n, extra_constraints=self.convert_list(extra_constraints),
+            converted_exprs, n, extra_constraints=converted[len(exprs):],
             solver=solver, model_callback=model_callback
         )
 
@@ -772,6 +946,6 @@ from .backend_z3 import BackendZ3
 from .backend_z3_parallel import BackendZ3Parallel
 from .backend_concrete import BackendConcrete
 from .backend_vsa import BackendVSA
-from ..ast.base import Base
+from ..ast.base import Base, ERRORED_FLAG_BASE
 # If you need support for multiple solvers, please import claripy.backends.backend_smtlib_solvers by yourself
 # from .backend_smtlib_solvers import *
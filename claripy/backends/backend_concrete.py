@@ -12,6 +12,8 @@ class BackendConcrete(Backend):
 
     __slots__ = tuple()
 
+    _shareable_objects = True
+
     def __init__(self):
         Backend.__init__(self)
         self._make_raw_ops(set(backend_operations) - { 'If' }, op_module=bv)
@@ -91,16 +93,37 @@ class BackendConcrete(Backend):
         """
         Override Backend.convert() to add fast paths for BVVs and BoolVs.
         """
+        r = self._convert_constant(expr)
+        return super().convert(expr) if r is None else r
+
+    def convert_list(self, args):
+        """
+        Override Backend.convert_list() to add the fast paths of convert(). Only the other ASTs are converted in a batch.
+        """
+        converted = [ self._convert_constant(a) for a in args ]
+        rest = [ a for a, r in zip(args, converted) if r is None ]
+        if not rest:
+            return converted
+        rest = iter(super().convert_list(rest))
+        return [ next(rest) if r is None else r for r in converted ]
+
+    def _convert_constant(self, expr):
+        """
+        Converts BVVs and BoolVs without walking them.
+
+        :returns:   The backend object, or None if `expr` is not a BVV or a BoolV.
+        """
         if type(expr) is BV:
             if expr.op == "BVV":
-                cached_obj = self._object_cache.get(expr._cache_key, None)
+                cache = self._shared_cache if self._shared_cache is not None else self._object_cache
+                cached_obj = cache.get(expr._cache_key, None)
                 if cached_obj is None:
                     cached_obj = self.BVV(*expr.args)
-                    self._object_cache[expr._cache_key] = cached_obj
+                    cache[expr._cache_key] = cached_obj
                 return cached_obj
         if type(expr) is Bool and expr.op == "BoolV":
             return expr.args[0]
-        return super().convert(expr)
+        return None
 
     def _If(self, b, t, f): #pylint:disable=no-self-use,unused-argument
         if not isinstance(b, bool):
@@ -94,6 +94,8 @@ class SmartLRUCache(LRUCache):
 from . import Backend
 class BackendZ3(Backend):
     _split_on = { 'And', 'Or' }
+    # Z3 objects belong to the context of the thread that created them
+    _shareable_objects = False
 
     def __init__(self, reuse_z3_solver=None, ast_cache_size=10000):
         Backend.__init__(self, solver_required=True)
@@ -822,7 +824,7 @@ class BackendZ3(Backend):
             lo = 0
             hi = 2**expr.size()-1
 
-        extra_constraints_converted = [self.convert(e) for e in extra_constraints]
+        extra_constraints_converted = self.convert_list(extra_constraints)
         new_constraints = []
 
         GE = operator.ge if signed else z3.UGE
@@ -877,7 +879,7 @@ class BackendZ3(Backend):
             lo = 0
             hi = 2**expr.size()-1
 
-        extra_constraints_converted = [self.convert(e) for e in extra_constraints]
+        extra_constraints_converted = self.convert_list(extra_constraints)
         new_constraints = []
 
         GT = operator.gt if signed else z3.UGT
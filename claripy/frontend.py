@@ -217,6 +217,9 @@ class Frontend:
     def _concrete_value(self, e): #pylint:disable=no-self-use
         if isinstance(e, numbers.Number):
             return e
+        elif isinstance(e, ast.Base) and e.symbolic:
+            # symbolic expressions whose value follows from their known bits do not need a solver
+            return known_bits.concrete_value(e)
         else:
             return None
     _concrete_constraint = _concrete_value
@@ -236,35 +239,7 @@ class Frontend:
 
         l.debug("... splitted of size %d", len(splitted))
 
-        concrete_constraints = [ ]
-        variable_connections = { }
-        constraint_connections = { }
-        for n,s in enumerate(splitted):
-            l.debug("... processing constraint with %d variables", len(s.variables))
-
-            connected_variables = set(s.variables)
-            connected_constraints = { n }
-
-            if len(connected_variables) == 0:
-                concrete_constraints.append(s)
-
-            for v in s.variables:
-                if v in variable_connections:
-                    connected_variables |= variable_connections[v]
-                if v in constraint_connections:
-                    connected_constraints |= constraint_connections[v]
-
-            for v in connected_variables:
-                variable_connections[v] = connected_variables
-                constraint_connections[v] = connected_constraints
-
-        unique_constraint_sets = set()
-        for v in variable_connections:
-            unique_constraint_sets.add((frozenset(variable_connections[v]), frozenset(constraint_connections[v])))
-
-        results = [ ]
-        for v,c_indexes in unique_constraint_sets:
-            results.append((set(v), [ splitted[c] for c in c_indexes ]))
+        results, concrete_constraints = _dependent_groups(splitted)
 
         if concrete and len(concrete_constraints) > 0:
             results.append(({ 'CONCRETE' }, concrete_constraints))
@@ -272,3 +247,5 @@ class Frontend:
         return results
 
 from . import ast
+from .ast import known_bits
+from .ast.base import _dependent_groups
@@ -55,8 +55,16 @@ class ModelCache:
         """
         # If there was no last value, it was not constrained, so we can use
         # anything.
-        new_ast = ast.replace_dict(self.replacements, leaf_operation=self._leaf_op)
-        return backends.concrete.eval(new_ast, 1)[0]
+        return next(self._eval_many((ast,)))
+
+    def _eval_many(self, asts):
+        """
+        Lazily evaluates the asts like eval_ast(). The rewritten subexpressions are memoized in self.replacements, so
+        subexpressions shared between the asts, or with asts evaluated earlier against this model, are only rewritten
+        once.
+        """
+        for ast in asts:
+            yield backends.concrete.eval(ast.replace_dict(self.replacements, leaf_operation=self._leaf_op), 1)[0]
 
     def eval_constraints(self, constraints):
         """Returns whether the constraints is satisfied trivially by using the
@@ -64,12 +72,12 @@ class ModelCache:
         # eval_ast is concretizing symbols and evaluating them, this can raise
         # exceptions.
         try:
-            return all(self.eval_ast(c) for c in constraints)
+            return all(self._eval_many(constraints))
         except errors.ClaripyZeroDivisionError:
             return False
 
     def eval_list(self, asts):
-        return tuple(self.eval_ast(c) for c in asts)
+        return tuple(self._eval_many(asts))
 
 class ModelCacheMixin:
     def __init__(self, *args, **kwargs):
@@ -146,7 +154,7 @@ class ModelCacheMixin:
         if len(constraints) == 0:
             return constraints
 
-        old_vars = frozenset(self.variables)
+        old_vars = frozenset(self._variables)
         added = super(ModelCacheMixin, self).add(constraints, **kwargs)
         if len(added) == 0:
             return added
@@ -154,7 +162,7 @@ class ModelCacheMixin:
         if len(self.constraints) == 1 and len(self._models) == 0:
             self._trivial_model_optimization()
 
-        new_vars = any(a.variables - old_vars for a in added)
+        new_vars = any(not a.variables <= old_vars for a in { id(a.variables): a for a in added }.values())
         if new_vars or invalidate_cache:
             # shortcut for unsat
             if any(c is false for c in constraints):
@@ -175,7 +183,7 @@ class ModelCacheMixin:
     def split(self):
         results = super(ModelCacheMixin, self).split()
         for r in results:
-            r._models = { m.filter(r.variables) for m in self._models }
+            r._models = { m.filter(r._variables) for m in self._models }
         return results
 
     def combine(self, others):
@@ -185,8 +193,8 @@ class ModelCacheMixin:
             # this would need a solve anyways, so screw it
             return combined
 
-        vars_count = len(self.variables) + sum(len(s.variables) for s in others)
-        all_vars = self.variables.union(*[s.variables for s in others])
+        vars_count = len(self._variables) + sum(len(s._variables) for s in others)
+        all_vars = self._variables.union(*[s._variables for s in others])
         if vars_count != len(all_vars):
             # this is the case where there are variables missing from the models.
             # We'll need more intelligence here to handle it
@@ -205,7 +213,7 @@ class ModelCacheMixin:
         Updates this cache mixin with results discovered by the other split off one.
         """
 
-        acceptable_models = [ m for m in other._models if set(m.model.keys()) == self.variables ]
+        acceptable_models = [ m for m in other._models if set(m.model.keys()) == self._variables ]
         self._models.update(acceptable_models)
         self._eval_exhausted.update(other._eval_exhausted)
         self._max_exhausted.update(other._max_exhausted)
@@ -219,8 +227,9 @@ class ModelCacheMixin:
 
     def _model_hook(self, m):
         # Z3 might give us solutions for variables that we did not ask for. so we create a new dict with solutions for
-        # only the variables that are under the solver's control
-        m_ = dict((k, v) for k, v in m.items() if k in self.variables)
+        # only the variables that are under the solver's control (including the ones that the frontend does not report
+        # in `variables`, like outlined variables)
+        m_ = dict((k, v) for k, v in m.items() if k in self._variables)
         model = ModelCache(m_)
         self._models.add(model)
 
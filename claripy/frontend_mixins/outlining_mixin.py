@@ -0,0 +1,201 @@
+import logging
+
+l = logging.getLogger("claripy.frontend_mixins.outlining_mixin")
+
+class OutliningMixin:
+    """
+    Keeps the expressions that reach the rest of the frontend shallow, by outlining deep subexpressions.
+
+    When enabled (with the `outline_depth` keyword argument), every subexpression that would make a constraint (or an
+    expression to evaluate) deeper than `outline_depth` is replaced by a fresh variable, whose definition (a constraint
+    that equates it to the subexpression) is added to the frontend next to the first constraint that needs it. Queries
+    pass the definitions of the outlined variables that only the query itself involves as extra constraints, so they do
+    not change the constraints of the frontend. Since outlined variables are fully determined by the variables of their
+    definitions, this does not change the results of any query, and they are not reported in `variables`. The
+    Python-side work on the constraints (splitting, caching, evaluating models, converting them for the backends) is
+    then done on the outlined skeleton, and deep expressions no longer run into the recursion limit.
+
+    The same subexpression is always outlined to the same variable, so repeated queries, branches and copies of the
+    frontend share their definitions. `is_true` and `is_false` only look at the structure of the expression, which
+    outlining would hide, so they are left alone.
+    """
+
+    def __init__(self, *args, outline_depth=None, **kwargs):
+        self._outline_depth = outline_depth
+        self._outlined = { }
+        self._definitions = { }
+        super(OutliningMixin, self).__init__(*args, **kwargs)
+
+    def _blank_copy(self, c):
+        super(OutliningMixin, self)._blank_copy(c)
+        c._outline_depth = self._outline_depth
+        # constraints of this frontend (with their outlined variables) may be added to the copy
+        c._outlined = dict(self._outlined)
+        c._definitions = dict(self._definitions)
+
+    def _copy(self, c):
+        super(OutliningMixin, self)._copy(c)
+        c._outlined = dict(self._outlined)
+        c._definitions = dict(self._definitions)
+
+    def _merge_outlined(self, others):
+        """
+        Adds the outlined subexpressions of the frontends `others` to the ones of this frontend.
+        """
+        for o in others:
+            for k, v in getattr(o, '_outlined', { }).items():
+                if self._outlined.setdefault(k, v) is v:
+                    name = next(iter(v.variables))
+                    self._definitions.setdefault(name, o._definitions[name])
+
+    def __getstate__(self):
+        return self._outline_depth, [ (k.ast, v) for k, v in self._outlined.items() ], super().__getstate__()
+
+    def __setstate__(self, s):
+        if len(s) != 3:
+            # pickled before outlining was added
+            self._outline_depth, self._outlined, self._definitions = None, { }, { }
+            super().__setstate__(s)
+            return
+        self._outline_depth, outlined, base_state = s
+        self._outlined = { k.cache_key: v for k, v in outlined }
+        self._definitions = { next(iter(v.variables)): v == k for k, v in outlined }
+        super().__setstate__(base_state)
+
+    @property
+    def variables(self):
+        variables = super(OutliningMixin, self).variables
+        if not self._definitions:
+            return variables
+        return variables.difference(self._definitions)
+
+    #
+    # Outlining
+    #
+
+    def _outline_variable(self, ast):
+        if isinstance(ast, BV):
+            return BVS('outlined', ast.length)
+        if isinstance(ast, Bool):
+            return BoolS('outlined')
+        return None
+
+    def _outline(self, asts):
+        """
+        Outlines the deep subexpressions of `asts`, and records the definitions of the new outlined variables.
+
+        :returns:   A list of the outlined ASTs.
+        """
+        depth = self._outline_depth
+        if depth is None or not any(isinstance(a, Base) and a.depth > depth for a in asts):
+            return asts
+
+        outlined = self._outlined
+        definitions = self._definitions
+
+        def _post(ast):
+            if ast.depth <= depth:
+                return None
+            try:
+                return outlined[ast.cache_key]
+            except KeyError:
+                pass
+            v = self._outline_variable(ast)
+            if v is None:
+                return None
+            outlined[ast.cache_key] = v
+            definitions[next(iter(v.variables))] = v == ast
+            l.debug("Outlined a subexpression of depth %d", ast.depth)
+            return v
+
+        # only the subexpressions that are deeper than the budget are rebuilt
+        return Rewriter(post=_post, cutoff=lambda ast: ast.depth <= depth).rewrite_many(asts)
+
+    def _definitions_for(self, asts):
+        """
+        Collects the definitions of the outlined variables that `asts` involve (directly, or through other
+        definitions), except for the ones that the frontend already has.
+
+        :returns:   A list of the definitions that are not in `asts` already.
+        """
+        definitions = self._definitions
+        if not definitions:
+            return [ ]
+
+        # the definitions of the outlined variables of the frontend were added with them
+        known = super(OutliningMixin, self).variables
+        needed = { }
+        pending = [ a.variables for a in asts if isinstance(a, Base) ]
+        while pending:
+            for name in pending.pop():
+                if name not in needed and name not in known and name in definitions:
+                    d = needed[name] = definitions[name]
+                    pending.append(d.variables)
+        given = { id(a) for a in asts }
+        return [ d for d in needed.values() if id(d) not in given ]
+
+    def _outline_query(self, asts, extra_constraints):
+        """
+        Outlines the expressions and extra constraints of a query.
+
+        :returns:   The outlined expressions, and the outlined extra constraints followed by the definitions of the
+                    outlined variables that the query involves and that the frontend does not have.
+        """
+        if self._outline_depth is None:
+            return asts, extra_constraints
+
+        outlined = self._outline(tuple(asts) + tuple(extra_constraints))
+        return outlined[:len(asts)], tuple(outlined[len(asts):]) + tuple(self._definitions_for(outlined))
+
+    #
+    # Frontend methods
+    #
+
+    def add(self, constraints, **kwargs):
+        if self._outline_depth is None:
+            return super(OutliningMixin, self).add(constraints, **kwargs)
+        outlined = list(self._outline(constraints))
+        return super(OutliningMixin, self).add(outlined + self._definitions_for(outlined), **kwargs)
+
+    def combine(self, others):
+        combined = super(OutliningMixin, self).combine(others)
+        combined._merge_outlined(others)
+        return combined
+
+    def merge(self, others, merge_conditions, common_ancestor=None):
+        r = super(OutliningMixin, self).merge(others, merge_conditions, common_ancestor=common_ancestor)
+        r[-1]._merge_outlined([ self ] + others)
+        return r
+
+    def check_satisfiability(self, extra_constraints=(), **kwargs):
+        _, ec = self._outline_query((), extra_constraints)
+        return super(OutliningMixin, self).check_satisfiability(extra_constraints=ec, **kwargs)
+
+    def satisfiable(self, extra_constraints=(), **kwargs):
+        _, ec = self._outline_query((), extra_constraints)
+        return super(OutliningMixin, self).satisfiable(extra_constraints=ec, **kwargs)
+
+    def eval(self, e, n, extra_constraints=(), **kwargs):
+        (e,), ec = self._outline_query((e,), extra_constraints)
+        return super(OutliningMixin, self).eval(e, n, extra_constraints=ec, **kwargs)
+
+    def batch_eval(self, exprs, n, extra_constraints=(), **kwargs):
+        exprs, ec = self._outline_query(exprs, extra_constraints)
+        return super(OutliningMixin, self).batch_eval(exprs, n, extra_constraints=ec, **kwargs)
+
+    def max(self, e, extra_constraints=(), **kwargs):
+        (e,), ec = self._outline_query((e,), extra_constraints)
+        return super(OutliningMixin, self).max(e, extra_constraints=ec, **kwargs)
+
+    def min(self, e, extra_constraints=(), **kwargs):
+        (e,), ec = self._outline_query((e,), extra_constraints)
+        return super(OutliningMixin, self).min(e, extra_constraints=ec, **kwargs)
+
+    def solution(self, e, v, extra_constraints=(), **kwargs):
+        (e, v), ec = self._outline_query((e, v), extra_constraints)
+        return super(OutliningMixin, self).solution(e, v, extra_constraints=ec, **kwargs)
+
+from ..ast.base import Base
+from ..ast.bool import Bool, BoolS
+from ..ast.bv import BV, BVS
+from ..ast.traversal import Rewriter
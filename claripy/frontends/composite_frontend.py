@@ -101,18 +101,12 @@ class CompositeFrontend(ConstrainedFrontend):
     def _names_for(names=None, lst=None, lst2=None, e=None, v=None):
         if names is None:
             names = set()
-        if e is not None and isinstance(e, Base):
-            names.update(e.variables)
-        if v is not None and isinstance(v, Base):
-            names.update(v.variables)
-        if lst is not None:
-            for ee in lst:
-                if isinstance(ee, Base):
-                    names.update(ee.variables)
-        if lst2 is not None:
-            for ee in lst2:
-                if isinstance(ee, Base):
-                    names.update(ee.variables)
+        # variable sets are interned, so we only need to look at each distinct set once
+        seen = set()
+        for ee in itertools.chain((e, v), lst or (), lst2 or ()):
+            if isinstance(ee, Base) and id(ee.variables) not in seen:
+                seen.add(id(ee.variables))
+                names.update(ee.variables)
         return names
 
     def _merged_solver_for(self, *args, **kwargs):
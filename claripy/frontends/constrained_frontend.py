@@ -8,36 +8,54 @@ from ..frontend import Frontend
 
 
 class ConstrainedFrontend(Frontend):  # pylint:disable=abstract-method
-    def __init__(self):
+    def __init__(self, simplify_method=None):
+        """
+        :param simplify_method: How simplify() simplifies the constraints (see :func:`claripy.ast.base.simplify`).
+        """
         Frontend.__init__(self)
         self.constraints = []
-        self.variables = set()
+        self._variables = set()
         self._finalized = False
+        self._simplify_method = simplify_method
 
     def _blank_copy(self, c):
         super()._blank_copy(c)
         c.constraints = []
-        c.variables = set()
+        c._variables = set()
         c._finalized = False
+        c._simplify_method = self._simplify_method
 
     def _copy(self, c):
         super()._copy(c)
         c.constraints = list(self.constraints)
-        c.variables = set(self.variables)
+        c._variables = set(self._variables)
 
         # finalize both
         self.finalize()
         c.finalize()
 
+    @property
+    def variables(self):
+        return self._variables
+
+    @variables.setter
+    def variables(self, v):
+        self._variables = v
+
     #
     # Serialization support
     #
 
     def __getstate__(self):
-        return self.constraints, self.variables, self._finalized, super().__getstate__()
+        return self.constraints, self._variables, self._finalized, self._simplify_method, super().__getstate__()
 
     def __setstate__(self, s):
-        self.constraints, self.variables, self._finalized, base_state = s
+        if len(s) == 4:
+            # pickled before simplify_method was added
+            self.constraints, self._variables, self._finalized, base_state = s
+            self._simplify_method = None
+        else:
+            self.constraints, self._variables, self._finalized, self._simplify_method, base_state = s
         super().__setstate__(base_state)
 
     #
@@ -100,7 +118,7 @@ class ConstrainedFrontend(Frontend):  # pylint:disable=abstract-method
     def add(self, constraints):
         self.constraints += constraints
         for c in constraints:
-            self.variables.update(c.variables)
+            self._variables.update(c.variables)
         return constraints
 
     def simplify(self):
@@ -114,7 +132,7 @@ class ConstrainedFrontend(Frontend):  # pylint:disable=abstract-method
         if len(to_simplify) == 0:
             return self.constraints
 
-        simplified = simplify(And(*to_simplify)).split(['And']) #pylint:disable=no-member
+        simplified = simplify(And(*to_simplify), method=self._simplify_method).split(['And']) #pylint:disable=no-member
         self.constraints = no_simplify + simplified
         return self.constraints
 
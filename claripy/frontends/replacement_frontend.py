@@ -88,25 +88,7 @@ class ReplacementFrontend(ConstrainedFrontend):
         self._replacement_cache = weakref.WeakKeyDictionary(self._replacements)
 
     def _replacement(self, old):
-        # depressing hack
-        try:
-            if not self._replacement_cache:
-                return old
-        except RuntimeError:
-            if not self._replacement_cache:
-                return old
-
-        if not isinstance(old, Base):
-            return old
-
-        try:
-            return self._replacement_cache[old.cache_key]
-        except KeyError:
-            # not found in the cache
-            new = old.replace_dict(self._replacement_cache)
-            if new is not old:
-                self._replacement_cache[old.cache_key] = new
-            return new
+        return self._replace_list((old,))[0]
 
     def _add_solve_result(self, e, er, r):
         if not self._auto_replace:
@@ -159,7 +141,34 @@ class ReplacementFrontend(ConstrainedFrontend):
     #
 
     def _replace_list(self, lst):
-        return tuple(self._replacement(c) for c in lst)
+        # depressing hack
+        try:
+            if not self._replacement_cache:
+                return tuple(lst)
+        except RuntimeError:
+            if not self._replacement_cache:
+                return tuple(lst)
+
+        results = list(lst)
+        missing = [ ]
+        for i, old in enumerate(results):
+            if isinstance(old, Base):
+                try:
+                    results[i] = self._replacement_cache[old.cache_key]
+                except KeyError:
+                    # not found in the cache
+                    missing.append(i)
+
+        # everything that is not cached is replaced at once, so that the work on shared subexpressions is shared too
+        if missing:
+            news = replace_dict_many([ results[i] for i in missing ], self._replacement_cache)
+            for i, new in zip(missing, news):
+                old = results[i]
+                if new is not old:
+                    self._replacement_cache[old.cache_key] = new
+                results[i] = new
+
+        return tuple(results)
 
     def eval(self, e, n, extra_constraints=(), exact=None):
         er = self._replacement(e)
@@ -277,7 +286,7 @@ class ReplacementFrontend(ConstrainedFrontend):
         return added
 
 
-from ..ast.base import Base
+from ..ast.base import Base, replace_dict_many
 from ..ast.bv import BVV
 from ..ast.bool import BoolV, false
 from ..errors import ClaripyFrontendError, BackendError
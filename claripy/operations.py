@@ -38,8 +38,12 @@ def op(name, arg_types, return_type, extra_check=None, calc_length=None, do_coer
             else:
                 yield arg
 
+    arg_fixer = _precompiled_arg_fixer(arg_types, do_coerce)
+
     def _op(*args):
-        fixed_args = tuple(_type_fixer(args))
+        fixed_args = arg_fixer(args)
+        if fixed_args is None:
+            fixed_args = tuple(_type_fixer(args))
         if _d._DEBUG:
             for i in fixed_args:
                 if i is NotImplemented:
@@ -48,6 +52,8 @@ def op(name, arg_types, return_type, extra_check=None, calc_length=None, do_coer
                 success, msg = extra_check(*fixed_args)
                 if not success:
                     raise ClaripyOperationError(msg)
+        if _normalize_commutative and name in _normalized_operations:
+            fixed_args = _normalize_args(name, fixed_args)
 
         #pylint:disable=too-many-nested-blocks
         simp = _handle_annotations(simplifications.simpleton.simplify(name, fixed_args), args)
@@ -60,8 +66,10 @@ def op(name, arg_types, return_type, extra_check=None, calc_length=None, do_coer
 
         kwargs['uninitialized'] = None
         #pylint:disable=isinstance-second-argument-not-valid-type
-        if any(a.uninitialized is True for a in args if isinstance(a, ast.Base)):
-            kwargs['uninitialized'] = True
+        for a in args:
+            if isinstance(a, ast.Base) and a.uninitialized is True:
+                kwargs['uninitialized'] = True
+                break
         if name in preprocessors:
             args, kwargs = preprocessors[name](*args, **kwargs)
 
@@ -70,11 +78,70 @@ def op(name, arg_types, return_type, extra_check=None, calc_length=None, do_coer
     _op.calc_length = calc_length
     return _op
 
+def _precompiled_arg_fixer(arg_types, do_coerce):
+    """
+    Returns a function that does what the generic type fixer of `op` does for the common signatures, without its
+    generator and coercion lookups: it returns the arguments if each one already has exactly the type it is declared
+    with, or (for operations on two arguments) converts an int argument with the `_from_int` of its declared type, like
+    in `x + 1`. For any other arguments, it returns None, and the generic type fixer has to be used.
+    """
+    if type(arg_types) is type: #pylint:disable=unidiomatic-typecheck
+        def _fix_variadic(args):
+            for a in args:
+                if type(a) is not arg_types: #pylint:disable=unidiomatic-typecheck
+                    return None
+            return args
+        return _fix_variadic
+
+    if len(arg_types) == 1:
+        t0, = arg_types
+        def _fix_unary(args):
+            if len(args) == 1 and type(args[0]) is t0: #pylint:disable=unidiomatic-typecheck
+                return args
+            return None
+        return _fix_unary
+
+    if len(arg_types) == 2:
+        t0, t1 = arg_types
+        from_int0 = getattr(t0, '_from_int', None) if do_coerce and t0 is not int else None
+        from_int1 = getattr(t1, '_from_int', None) if do_coerce and t1 is not int else None
+        def _fix_binary(args):
+            if len(args) != 2:
+                return None
+            a, b = args
+            ta = type(a)
+            tb = type(b)
+            if ta is t0:
+                if tb is t1:
+                    return args
+                if tb is int and from_int1 is not None:
+                    return (a, from_int1(a, b))
+            elif ta is int and tb is t1 and from_int0 is not None:
+                return (from_int0(b, a), b)
+            return None
+        return _fix_binary
+
+    def _fix(args):
+        if len(args) != len(arg_types):
+            return None
+        for a, t in zip(args, arg_types):
+            if type(a) is not t: #pylint:disable=unidiomatic-typecheck
+                return None
+        return args
+    return _fix
+
 def _handle_annotations(simp, args):
     if simp is None:
         return None
 
     #pylint:disable=isinstance-second-argument-not-valid-type
+    for a in args:
+        if isinstance(a, ast.Base) and a.annotations:
+            break
+    else:
+        # there is nothing to relocate or to eliminate
+        return simp
+
     ast_args = tuple(a for a in args if isinstance(a, ast.Base))
     preserved_relocatable = frozenset(simp._relocatable_annotations)
     relocated_annotations = set()
@@ -488,6 +555,53 @@ op_precedence = {  # based on https://en.cppreference.com/w/c/language/operator_
 
 commutative_operations = { '__and__', '__or__', '__xor__', '__add__', '__mul__', 'And', 'Or', 'Xor', }
 
+#
+# Normalization of commutative operations
+#
+
+# whether the arguments of commutative operations are put in a canonical order (see set_commutative_normalization())
+_normalize_commutative = False
+# the associative operations whose nested ASTs are flattened when normalizing
+_flattened_operations = commutative_operations - { 'Xor' }
+_normalized_operations = _flattened_operations | { '__eq__', '__ne__' }
+# nested ASTs are not flattened into an operation with more arguments than this, since flattening a shared DAG could
+# otherwise make the number of arguments exponential in its depth
+NORMALIZATION_FLATTEN_LIMIT = 64
+
+_CONSTANT_OPS = frozenset(('BVV', 'BoolV', 'FPV'))
+
+def _normalization_key(a):
+    # constants go last, where the simplifiers (e.g., the canonicalization of == and the collapsing of constants in
+    # flattened operations) put them anyway
+    return (a.op in _CONSTANT_OPS, a._hash)
+
+def _normalize_args(name, args):
+    if name in _flattened_operations:
+        flat = [ ]
+        for i, a in enumerate(args):
+            if a.op == name and not a.annotations and \
+                    len(flat) + len(a.args) + len(args) - i - 1 <= NORMALIZATION_FLATTEN_LIMIT:
+                flat.extend(a.args)
+            else:
+                flat.append(a)
+        args = flat
+    return tuple(sorted(args, key=_normalization_key))
+
+def set_commutative_normalization(enabled):
+    """
+    Enables or disables the normalization of commutative operations. When enabled, the arguments of the commutative
+    operations (like `+`, `&` and `And`) and of `==` and `!=` are sorted by their hashes when the operation is built,
+    and nested operations of the same associative op are flattened, so that, e.g., `a + b` and `b + a`, or
+    `And(x, And(y, z))` and `And(And(z, y), x)`, are the same AST, and share the same cache entries.
+
+    :param enabled: Whether to normalize commutative operations.
+    :returns:       Whether they were normalized before.
+    """
+    global _normalize_commutative #pylint:disable=global-statement
+    old = _normalize_commutative
+    _normalize_commutative = bool(enabled)
+    return old
+
 from .errors import ClaripyOperationError, ClaripyTypeError
 from . import simplifications
 from . import ast
@@ -0,0 +1,321 @@
+"""
+Declarative rewrite rules for simplifying operations.
+
+A rule is a pattern over the shape of an operation, a function that builds the rewritten AST from the parts that the
+pattern binds, and optionally a guard. For example, the following rule rewrites `Reverse(Reverse(x))` to `x`::
+
+    rules.add(P('Reverse', P('Reverse', V('x'))), lambda x: x)
+
+Every rule is compiled into a Python function that matches its pattern with inline checks, and the rules of a
+:class:`RuleSet` are indexed by their operation and the operations (or constant values) of its arguments, so only the
+rules whose patterns fit the shape of an operation are tried, no matter how many rules there are.
+"""
+
+
+class V:
+    """
+    A pattern variable. It matches any argument (an AST or a raw value, like the bounds of an Extract), and binds it
+    to its name. A variable that occurs several times in a pattern only matches the same argument each time.
+    """
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name if self.name is not None else '_'
+
+
+# matches any argument, without binding it
+ANY = V(None)
+
+
+class P:
+    """
+    A pattern that matches the ASTs of an operation. Its arguments are sub-patterns (:class:`P` or :class:`V`), or raw
+    values that the arguments of the AST must be equal to (e.g., `P('ZeroExt', 0, V('x'))`). Patterns have a fixed
+    number of arguments.
+
+    :ivar name:     If not None, the AST matched by the pattern is bound to this name.
+    """
+
+    __slots__ = ('op', 'args', 'name')
+
+    def __init__(self, op, *args, name=None):
+        self.op = op
+        self.args = args
+        self.name = name
+
+    def __repr__(self):
+        r = '%s(%s)' % (self.op, ', '.join(map(repr, self.args)))
+        return r if self.name is None else '%s=%s' % (self.name, r)
+
+
+class Rule:
+    """
+    A rewrite rule.
+
+    :ivar pattern:  The :class:`P` that the operation must match.
+    :ivar action:   A function that is called with the bindings of the pattern as keyword arguments, and returns the
+                    rewritten AST, or None if it does not apply after all.
+    :ivar guard:    A function that is called like `action`, and returns whether the rule applies.
+    :ivar name:     The name of the rule, for debugging.
+    """
+
+    __slots__ = ('pattern', 'action', 'guard', 'name', 'index', '_apply')
+
+    def __init__(self, pattern, action, guard=None, name=None, index=0):
+        if not isinstance(pattern, P):
+            raise TypeError("the pattern of a rule must be a P")
+        if pattern.name is not None:
+            raise ValueError("the top-level pattern of a rule cannot be named, since its AST is not built yet")
+        self.pattern = pattern
+        self.action = action
+        self.guard = guard
+        self.name = name if name is not None else repr(pattern)
+        self.index = index
+        self._apply = _compile(self)
+
+    def __repr__(self):
+        return '<Rule %s>' % self.name
+
+    def match(self, op, args):
+        """
+        Matches the operation `op` on `args` against the pattern.
+
+        :returns:   A dict of the bindings, or None if the operation does not match.
+        """
+        pattern = self.pattern
+        if pattern.op != op or len(pattern.args) != len(args):
+            return None
+        bindings = { }
+        if not _match_args(pattern.args, args, bindings):
+            return None
+        return bindings
+
+    def apply(self, op, args):
+        """
+        Applies the rule to the operation `op` on `args`.
+
+        :returns:   The rewritten AST, or None if the rule does not apply.
+        """
+        pattern = self.pattern
+        if pattern.op != op or len(pattern.args) != len(args):
+            return None
+        return self._apply(args)
+
+
+def _match(pattern, arg, bindings):
+    if type(pattern) is V:
+        name = pattern.name
+        if name is None:
+            return True
+        if name in bindings:
+            bound = bindings[name]
+            return bound is arg or (not isinstance(arg, Base) and not isinstance(bound, Base) and bound == arg)
+        bindings[name] = arg
+        return True
+    if type(pattern) is P:
+        if not isinstance(arg, Base) or arg.op != pattern.op or len(arg.args) != len(pattern.args):
+            return False
+        if not _match_args(pattern.args, arg.args, bindings):
+            return False
+        if pattern.name is not None:
+            bindings[pattern.name] = arg
+        return True
+    return not isinstance(arg, Base) and type(arg) is type(pattern) and arg == pattern
+
+def _match_args(patterns, args, bindings):
+    for p, a in zip(patterns, args):
+        if not _match(p, a, bindings):
+            return False
+    return True
+
+
+def _compile(rule):
+    """
+    Compiles the pattern of a rule into a function that takes the arguments of an operation (which must have the
+    operation and number of arguments of the pattern), checks the rest of the pattern and the guard, and returns the
+    result of the action, or None.
+    """
+    env = { 'Base': Base, 'guard': rule.guard, 'action': rule.action }
+    checks = [ ]
+    bindings = { }
+
+    def bind(name, expr):
+        if name in bindings:
+            bound = bindings[name]
+            checks.append('(%s is %s or (not isinstance(%s, Base) and not isinstance(%s, Base) and %s == %s))' %
+                          (expr, bound, expr, bound, expr, bound))
+        else:
+            bindings[name] = expr
+
+    def walk(pattern, expr):
+        if type(pattern) is V:
+            if pattern.name is not None:
+                bind(pattern.name, expr)
+        elif type(pattern) is P:
+            checks.append('isinstance(%s, Base)' % expr)
+            checks.append('%s.op == %r' % (expr, pattern.op))
+            checks.append('len(%s.args) == %d' % (expr, len(pattern.args)))
+            for i, p in enumerate(pattern.args):
+                walk(p, '%s.args[%d]' % (expr, i))
+            if pattern.name is not None:
+                bind(pattern.name, expr)
+        else:
+            const = 'c%d' % len(env)
+            env[const] = pattern
+            checks.append('(not isinstance(%s, Base) and type(%s) is type(%s) and %s == %s)' %
+                          (expr, expr, const, expr, const))
+
+    for i, p in enumerate(rule.pattern.args):
+        walk(p, 'args[%d]' % i)
+
+    call = '(%s)' % ', '.join('%s=%s' % b for b in bindings.items())
+    lines = [ 'def _apply(args):' ]
+    if checks:
+        lines.append('    if not (%s):' % ' and '.join(checks))
+        lines.append('        return None')
+    if rule.guard is not None:
+        lines.append('    if not guard%s:' % call)
+        lines.append('        return None')
+    lines.append('    return action%s' % call)
+
+    exec(compile('\n'.join(lines), '<rule %s>' % rule.name, 'exec'), env) #pylint:disable=exec-used
+    return env['_apply']
+
+
+def _symbol(arg):
+    """
+    The symbol of an argument in the index of a :class:`RuleSet`.
+    """
+    if isinstance(arg, Base):
+        return (arg.op, len(arg.args))
+    return ('=', type(arg), arg)
+
+
+class _Index:
+    """
+    The rules of one operation (with a given number of arguments).
+
+    For every argument position, `by_symbol` maps the symbol of a sub-pattern (the operation and number of arguments
+    of a :class:`P`, or a constant value) to the bitmask of the rules (by their position in `rules`) that have it at
+    that position, and `wildcards` is the bitmask of the rules that have a variable there. The rules that fit an
+    operation are then the intersection, over all positions, of the rules that fit the argument at that position.
+    """
+
+    __slots__ = ('rules', 'by_symbol', 'wildcards', 'all')
+
+    def __init__(self, nargs):
+        self.rules = [ ]
+        self.by_symbol = [ { } for _ in range(nargs) ]
+        self.wildcards = [ 0 ] * nargs
+        self.all = 0
+
+    def add(self, rule):
+        bit = 1 << len(self.rules)
+        self.rules.append(rule)
+        self.all |= bit
+        for i, p in enumerate(rule.pattern.args):
+            if type(p) is V:
+                self.wildcards[i] |= bit
+            else:
+                symbol = (p.op, len(p.args)) if type(p) is P else ('=', type(p), p)
+                self.by_symbol[i][symbol] = self.by_symbol[i].get(symbol, 0) | bit
+
+    def fitting(self, args):
+        """
+        Returns the bitmask of the rules that fit `args`.
+        """
+        mask = self.all
+        for by_symbol, wildcards, a in zip(self.by_symbol, self.wildcards, args):
+            if not by_symbol:
+                continue
+            try:
+                mask &= wildcards | by_symbol.get(_symbol(a), 0)
+            except TypeError:
+                # unhashable raw values only match variables
+                mask &= wildcards
+            if not mask:
+                break
+        return mask
+
+
+class RuleSet:
+    """
+    An ordered set of compiled rewrite rules, indexed by the shape of the operations that they apply to.
+    """
+
+    __slots__ = ('rules', '_indexes', '_ops')
+
+    def __init__(self):
+        self.rules = [ ]
+        self._indexes = { }
+        self._ops = set()
+
+    def __len__(self):
+        return len(self.rules)
+
+    def add(self, pattern, action, guard=None, name=None):
+        """
+        Adds a rule. Rules are tried in the order in which they were added, and the first one that applies wins.
+
+        :param pattern: A :class:`P` that the operation must match.
+        :param action:  A function that builds the rewritten AST from the bindings of the pattern (see :class:`Rule`).
+        :param guard:   A function that checks whether the rule applies, given the bindings of the pattern.
+        :param name:    A name for the rule.
+        :returns:       The new :class:`Rule`.
+        """
+        rule = Rule(pattern, action, guard=guard, name=name, index=len(self.rules))
+        key = (pattern.op, len(pattern.args))
+        index = self._indexes.get(key, None)
+        if index is None:
+            index = self._indexes[key] = _Index(len(pattern.args))
+            self._ops.add(pattern.op)
+        index.add(rule)
+        self.rules.append(rule)
+        return rule
+
+    def handles(self, op):
+        """
+        Checks whether any rule applies to the operation `op`.
+        """
+        return op in self._ops
+
+    def candidates(self, op, args):
+        """
+        Returns the rules whose patterns fit the operation `op` on `args` (looking at the operations and values of
+        its arguments), in order. Deeper sub-patterns, repeated variables and guards are not checked.
+        """
+        index = self._indexes.get((op, len(args)), None)
+        if index is None:
+            return [ ]
+        mask = index.fitting(args)
+        found = [ ]
+        while mask:
+            low = mask & -mask
+            found.append(index.rules[low.bit_length() - 1])
+            mask ^= low
+        return found
+
+    def rewrite(self, op, args):
+        """
+        Rewrites the operation `op` on `args` with the first rule that applies.
+
+        :returns:   The rewritten AST, or None if no rule applies.
+        """
+        index = self._indexes.get((op, len(args)), None)
+        if index is None:
+            return None
+        mask = index.fitting(args)
+        rules = index.rules
+        while mask:
+            low = mask & -mask
+            r = rules[low.bit_length() - 1]._apply(args)
+            if r is not None:
+                return r
+            mask ^= low
+        return None
+
+from .ast.base import Base
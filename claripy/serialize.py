@@ -0,0 +1,843 @@
+"""
+A compact, DAG-preserving binary serialization format for ASTs.
+
+Unlike pickling (see `Base.__reduce__`), which writes out every node with all of its fields, this format writes a
+topologically ordered table of nodes in which every distinct node is written once, and is referred to by its index
+afterwards. Strings (operations, variable names) and other objects (annotations, sorts, ...) are interned in tables of
+their own. Fields that can be derived from a node's arguments (its variables, whether it is symbolic, its depth, its
+hash) are not written, unless they differ from the derived value.
+
+A stream consists of a header followed by records. Each record starts with a tag byte:
+
+- ``S``: a string, appended to the string table
+- ``O``: a pickled object, appended to the object table
+- ``C``: an AST class, appended to the class table
+- ``N``: an AST node, appended to the node table
+- ``R``: a root, i.e., one of the serialized ASTs
+
+Streams can be written incrementally (see :class:`Serializer`): ASTs written later only add the nodes that were not
+written before.
+
+For large, read-only collections of ASTs, :func:`write_store` writes the same nodes to an AST store (see
+:class:`ASTStore`), which can be memory-mapped and loads ASTs on demand.
+"""
+
+import importlib
+import io
+import mmap
+import pickle
+import struct
+import weakref
+
+MAGIC = b'CLARIPY\x00'
+VERSION = 1
+
+# record tags
+_REC_STRING = 0x53     # 'S'
+_REC_OBJECT = 0x4f     # 'O'
+_REC_CLASS = 0x43      # 'C'
+_REC_NODE = 0x4e       # 'N'
+_REC_ROOT = 0x52       # 'R'
+
+# value tags
+_VAL_NONE = 0
+_VAL_TRUE = 1
+_VAL_FALSE = 2
+_VAL_INT = 3
+_VAL_FLOAT = 4
+_VAL_STR = 5
+_VAL_NODE = 6
+_VAL_TUPLE = 7
+_VAL_OBJECT = 8
+_VAL_BYTES = 9
+
+# node flags
+_NODE_LENGTH = 0x01
+_NODE_VARIABLES = 0x02
+_NODE_SYMBOLIC = 0x04
+_NODE_SYMBOLIC_VALUE = 0x08
+_NODE_ANNOTATIONS = 0x10
+_NODE_SKIP_CHILD_ANNOTATIONS = 0x20
+_NODE_UNINITIALIZED = 0x40
+_NODE_UNINITIALIZED_VALUE = 0x80
+
+_double = struct.Struct('<d')
+
+
+def _write_varint(buf, n):
+    while n > 0x7f:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+def _read_varint(data, pos):
+    b = data[pos]
+    if b < 0x80:
+        return b, pos + 1
+    n = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+class _NodeEncoder:
+    """
+    Encodes nodes in the serialization format. The strings, objects and classes that the nodes refer to are interned:
+    the first time one is needed, `define(defs, tag, data)` is called to add it to its table, where `tag` is the tag of
+    its record and `data` its encoding (for classes, the index of their name).
+    """
+
+    def __init__(self, define):
+        self._define = define
+        self.strings = { }
+        self.objects = { }
+        self.classes = { }
+        self.nodes = { }
+        # keeps the written nodes and objects alive, so that their ids stay valid
+        self._keep = [ ]
+
+    def is_written(self, node):
+        return id(node) in self.nodes
+
+    def add_node(self, node):
+        """
+        Assigns the next index in the node table to `node`, once it has been encoded.
+        """
+        i = self.nodes[id(node)] = len(self.nodes)
+        self._keep.append(node)
+        return i
+
+    #
+    # Tables
+    #
+
+    def string(self, defs, s):
+        try:
+            return self.strings[s]
+        except KeyError:
+            pass
+        self._define(defs, _REC_STRING, s.encode('utf-8', 'surrogatepass'))
+        i = self.strings[s] = len(self.strings)
+        return i
+
+    def object(self, defs, o):
+        try:
+            return self.objects[id(o)]
+        except KeyError:
+            pass
+        try:
+            data = pickle.dumps(o, 4)
+        except Exception as e:
+            raise ClaripySerializationError("unable to serialize %r" % (o,)) from e
+        self._define(defs, _REC_OBJECT, data)
+        self._keep.append(o)
+        i = self.objects[id(o)] = len(self.objects)
+        return i
+
+    def klass(self, defs, cls):
+        try:
+            return self.classes[cls]
+        except KeyError:
+            pass
+        self._define(defs, _REC_CLASS, self.string(defs, cls.__module__ + ':' + cls.__qualname__))
+        i = self.classes[cls] = len(self.classes)
+        return i
+
+    #
+    # Values and nodes
+    #
+
+    def value(self, body, defs, v):
+        t = type(v)
+        if t is int:
+            body.append(_VAL_INT)
+            _write_varint(body, (v << 1) if v >= 0 else (((-v) << 1) - 1))
+        elif t is str:
+            body.append(_VAL_STR)
+            _write_varint(body, self.string(defs, v))
+        elif v is None:
+            body.append(_VAL_NONE)
+        elif v is True:
+            body.append(_VAL_TRUE)
+        elif v is False:
+            body.append(_VAL_FALSE)
+        elif isinstance(v, Base):
+            body.append(_VAL_NODE)
+            _write_varint(body, self.nodes[id(v)])
+        elif t is float:
+            body.append(_VAL_FLOAT)
+            body += _double.pack(v)
+        elif t is tuple:
+            body.append(_VAL_TUPLE)
+            _write_varint(body, len(v))
+            for e in v:
+                self.value(body, defs, e)
+        elif t is bytes:
+            body.append(_VAL_BYTES)
+            _write_varint(body, len(v))
+            body += v
+        else:
+            body.append(_VAL_OBJECT)
+            _write_varint(body, self.object(defs, v))
+
+    def encode_node(self, defs, node):
+        """
+        Encodes a node whose children have been written, defining the strings, objects and classes it needs.
+
+        :returns:   The encoded node.
+        """
+        body = bytearray()
+        args = node.args
+        children = [ a for a in args if isinstance(a, Base) ]
+        flags = 0
+
+        length = node.length
+        if isinstance(node, String):
+            # strings are constructed with their length in characters
+            length = node.string_length
+        if length is not None:
+            flags |= _NODE_LENGTH
+
+        if not children:
+            # leaves carry their variables and symbolic-ness
+            derived_variables = frozenset()
+            derived_symbolic = None
+        else:
+            derived_variables = frozenset().union(*(a.variables for a in children))
+            derived_symbolic = any(a.symbolic for a in children)
+        if node.variables != derived_variables:
+            flags |= _NODE_VARIABLES
+        if node.symbolic != derived_symbolic:
+            flags |= _NODE_SYMBOLIC | (_NODE_SYMBOLIC_VALUE if node.symbolic else 0)
+
+        # only the annotations that were not relocated from the children are written; the others come back when the
+        # node is rebuilt
+        annotations = node.annotations
+        if annotations:
+            relocated = tuple(r for a in children for r in a._relocatable_annotations)
+            if annotations[:len(relocated)] == relocated:
+                annotations = annotations[len(relocated):]
+            else:
+                flags |= _NODE_SKIP_CHILD_ANNOTATIONS
+            if annotations:
+                flags |= _NODE_ANNOTATIONS
+
+        uninitialized = node._uninitialized
+        if uninitialized is not None:
+            flags |= _NODE_UNINITIALIZED | (_NODE_UNINITIALIZED_VALUE if uninitialized else 0)
+
+        body.append(flags)
+        _write_varint(body, self.klass(defs, type(node)))
+        _write_varint(body, self.string(defs, node.op))
+        if flags & _NODE_LENGTH:
+            _write_varint(body, length)
+        _write_varint(body, len(args))
+        for a in args:
+            self.value(body, defs, a)
+        if flags & _NODE_VARIABLES:
+            _write_varint(body, len(node.variables))
+            for v in sorted(node.variables):
+                _write_varint(body, self.string(defs, v))
+        if flags & _NODE_ANNOTATIONS:
+            _write_varint(body, len(annotations))
+            for a in annotations:
+                _write_varint(body, self.object(defs, a))
+        return body
+
+
+class Serializer:
+    """
+    Writes ASTs to a binary file-like object. Nodes, strings and objects that were already written (by earlier calls to
+    `write()`) are referred to rather than written again.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._encoder = _NodeEncoder(self._define)
+
+        f.write(MAGIC + bytes((VERSION,)))
+
+    def write(self, *asts):
+        """
+        Writes one or more ASTs to the stream.
+        """
+        encoder = self._encoder
+        buf = bytearray()
+        for ast in asts:
+            if not isinstance(ast, Base):
+                raise ClaripySerializationError("only ASTs can be serialized, got %r" % type(ast))
+            for node in traversal.postorder(ast, cutoff=encoder.is_written):
+                # the definitions that the node needs are written before it
+                body = encoder.encode_node(buf, node)
+                buf.append(_REC_NODE)
+                buf += body
+                encoder.add_node(node)
+            buf.append(_REC_ROOT)
+            _write_varint(buf, encoder.nodes[id(ast)])
+        self._f.write(buf)
+
+    def flush(self):
+        self._f.flush()
+
+    @staticmethod
+    def _define(buf, tag, data):
+        buf.append(tag)
+        if tag == _REC_CLASS:
+            _write_varint(buf, data)
+        else:
+            _write_varint(buf, len(data))
+            buf += data
+
+
+class _NodeDecoder:
+    """
+    Decodes nodes in the serialization format. The tables of strings, objects, classes and nodes that they refer to can
+    be anything that can be indexed, and can grow (or be replaced) between calls.
+    """
+
+    __slots__ = ('strings', 'objects', 'classes', 'nodes')
+
+    def __init__(self, strings, objects, classes, nodes):
+        self.strings = strings
+        self.objects = objects
+        self.classes = classes
+        self.nodes = nodes
+
+    def read_value(self, data, pos):
+        tag = data[pos]
+        pos += 1
+        if tag == _VAL_NODE:
+            i, pos = _read_varint(data, pos)
+            return self.nodes[i], pos
+        if tag == _VAL_INT:
+            n, pos = _read_varint(data, pos)
+            return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+        if tag == _VAL_STR:
+            i, pos = _read_varint(data, pos)
+            return self.strings[i], pos
+        if tag == _VAL_NONE:
+            return None, pos
+        if tag == _VAL_TRUE:
+            return True, pos
+        if tag == _VAL_FALSE:
+            return False, pos
+        if tag == _VAL_FLOAT:
+            if pos + 8 > len(data):
+                raise IndexError()
+            return _double.unpack_from(data, pos)[0], pos + 8
+        if tag == _VAL_TUPLE:
+            n, pos = _read_varint(data, pos)
+            items = [ ]
+            for _ in range(n):
+                v, pos = self.read_value(data, pos)
+                items.append(v)
+            return tuple(items), pos
+        if tag == _VAL_BYTES:
+            n, pos = _read_varint(data, pos)
+            if pos + n > len(data):
+                raise IndexError()
+            return bytes(data[pos:pos + n]), pos + n
+        if tag == _VAL_OBJECT:
+            i, pos = _read_varint(data, pos)
+            return self.objects[i], pos
+        raise ClaripySerializationError("corrupt AST stream: unknown value %#x" % tag)
+
+    def decode_node(self, data, pos):
+        """
+        Decodes a node.
+
+        :returns:   A tuple of the class, operation, arguments and keyword arguments to construct the node with, and the
+                    position after the node.
+        """
+        flags = data[pos]
+        cls, pos = _read_varint(data, pos + 1)
+        cls = self.classes[cls]
+        op, pos = _read_varint(data, pos)
+        op = self.strings[op]
+
+        kwargs = { }
+        if flags & _NODE_LENGTH:
+            kwargs['length'], pos = _read_varint(data, pos)
+
+        nargs, pos = _read_varint(data, pos)
+        args = [ ]
+        nodes = self.nodes
+        children = False
+        symbolic = False
+        for _ in range(nargs):
+            if data[pos] == _VAL_NODE and data[pos + 1] < 0x80:
+                # the common case, a reference to one of the first 128 nodes
+                v = nodes[data[pos + 1]]
+                pos += 2
+            else:
+                v, pos = self.read_value(data, pos)
+            if isinstance(v, Base):
+                children = True
+                symbolic = symbolic or v.symbolic
+            args.append(v)
+
+        if flags & _NODE_VARIABLES:
+            n, pos = _read_varint(data, pos)
+            variables = [ ]
+            for _ in range(n):
+                i, pos = _read_varint(data, pos)
+                variables.append(self.strings[i])
+            kwargs['variables'] = frozenset(variables)
+        elif not children:
+            kwargs['variables'] = frozenset()
+
+        if flags & _NODE_SYMBOLIC:
+            kwargs['symbolic'] = bool(flags & _NODE_SYMBOLIC_VALUE)
+        elif not symbolic:
+            # concrete nodes are stored as they were built, they must not be evaluated again
+            kwargs['eager_backends'] = None
+
+        if flags & _NODE_ANNOTATIONS:
+            n, pos = _read_varint(data, pos)
+            annotations = [ ]
+            for _ in range(n):
+                i, pos = _read_varint(data, pos)
+                annotations.append(self.objects[i])
+            kwargs['annotations'] = tuple(annotations)
+        if flags & _NODE_SKIP_CHILD_ANNOTATIONS:
+            kwargs['skip_child_annotations'] = True
+
+        if flags & _NODE_UNINITIALIZED:
+            kwargs['uninitialized'] = bool(flags & _NODE_UNINITIALIZED_VALUE)
+
+        if pos > len(data):
+            raise IndexError()
+        return cls, op, tuple(args), kwargs, pos
+
+
+def _load_class(name):
+    module, qualname = name.split(':')
+    cls = importlib.import_module(module)
+    for attr in qualname.split('.'):
+        cls = getattr(cls, attr)
+    return cls
+
+
+class Deserializer:
+    """
+    Reads ASTs from a binary file-like object written by a :class:`Serializer`.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        header = f.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ClaripySerializationError("not a serialized AST stream")
+        if header[len(MAGIC)] != VERSION:
+            raise ClaripySerializationError("unsupported serialization version %d" % header[len(MAGIC)])
+
+        self._data = b''
+        self._pos = 0
+        self._strings = [ ]
+        self._objects = [ ]
+        self._classes = [ ]
+        self._nodes = [ ]
+        # the tables grow as records are read
+        self._decoder = _NodeDecoder(self._strings, self._objects, self._classes, self._nodes)
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.read()
+            except EOFError:
+                return
+
+    def read(self):
+        """
+        Reads the next AST from the stream.
+
+        :raises EOFError:   if there are no more ASTs in the stream.
+        """
+        while True:
+            if self._pos >= len(self._data):
+                self._data = self._data[self._pos:] + self._f.read(0x100000)
+                self._pos = 0
+                if not self._data:
+                    raise EOFError()
+
+            start = self._pos
+            try:
+                root = self._read_record()
+            except IndexError:
+                # the record is incomplete, read more
+                self._pos = start
+                more = self._f.read(0x100000)
+                if not more:
+                    raise ClaripySerializationError("truncated AST stream") from None
+                self._data = self._data[start:] + more
+                self._pos = 0
+                continue
+            if root is not None:
+                return root
+
+    def _read_record(self):
+        data = self._data
+        tag = data[self._pos]
+        pos = self._pos + 1
+
+        if tag == _REC_NODE:
+            cls, op, args, kwargs, pos = self._decoder.decode_node(data, pos)
+            # calling the class (rather than __new__) also runs the __init__ of classes that have one, like String
+            self._nodes.append(cls(op, args, **kwargs))
+        elif tag == _REC_STRING:
+            n, pos = _read_varint(data, pos)
+            if pos + n > len(data):
+                raise IndexError()
+            self._strings.append(data[pos:pos + n].decode('utf-8', 'surrogatepass'))
+            pos += n
+        elif tag == _REC_OBJECT:
+            n, pos = _read_varint(data, pos)
+            if pos + n > len(data):
+                raise IndexError()
+            self._objects.append(pickle.loads(data[pos:pos + n]))
+            pos += n
+        elif tag == _REC_CLASS:
+            name, pos = _read_varint(data, pos)
+            self._classes.append(_load_class(self._strings[name]))
+        elif tag == _REC_ROOT:
+            i, pos = _read_varint(data, pos)
+            self._pos = pos
+            return self._nodes[i]
+        else:
+            raise ClaripySerializationError("corrupt AST stream: unknown record %#x" % tag)
+
+        self._pos = pos
+        return None
+
+
+#
+# AST stores
+#
+
+STORE_MAGIC = b'CLARIPYM'
+_store_footer = struct.Struct('<11Q')
+_u64 = struct.Struct('<Q')
+
+
+class _StoreWriter:
+    """
+    Writes an AST store: the nodes of the serialization format, followed by tables that allow every node, string and
+    object to be found without reading what precedes it.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._encoder = _NodeEncoder(self._define)
+
+        self._string_data = [ ]
+        self._object_data = [ ]
+        self._class_names = [ ]
+        self._node_offsets = [ ]
+        self._node_hashes = [ ]
+        self._roots = [ ]
+
+        engine = Base._hash_engine.name.encode()
+        header = STORE_MAGIC + bytes((VERSION, len(engine))) + engine
+        f.write(header)
+        self._pos = len(header)
+
+    def write(self, *asts):
+        encoder = self._encoder
+        for ast in asts:
+            if not isinstance(ast, Base):
+                raise ClaripySerializationError("only ASTs can be serialized, got %r" % type(ast))
+            for node in traversal.postorder(ast, cutoff=encoder.is_written):
+                # the definitions go to the tables at the end of the store, not in front of the node
+                body = encoder.encode_node(None, node)
+                self._f.write(body)
+                self._node_offsets.append(self._pos)
+                self._node_hashes.append(node._hash)
+                self._pos += len(body)
+                encoder.add_node(node)
+            self._roots.append(encoder.nodes[id(ast)])
+
+    def _define(self, defs, tag, data):  #pylint:disable=unused-argument
+        if tag == _REC_STRING:
+            self._string_data.append(data)
+        elif tag == _REC_OBJECT:
+            self._object_data.append(data)
+        else:
+            self._class_names.append(data)
+
+    def _write_blobs(self, blobs):
+        offsets = bytearray()
+        for b in blobs:
+            offsets += _u64.pack(self._pos)
+            self._f.write(b)
+            self._pos += len(b)
+        return self._write_table(offsets)
+
+    def _write_table(self, table):
+        start = self._pos
+        self._f.write(table)
+        self._pos += len(table)
+        return start
+
+    def close(self):
+        strings = self._write_blobs(self._string_data)
+        objects = self._write_blobs(self._object_data)
+        classes = self._write_table(b''.join(_u64.pack(i) for i in self._class_names))
+        nodes = self._write_table(b''.join(_u64.pack(o) for o in self._node_offsets))
+        hashes = self._write_table(b''.join(h.to_bytes(16, 'little') for h in self._node_hashes))
+        roots = self._write_table(b''.join(_u64.pack(r) for r in self._roots))
+        footer = self._write_table(_store_footer.pack(
+            strings, len(self._string_data), objects, len(self._object_data), classes, len(self._class_names),
+            nodes, len(self._node_offsets), hashes, roots, len(self._roots),
+        ))
+        self._f.write(_u64.pack(footer))
+
+
+class _LazyTable:
+    """
+    A table of strings or objects in an AST store, which are decoded when they are first accessed.
+    """
+
+    __slots__ = ('_data', '_offsets', '_count', '_end', '_decode', '_cache')
+
+    def __init__(self, data, offsets, count, end, decode):
+        self._data = data
+        self._offsets = offsets
+        self._count = count
+        self._end = end
+        self._decode = decode
+        self._cache = { }
+
+    def __getitem__(self, i):
+        try:
+            return self._cache[i]
+        except KeyError:
+            pass
+        if not 0 <= i < self._count:
+            raise ClaripySerializationError("corrupt AST store: bad table index %d" % i)
+        start = self._offsets[i]
+        end = self._offsets[i + 1] if i + 1 < self._count else self._end
+        v = self._cache[i] = self._decode(self._data[start:end])
+        return v
+
+
+class _LazyClassTable:
+    """
+    The table of AST classes in an AST store, which are imported when they are first accessed.
+    """
+
+    __slots__ = ('_names', '_strings', '_cache')
+
+    def __init__(self, names, strings):
+        self._names = names
+        self._strings = strings
+        self._cache = { }
+
+    def __getitem__(self, i):
+        try:
+            return self._cache[i]
+        except KeyError:
+            pass
+        if not 0 <= i < len(self._names):
+            raise ClaripySerializationError("corrupt AST store: bad class index %d" % i)
+        cls = self._cache[i] = _load_class(self._strings[self._names[i]])
+        return cls
+
+
+class _NodeLookup:
+    """
+    Resolves references to nodes while a node of an AST store is decoded. References to nodes that have not been
+    materialized yet are recorded in `missing`.
+    """
+
+    __slots__ = ('built', 'memo', 'missing')
+
+    def __init__(self, memo):
+        self.built = { }
+        self.memo = memo
+        self.missing = [ ]
+
+    def __getitem__(self, i):
+        r = self.built.get(i, None)
+        if r is None:
+            r = self.memo.get(i, None)
+            if r is None:
+                self.missing.append(i)
+            else:
+                self.built[i] = r
+        return r
+
+
+class ASTStore:
+    """
+    A read-only store of ASTs, written by :func:`write_store`.
+
+    The store is memory-mapped rather than read, and ASTs are materialized when they are accessed: loading one only
+    loads the nodes it is made of. Nodes that are shared between ASTs are only materialized once for as long as they
+    are alive. The structural hashes of the nodes are stored too, so (if the hash engine in use is the one the store
+    was written with) materializing a node does not require it to be hashed again. Just like unpickled ASTs,
+    materialized ASTs are hash-consed with the ASTs that already exist.
+
+    Opening a store only reads its header and footer: the strings, objects and classes that the nodes refer to are
+    decoded when they are first needed.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')  #pylint:disable=consider-using-with
+        try:
+            self._data = data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ClaripySerializationError("not an AST store") from None
+
+        n = len(STORE_MAGIC)
+        if data[:n] != STORE_MAGIC or len(data) < n + 2 + _store_footer.size + _u64.size:
+            self.close()
+            raise ClaripySerializationError("not an AST store")
+        if data[n] != VERSION:
+            self.close()
+            raise ClaripySerializationError("unsupported AST store version %d" % data[n])
+        engine = data[n + 2:n + 2 + data[n + 1]].decode()
+
+        footer, = _u64.unpack_from(data, len(data) - _u64.size)
+        strings, n_strings, objects, n_objects, classes, n_classes, nodes, n_nodes, hashes, roots, n_roots = \
+            _store_footer.unpack_from(data, footer)
+
+        view = memoryview(data)
+        self._views = [ view ]
+        string_offsets = self._table(view, strings, n_strings)
+        object_offsets = self._table(view, objects, n_objects)
+        # the offsets of each table follow its entries
+        strings = _LazyTable(data, string_offsets, n_strings, strings, lambda b: b.decode('utf-8', 'surrogatepass'))
+        objects = _LazyTable(data, object_offsets, n_objects, objects, pickle.loads)
+        classes = _LazyClassTable(self._table(view, classes, n_classes), strings)
+        # the node table is set for each node() call
+        self._decoder = _NodeDecoder(strings, objects, classes, None)
+        self._node_offsets = self._table(view, nodes, n_nodes)
+        self._hashes = None
+        if engine == Base._hash_engine.name:
+            self._hashes = view[hashes:hashes + 16 * n_nodes]
+            self._views.append(self._hashes)
+        self._roots = self._table(view, roots, n_roots)
+        self._memo = weakref.WeakValueDictionary()
+
+    def _table(self, view, start, count):
+        t = view[start:start + count * _u64.size].cast('Q')
+        self._views.append(t)
+        return t
+
+    def close(self):
+        """
+        Closes the store. ASTs that were materialized stay valid.
+        """
+        if self._data is not None:
+            for v in reversed(getattr(self, '_views', ())):
+                v.release()
+            self._views = [ ]
+            self._data.close()
+            self._data = None
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self._roots)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [ self[j] for j in range(*i.indices(len(self))) ]
+        return self.node(self._roots[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def node(self, i):
+        """
+        Materializes the `i`-th node of the store (in the order they were written) and the nodes it is made of.
+        """
+        r = self._memo.get(i, None)
+        if r is not None:
+            return r
+
+        data, offsets, hashes, decoder = self._data, self._node_offsets, self._hashes, self._decoder
+        decoder.nodes = lookup = _NodeLookup(self._memo)
+        stack = [ i ]
+        while stack:
+            j = stack[-1]
+            if j in lookup.built:
+                stack.pop()
+                continue
+            if not 0 <= j < len(offsets):
+                raise ClaripySerializationError("corrupt AST store: bad node index %d" % j)
+
+            del lookup.missing[:]
+            cls, op, args, kwargs, _ = decoder.decode_node(data, offsets[j])
+            if lookup.missing:
+                stack.extend(lookup.missing)
+                continue
+
+            if hashes is not None:
+                kwargs['hash'] = int.from_bytes(hashes[16 * j:16 * (j + 1)], 'little')
+            lookup.built[j] = self._memo[j] = cls(op, args, **kwargs)
+            stack.pop()
+
+        decoder.nodes = None
+        return lookup.built[i]
+
+
+def dump(asts, f):
+    """
+    Serializes an AST, or a list of ASTs, to the binary file-like object `f`.
+    """
+    s = Serializer(f)
+    if isinstance(asts, Base):
+        s.write(asts)
+    else:
+        s.write(*asts)
+
+def dumps(asts):
+    """
+    Serializes an AST, or a list of ASTs, to bytes.
+    """
+    f = io.BytesIO()
+    dump(asts, f)
+    return f.getvalue()
+
+def load(f):
+    """
+    Deserializes the ASTs in the binary file-like object `f`.
+
+    :returns:   A list of the ASTs.
+    """
+    return list(Deserializer(f))
+
+def write_store(path, asts):
+    """
+    Writes ASTs to an AST store (see :class:`ASTStore`) at `path`.
+    """
+    with open(path, 'wb') as f:
+        w = _StoreWriter(f)
+        w.write(*asts)
+        w.close()
+
+def loads(data):
+    """
+    Deserializes the ASTs in `data`.
+
+    :returns:   A list of the ASTs.
+    """
+    return load(io.BytesIO(data))
+
+from .ast.base import Base
+from .ast.strings import String
+from .ast import traversal
+from .errors import ClaripySerializationError
@@ -1,25 +1,139 @@
 # pylint:disable=isinstance-second-argument-not-valid-type
 import collections
+import contextlib
+import csv
+import io
 import itertools
 import operator
+import threading
+import time
+import weakref
 from typing import Optional
 
-from functools import reduce
+from functools import partial, reduce
 
 
-class SimplificationManager:
+# the default maximum number of passes of SimplificationManager.fixpoint()
+DEFAULT_FIXPOINT_ROUNDS = 8
+
+
+class SimplifierStats:
+    """
+    The statistics of one rewrite rule or simplifier function, collected by :meth:`SimplificationManager.profile`.
+
+    :ivar calls:        The number of times the simplifier was tried.
+    :ivar successes:    The number of times it simplified the operation.
+    :ivar time:         The cumulative time spent in it (including the simplifications that it triggered), in seconds.
+    :ivar size_before:  The cumulative size (see :attr:`Base.tree_size`) of the operations that it simplified.
+    :ivar size_after:   The cumulative size of the results of these simplifications.
+    """
+
+    __slots__ = ('op', 'calls', 'successes', 'time', 'size_before', 'size_after')
+
+    def __init__(self, op):
+        self.op = op
+        self.calls = 0
+        self.successes = 0
+        self.time = 0.0
+        self.size_before = 0
+        self.size_after = 0
+
+    @property
+    def size_reduction(self):
+        return self.size_before - self.size_after
+
+    def as_dict(self):
+        return {
+            'op': self.op,
+            'calls': self.calls,
+            'successes': self.successes,
+            'time': self.time,
+            'size_before': self.size_before,
+            'size_after': self.size_after,
+            'size_reduction': self.size_reduction,
+        }
+
+
+class SimplificationProfile:
+    """
+    Per-simplifier statistics, keyed by the names of the rewrite rules and of the simplifier functions.
+    """
+
+    _CSV_FIELDS = ('simplifier', 'op', 'calls', 'successes', 'time', 'size_before', 'size_after', 'size_reduction')
+
     def __init__(self):
+        self.stats = { }
+
+    def __getitem__(self, name):
+        return self.stats[name]
+
+    def __contains__(self, name):
+        return name in self.stats
+
+    def _record(self, name, op, args, r, elapsed):
+        st = self.stats.get(name, None)
+        if st is None:
+            st = self.stats[name] = SimplifierStats(op)
+        st.calls += 1
+        st.time += elapsed
+        if r is not None:
+            st.successes += 1
+            # the sizes are not cached, so that profiling does not add side-table entries to the ASTs
+            st.size_before += 1 + sum(a._uncached_size_metrics()[0] for a in args if isinstance(a, Base))
+            st.size_after += r._uncached_size_metrics()[0] if isinstance(r, Base) else 1
+
+    def as_dict(self):
+        """
+        :returns:   A dict from the name of every simplifier that was tried to a dict of its statistics.
+        """
+        return { name: st.as_dict() for name, st in self.stats.items() }
+
+    def to_csv(self, f=None):
+        """
+        Writes the statistics as CSV, one simplifier per row, the most expensive first.
+
+        :param f:   A file to write to. If None, the CSV is returned as a string.
+        """
+        out = io.StringIO() if f is None else f
+        writer = csv.writer(out)
+        writer.writerow(self._CSV_FIELDS)
+        for name, st in sorted(self.stats.items(), key=lambda item: -item[1].time):
+            d = st.as_dict()
+            writer.writerow([ name ] + [ d[field] for field in self._CSV_FIELDS[1:] ])
+        return out.getvalue() if f is None else None
+
+
+class SimplificationManager:
+    """
+    Simplifies operations, with the declarative rewrite rules in `rules` (see :mod:`claripy.rewrite_rules`), and then
+    with the simplifier function of the op.
+
+    The results (including "no simplification") are memoized in a bounded LRU cache, keyed by the op and the hashes of
+    its arguments, since the same operations are simplified over and over while expressions are rebuilt (e.g., by
+    `replace_dict()`). The entries also refer weakly to the AST arguments, which a hit must match (ASTs whose hashes
+    collide have the same hash), and simplified ASTs are cached by weak reference, so a result is only reused while it
+    and the arguments it was computed from are alive.
+    The cache and its counters are guarded by a lock, so the manager can be shared between threads.
+    """
+
+    # the cached result of an operation that could not be simplified
+    _NO_SIMPLIFICATION = object()
+
+    def __init__(self, cache_size=0x10000):
+        self._cache = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+
         self._simplifiers = {
             'Reverse': self.bv_reverse_simplifier,
             'And': self.boolean_and_simplifier,
             'Or': self.boolean_or_simplifier,
-            'Not': self.boolean_not_simplifier,
             'Extract': self.extract_simplifier,
             'Concat': self.concat_simplifier,
             'If': self.if_simplifier,
-            '__lshift__': self.lshift_simplifier,
-            '__rshift__': self.rshift_simplifier,
-            'LShR': self.lshr_simplifier,
             '__eq__': self.eq_simplifier,
             '__ne__': self.ne_simplifier,
             '__or__': self.bitwise_or_simplifier,
@@ -28,17 +142,304 @@ class SimplificationManager:
             '__add__': self.bitwise_add_simplifier,
             '__sub__': self.bitwise_sub_simplifier,
             '__mul__': self.bitwise_mul_simplifier,
-            'ZeroExt': self.zeroext_simplifier,
-            'SignExt': self.signext_simplifier,
-            'fpToIEEEBV': self.fptobv_simplifier,
-            'fpToFP': self.fptofp_simplifier,
-            'StrReverse': self.str_reverse_simplifier,
         }
+        self._default_simplifiers = dict(self._simplifiers)
+        self._linear_simplifiers = {
+            '__add__': self.linear_add_simplifier,
+            '__sub__': self.linear_sub_simplifier,
+            '__neg__': self.linear_neg_simplifier,
+            '__mul__': self.linear_mul_simplifier,
+            '__lshift__': self.linear_lshift_simplifier,
+            '__eq__': self.linear_eq_simplifier,
+            '__ne__': self.linear_ne_simplifier,
+        }
+
+        self.rules = RuleSet()
+        self._add_default_rules()
+
+        # the profile being collected by each thread (see profile())
+        self._profiles = threading.local()
 
     def simplify(self, op, args):
-        if op not in self._simplifiers:
+        if op not in self._simplifiers and not self.rules.handles(op):
             return None
-        return self._simplifiers[op](*args)
+        if not self._cache_size:
+            return self._simplify(op, args)
+
+        try:
+            # the types of non-AST arguments are part of the key, since e.g. 1, 1.0 and True are equal and hash alike
+            key = (op, tuple(a._hash if isinstance(a, Base) else (type(a), a) for a in args))
+            hash(key)
+        except TypeError:
+            # unhashable non-AST arguments
+            return self._simplify(op, args)
+
+        cache = self._cache
+        with self._cache_lock:
+            entry = cache.get(key, None)
+            if entry is not None and self._same_args(entry[1], args):
+                r = None if entry[0] is self._NO_SIMPLIFICATION else entry[0]()
+                if r is not None or entry[0] is self._NO_SIMPLIFICATION:
+                    self.cache_hits += 1
+                    cache.move_to_end(key)
+                    return r
+            self.cache_misses += 1
+
+        r = self._simplify(op, args)
+        if r is None or (isinstance(r, Base) and self._is_rebuild(r, op, args)):
+            # a "simplification" into the same operation is found again just as fast by hash-consing
+            result = self._NO_SIMPLIFICATION
+        elif isinstance(r, Base):
+            # results are referenced weakly, so that the cache does not keep them (and their subexpressions) alive
+            result = weakref.ref(r)
+        else:
+            return r
+        entry = (result, tuple(weakref.ref(a) for a in args if isinstance(a, Base)))
+
+        with self._cache_lock:
+            cache[key] = entry
+            if len(cache) > self._cache_size:
+                cache.popitem(last=False)
+                self.cache_evictions += 1
+        return r
+
+    @staticmethod
+    def _same_args(refs, args):
+        refs = iter(refs)
+        return all(next(refs)() is a for a in args if isinstance(a, Base))
+
+    @staticmethod
+    def _is_rebuild(r, op, args):
+        return r.op == op and len(r.args) == len(args) and all(
+            a is b or (not isinstance(a, Base) and type(a) is type(b) and a == b) for a, b in zip(r.args, args)
+        )
+
+    def _simplify(self, op, args):
+        profile = getattr(self._profiles, 'current', None)
+        if profile is not None:
+            return self._simplify_profiled(profile, op, args)
+        r = self.rules.rewrite(op, args)
+        if r is None:
+            simplifier = self._simplifiers.get(op, None)
+            if simplifier is not None:
+                r = simplifier(*args)
+        return r
+
+    def _simplify_profiled(self, profile, op, args):
+        for rule in self.rules.candidates(op, args):
+            start = time.perf_counter()
+            r = rule.apply(op, args)
+            profile._record(rule.name, op, args, r, time.perf_counter() - start)
+            if r is not None:
+                return r
+
+        simplifier = self._simplifiers.get(op, None)
+        if simplifier is None:
+            return None
+        start = time.perf_counter()
+        r = simplifier(*args)
+        profile._record(simplifier.__name__, op, args, r, time.perf_counter() - start)
+        return r
+
+    @contextlib.contextmanager
+    def profile(self):
+        """
+        Collects per-simplifier statistics (see :class:`SimplifierStats`) within a `with` block::
+
+            with claripy.simplifications.simpleton.profile() as prof:
+                ...
+            print(prof.to_csv())
+
+        Only the simplifications that are actually run by the thread that entered the block are counted. Operations
+        whose simplification is cached (see :meth:`set_cache_size`) are not.
+        """
+        profiles = self._profiles
+        previous = getattr(profiles, 'current', None)
+        profile = profiles.current = SimplificationProfile()
+        try:
+            yield profile
+        finally:
+            profiles.current = previous
+
+    def add_rule(self, pattern, action, guard=None, name=None):
+        """
+        Adds a rewrite rule, which is tried after the rules that were added before it, and before the simplifier
+        function of the op. See :meth:`claripy.rewrite_rules.RuleSet.add`.
+        """
+        rule = self.rules.add(pattern, action, guard=guard, name=name)
+        # cached results might not be what the new rule makes of them
+        self.clear_cache()
+        return rule
+
+    #
+    # Whole-AST simplification
+    #
+
+    def fixpoint(self, asts, rounds=DEFAULT_FIXPOINT_ROUNDS, timeout=None, max_nodes=None):
+        """
+        Simplifies ASTs in pure Python, without a solver backend: every distinct subexpression is rebuilt bottom-up,
+        concrete subexpressions are folded into constants with the concrete backend, and the others are simplified
+        with the rules and the simplifier functions, over and over until nothing changes anymore (or the budget runs
+        out). Since every step keeps the ASTs equivalent, running out of budget only leaves them less simplified.
+
+        :param asts:        A list of ASTs.
+        :param rounds:      The maximum number of passes over the ASTs.
+        :param timeout:     The time budget, in seconds.
+        :param max_nodes:   The maximum number of subexpressions to simplify, over all the passes.
+        :returns:           A list of the simplified ASTs.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        budget = [ max_nodes ]
+        changed = [ False ]
+        # the ASTs that are known to be fully simplified, which later passes do not descend into again
+        stable = { }
+
+        def _pre(e):
+            return e if id(e) in stable else None
+
+        def _post(e):
+            if e.depth == 1 or e.annotations:
+                return None
+            if budget[0] is not None:
+                if budget[0] <= 0:
+                    return None
+                budget[0] -= 1
+            if deadline is not None and time.perf_counter() > deadline:
+                budget[0] = 0
+                return None
+
+            r = None
+            if not e.symbolic:
+                try:
+                    r = backends.concrete.simplify(e)
+                except (BackendError, ClaripyOperationError):
+                    # e.g., a division by zero
+                    pass
+            if r is None:
+                r = self.simplify(e.op, e.args)
+            if r is None or r is e or not isinstance(r, Base):
+                if all(id(a) in stable for a in e.args if isinstance(a, Base) and a.depth > 1):
+                    stable[id(e)] = e
+                return None
+            changed[0] = True
+            return r
+
+        asts = list(asts)
+        for _ in range(rounds):
+            changed[0] = False
+            asts = Rewriter(pre=_pre, post=_post).rewrite_many(asts)
+            if not changed[0] or budget[0] == 0:
+                break
+        return asts
+
+    #
+    # The result cache
+    #
+
+    def set_cache_size(self, size):
+        """
+        Sets the number of simplification results to cache.
+
+        :param size:    The maximum number of cached results. 0 disables the cache.
+        :returns:       The previous size.
+        """
+        if size < 0:
+            raise ValueError("cache size must be non-negative")
+        with self._cache_lock:
+            old = self._cache_size
+            self._cache_size = size
+            while len(self._cache) > size:
+                self._cache.popitem(last=False)
+        return old
+
+    def clear_cache(self):
+        """
+        Drops all the cached simplification results, and resets the cache counters.
+        """
+        with self._cache_lock:
+            self._cache.clear()
+            self.cache_hits = 0
+            self.cache_misses = 0
+            self.cache_evictions = 0
+
+    def cache_stats(self):
+        """
+        Reports the state of the result cache.
+
+        :returns:   A dict with the size, number of entries, hits, misses, evictions and hit rate of the cache.
+        """
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'size': self._cache_size,
+            'entries': len(self._cache),
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'evictions': self.cache_evictions,
+            'hit_rate': self.cache_hits / lookups if lookups else 0.0,
+        }
+
+    #
+    # Linear normalization
+    #
+
+    def set_linear_normalization(self, enabled):
+        """
+        Enables or disables the normalization of bitvector arithmetic into linear forms (see
+        :mod:`claripy.ast.linear`). When enabled, trees of `+`, `-`, negations, and multiplications and left shifts by
+        constants are rebuilt as the canonical AST of their linear form (e.g., `(rsp - 8) + 16 - 8` becomes `rsp`, and
+        `x*4 + x*4` becomes `x*8`), and `==` and `!=` are decided when their sides only differ by a constant.
+
+        :param enabled: Whether to normalize linear arithmetic.
+        :returns:       Whether it was normalized before.
+        """
+        old = self._simplifiers.get('__add__', None) == self.linear_add_simplifier
+        if enabled:
+            self._simplifiers.update(self._linear_simplifiers)
+        else:
+            for op in self._linear_simplifiers:
+                self._simplifiers.pop(op, None)
+            self._simplifiers.update(self._default_simplifiers)
+        if old != bool(enabled):
+            # cached results might not be normalized, or normalized when they should not be
+            self.clear_cache()
+        return old
+
+    def _linear_simplifier(self, op, args):
+        if not any(a.annotations for a in args):
+            form = linear.LinearForm.of_operation(op, args)
+            if form is not None:
+                return form.to_ast()
+        simplifier = self._default_simplifiers.get(op, None)
+        return None if simplifier is None else simplifier(*args)
+
+    def linear_add_simplifier(self, *args):
+        return self._linear_simplifier('__add__', args)
+
+    def linear_sub_simplifier(self, a, b):
+        return self._linear_simplifier('__sub__', (a, b))
+
+    def linear_neg_simplifier(self, a):
+        return self._linear_simplifier('__neg__', (a,))
+
+    def linear_mul_simplifier(self, *args):
+        return self._linear_simplifier('__mul__', args)
+
+    def linear_lshift_simplifier(self, a, b):
+        if b.op != 'BVV':
+            return None
+        return self._linear_simplifier('__lshift__', (a, b))
+
+    def linear_eq_simplifier(self, a, b):
+        d = linear.linear_difference(a, b)
+        if d is not None:
+            return ast.true if d == 0 else ast.false
+        return self.eq_simplifier(a, b)
+
+    def linear_ne_simplifier(self, a, b):
+        d = linear.linear_difference(a, b)
+        if d is not None:
+            return ast.false if d == 0 else ast.true
+        return self.ne_simplifier(a, b)
 
     @staticmethod
     def _deduplicate_filter(args):
@@ -52,12 +453,105 @@ class SimplificationManager:
             new_args.append(arg)
         return new_args
 
+    #
+    # The rewrite rules. The simplifier functions below run after these, for whatever the rules do not cover.
+    #
+
+    def _add_default_rules(self):
+        add = self.rules.add
+        ops = lambda: ast.all_operations
+
+        # Reverse
+        add(P('Reverse', P('Reverse', V('x'))), lambda x: x, name='Reverse(Reverse(x)) ==> x')
+        add(P('Reverse', V('x')), lambda x: x, guard=lambda x: x.length == 8, name='Reverse(byte) ==> byte')
+
+        # Not
+        add(P('Not', P('Not', V('x'))), lambda x: x, name='Not(Not(x)) ==> x')
+        add(P('Not', P('__eq__', V('a'), V('b'))), lambda a, b: a != b)
+        add(P('Not', P('__ne__', V('a'), V('b'))), lambda a, b: a == b)
+        for cmp, negated in _NEGATED_COMPARISONS.items():
+            add(P('Not', P(cmp, V('a'), V('b'))),
+                partial(lambda negated, a, b: getattr(ops(), negated)(a, b), negated))
+
+        # __eq__ and __ne__
+        add(P('__eq__', V('a'), V('a')), lambda a: ast.true, name='x == x ==> true')
+        add(P('__eq__', V('a'), P('BoolV', True, name='b')), lambda a, b: a,
+            guard=lambda a, b: isinstance(a, ast.Bool) and b is ast.true)
+        add(P('__eq__', P('BoolV', True, name='a'), V('b')), lambda a, b: b,
+            guard=lambda a, b: isinstance(b, ast.Bool) and a is ast.true)
+        add(P('__eq__', V('a'), P('BoolV', False, name='b')), lambda a, b: ops().Not(a),
+            guard=lambda a, b: isinstance(a, ast.Bool) and b is ast.false)
+        add(P('__eq__', P('BoolV', False, name='a'), V('b')), lambda a, b: ops().Not(b),
+            guard=lambda a, b: isinstance(b, ast.Bool) and a is ast.false)
+        add(P('__eq__', P('Reverse', V('x')), P('Reverse', V('y'))), lambda x, y: x == y)
+        # simple canonicalization
+        add(P('__eq__', P('BVV', ANY, ANY, name='a'), V('b')), lambda a, b: b == a, guard=lambda a, b: b.op != 'BVV')
+
+        add(P('__ne__', V('a'), V('a')), lambda a: ast.false, name='x != x ==> false')
+        add(P('__ne__', P('Reverse', V('x')), P('Reverse', V('y'))), lambda x, y: x != y)
+
+        # comparisons that follow from the known bits and ranges of their arguments (see claripy.ast.known_bits)
+        for cmp in sorted(known_bits.COMPARISONS):
+            add(P(cmp, V('a'), V('b')), partial(self._decide_comparison, cmp), name='deciding %s from known bits' % cmp)
+
+        # shifts
+        for shift_op in ('__lshift__', '__rshift__', 'LShR'):
+            add(P(shift_op, V('val'), V('shift')), lambda val, shift: val,
+                guard=lambda val, shift: (shift == 0).is_true(), name='%s(x, 0) ==> x' % shift_op)
+        add(P('__lshift__', P('__lshift__', V('x'), V('inner')), V('shift')),
+            lambda x, inner, shift: x << (inner + shift))
+        for shift_op in ('__rshift__', 'LShR'):
+            # shifting out everything but the leading zeros
+            add(P(shift_op, V('val'), V('shift')), lambda val, shift: ops().BVV(0, val.size()),
+                guard=lambda val, shift: val.op == 'Concat' and (val.args[0] == 0).is_true() and
+                                         (shift > val.size() - val.args[0].size()).is_true())
+            add(P(shift_op, P('ZeroExt', V('n'), ANY, name='val'), V('shift')),
+                lambda n, val, shift: ops().BVV(0, val.size()),
+                guard=lambda n, val, shift: (shift > val.size() - n).is_true())
+
+        # extensions
+        add(P('ZeroExt', 0, V('x')), lambda x: x, name='ZeroExt(0, x) ==> x')
+        add(P('ZeroExt', V('n'), P('ZeroExt', V('m'), V('x'), name='e')),
+            lambda n, m, x, e: e.make_like(e.op, (n + m, x), length=n + e.size(), simplify=True),
+            name='ZeroExt(n, ZeroExt(m, x)) ==> ZeroExt(n + m, x)')
+        # TODO: if top bit is 0, do a zero-extend instead
+        add(P('SignExt', 0, V('x')), lambda x: x, name='SignExt(0, x) ==> x')
+
+        # Extract
+        add(P('Extract', V('high'), V('low'), V('val')), lambda high, low, val: val,
+            guard=lambda high, low, val: high - low + 1 == val.size(), name='extracting the whole value')
+        for ext_op in ('SignExt', 'ZeroExt'):
+            add(P('Extract', V('high'), 0, P(ext_op, ANY, V('x'))), lambda high, x: x,
+                guard=lambda high, x: high + 1 == x.size(), name='extracting the unextended value of a %s' % ext_op)
+
+        # (x - y) + z ==> x - (y - z)
+        add(P('__add__', P('__sub__', V('x'), P('BVV', ANY, ANY, name='y')), P('BVV', ANY, ANY, name='z')),
+            lambda x, y, z: x - (y - z))
+
+        # floating point conversions (oh gods)
+        add(P('fpToIEEEBV', P('fpToFP', V('x'), ANY)), lambda x: x)
+        add(P('fpToFP', P('fpToIEEEBV', V('x'), name='to_bv'), V('sort')), lambda x, to_bv, sort: x,
+            guard=lambda x, to_bv, sort: (sort == fp.FSORT_FLOAT and to_bv.length == 32) or
+                                         (sort == fp.FSORT_DOUBLE and to_bv.length == 64))
+
+        add(P('StrReverse', V('x')), lambda x: x)
+
     #
     # The simplifiers.
     #
 
     #pylint:disable=inconsistent-return-statements
 
+    @staticmethod
+    def _decide_comparison(op, a, b):
+        # only comparisons with a constant are looked at, which is where the facts of the other side usually matter
+        if not isinstance(a, ast.BV) or (a.op != 'BVV' and b.op != 'BVV'):
+            return None
+        r = known_bits.decide(op, (a, b))
+        if r is None:
+            return None
+        return ast.true if r else ast.false
+
     @staticmethod
     def if_simplifier(cond, if_true, if_false):
         # NOTE: this is never called; simplifications are implemented inline in the If op. why?
@@ -148,53 +642,8 @@ class SimplificationManager:
 
         return
 
-    @staticmethod
-    def rshift_simplifier(val, shift):
-        if (shift == 0).is_true():
-            return val
-        if val.op == "Concat" and (val.args[0] == 0).is_true() and (shift > val.size() - val.args[0].size()).is_true():
-            return ast.all_operations.BVV(0, val.size())
-        if val.op == "ZeroExt" and (shift > val.size() - val.args[0]).is_true():
-            return ast.all_operations.BVV(0, val.size())
-
-    @staticmethod
-    def lshr_simplifier(val, shift):
-        if (shift == 0).is_true():
-            return val
-        if val.op == "Concat" and (val.args[0] == 0).is_true() and (shift > val.size() - val.args[0].size()).is_true():
-            return ast.all_operations.BVV(0, val.size())
-        if val.op == "ZeroExt" and (shift > val.size() - val.args[0]).is_true():
-            return ast.all_operations.BVV(0, val.size())
-
-    @staticmethod
-    def lshift_simplifier(val, shift):
-        if (shift == 0).is_true():
-            return val
-        if val.op == '__lshift__':
-            real_val, inner_shift = val.args
-            return real_val << (inner_shift + shift)
-
     @staticmethod
     def eq_simplifier(a, b):
-        if a is b:
-            return ast.true
-
-        if isinstance(a, ast.Bool) and b is ast.true:
-            return a
-        if isinstance(b, ast.Bool) and a is ast.true:
-            return b
-        if isinstance(a, ast.Bool) and b is ast.false:
-            return ast.all_operations.Not(a)
-        if isinstance(b, ast.Bool) and a is ast.false:
-            return ast.all_operations.Not(b)
-
-        if a.op == 'Reverse' and b.op == 'Reverse':
-            return a.args[0] == b.args[0]
-
-        # simple canonicalization
-        if a.op == 'BVV' and b.op != 'BVV':
-            return b == a
-
         # TODO: all these ==/!= might really slow things down...
         if a.op == 'If':
             if a.args[1] is b and ast.all_operations.is_true(a.args[2] != b):
@@ -250,12 +699,6 @@ class SimplificationManager:
 
     @staticmethod
     def ne_simplifier(a, b):
-        if a is b:
-            return ast.false
-
-        if a.op == 'Reverse' and b.op == 'Reverse':
-            return a.args[0] != b.args[0]
-
         if a.op == 'If':
             if a.args[2] is b and ast.all_operations.is_true(a.args[1] != b):
                 # (If(c, x, y) == x, x != y) -> c
@@ -310,14 +753,6 @@ class SimplificationManager:
 
     @staticmethod
     def bv_reverse_simplifier(body):
-        if body.op == 'Reverse':
-            # Reverse(Reverse(x)) ==> x
-            return body.args[0]
-
-        if body.length == 8:
-            # Reverse(byte) ==> byte
-            return body
-
         if body.op == 'Concat':
             if all(a.op == 'Extract' for a in body.args):
                 first_ast = body.args[0].args[2]
@@ -482,10 +917,6 @@ class SimplificationManager:
 
     @staticmethod
     def bitwise_add_simplifier(*args):
-        if len(args) == 2 and args[1].op == 'BVV' and args[0].op == '__sub__' and args[0].args[1].op == 'BVV':
-            # flatten add over sub
-            # (x - y) + z ==> x - (y - z)
-            return args[0].args[0] - (args[0].args[1] - args[1])
         return SimplificationManager._flatten_simplifier('__add__', lambda new_args: tuple(a for a in new_args if a.op != 'BVV' or a.args[0] != 0), *args, initial_value=ast.all_operations.BVV(0, len(args[0])))
 
     @staticmethod
@@ -651,68 +1082,8 @@ class SimplificationManager:
 
         return SimplificationManager._flatten_simplifier('__and__', SimplificationManager._deduplicate_filter, a, b, *args)
 
-    @staticmethod
-    def boolean_not_simplifier(body):
-        if body.op == '__eq__':
-            return body.args[0] != body.args[1]
-        elif body.op == '__ne__':
-            return body.args[0] == body.args[1]
-
-        if body.op == 'Not':
-            return body.args[0]
-
-        if body.op == 'SLT':
-            return ast.all_operations.SGE(body.args[0], body.args[1])
-        elif body.op == 'SLE':
-            return ast.all_operations.SGT(body.args[0], body.args[1])
-        elif body.op == 'SGT':
-            return ast.all_operations.SLE(body.args[0], body.args[1])
-        elif body.op == 'SGE':
-            return ast.all_operations.SLT(body.args[0], body.args[1])
-
-        if body.op == 'ULT':
-            return ast.all_operations.UGE(body.args[0], body.args[1])
-        elif body.op == 'ULE':
-            return ast.all_operations.UGT(body.args[0], body.args[1])
-        elif body.op == 'UGT':
-            return ast.all_operations.ULE(body.args[0], body.args[1])
-        elif body.op == 'UGE':
-            return ast.all_operations.ULT(body.args[0], body.args[1])
-
-        if body.op == '__lt__':
-            return ast.all_operations.UGE(body.args[0], body.args[1])
-        elif body.op == '__le__':
-            return ast.all_operations.UGT(body.args[0], body.args[1])
-        elif body.op == '__gt__':
-            return ast.all_operations.ULE(body.args[0], body.args[1])
-        elif body.op == '__ge__':
-            return ast.all_operations.ULT(body.args[0], body.args[1])
-
-    @staticmethod
-    def zeroext_simplifier(n, e):
-        if n == 0:
-            return e
-
-        if e.op == 'ZeroExt':
-            # ZeroExt(A, ZeroExt(B, x)) ==> ZeroExt(A + B, x)
-            return e.make_like(e.op, (n + e.args[0], e.args[1]), length=n + e.size(), simplify=True)
-
-    @staticmethod
-    def signext_simplifier(n, e):
-        if n == 0:
-            return e
-
-        # TODO: if top bit is 0, do a zero-extend instead
-
     @staticmethod
     def extract_simplifier(high, low, val):
-        # if we're extracting the whole value, return the value
-        if high - low + 1 == val.size():
-            return val
-
-        if (val.op == 'SignExt' or val.op == 'ZeroExt') and low == 0 and high + 1 == val.args[1].size():
-            return val.args[1]
-
         if val.op == 'ZeroExt':
             extending_bits = val.args[0]
             if extending_bits == 0:
@@ -792,21 +1163,6 @@ class SimplificationManager:
             all_args = tuple(a[high:low] for a in val.args)
             return reduce(getattr(operator, val.op), all_args)
 
-    # oh gods
-    @staticmethod
-    def fptobv_simplifier(the_fp):
-        if the_fp.op == 'fpToFP' and len(the_fp.args) == 2:
-            return the_fp.args[0]
-
-    @staticmethod
-    def fptofp_simplifier(*args):
-        if len(args) == 2 and args[0].op == 'fpToIEEEBV':
-            to_bv, sort = args
-            if sort == fp.FSORT_FLOAT and to_bv.length == 32:
-                return to_bv.args[0]
-            elif sort == fp.FSORT_DOUBLE and to_bv.length == 64:
-                return to_bv.args[0]
-
     @staticmethod
     def rotate_shift_mask_simplifier(a, b):
         """
@@ -863,10 +1219,6 @@ class SimplificationManager:
         expr = (masked_a << lshift_) | (masked_a >> rshift_)
         return expr
 
-    @staticmethod
-    def str_reverse_simplifier(arg):
-        return arg
-
     @staticmethod
     def and_mask_comparing_against_constant_simplifier(op, a, b):
         """
@@ -1004,6 +1356,13 @@ class SimplificationManager:
 
 SIMPLE_OPS = ('Concat', 'SignExt', 'ZeroExt')
 
+# the comparisons that Not() flips
+_NEGATED_COMPARISONS = {
+    'SLT': 'SGE', 'SLE': 'SGT', 'SGT': 'SLE', 'SGE': 'SLT',
+    'ULT': 'UGE', 'ULE': 'UGT', 'UGT': 'ULE', 'UGE': 'ULT',
+    '__lt__': 'UGE', '__le__': 'UGT', '__gt__': 'ULE', '__ge__': 'ULT',
+}
+
 extract_distributable = {
     '__and__', '__rand__',
     '__or__', '__ror__',
@@ -1011,8 +1370,13 @@ extract_distributable = {
 }
 
 from .backend_manager import backends
+from .errors import BackendError, ClaripyOperationError
 from . import ast
 from . import fp
+from .ast.base import Base
+from .ast import known_bits, linear
+from .ast.traversal import Rewriter
+from .rewrite_rules import ANY, P, RuleSet, V
 
 
 # the actual instance
@@ -4,6 +4,7 @@ from . import backends
 
 class Solver(
     frontend_mixins.ConstraintFixerMixin,
+    frontend_mixins.OutliningMixin,
     frontend_mixins.ConcreteHandlerMixin,
     frontend_mixins.EagerResolutionMixin,
     frontend_mixins.ConstraintFilterMixin,
@@ -53,13 +54,15 @@ class SolverHybrid(
     def __init__(
         self, exact_frontend=None, approximate_frontend=None,
         complex_auto_replace=True, replace_constraints=True,
-        track=False, approximate_first=False,
+        track=False, approximate_first=False, simplify_method=None,
         **kwargs
     ):
-        exact_frontend = Solver(track=track) if exact_frontend is None else exact_frontend
+        exact_frontend = Solver(track=track, simplify_method=simplify_method) if exact_frontend is None else \
+            exact_frontend
         approximate_frontend = SolverReplacement(
-            actual_frontend=SolverVSA(),
+            actual_frontend=SolverVSA(simplify_method=simplify_method),
             complex_auto_replace=complex_auto_replace, replace_constraints=replace_constraints,
+            simplify_method=simplify_method,
         ) if approximate_frontend is None else approximate_frontend
         super(SolverHybrid, self).__init__(
             exact_frontend, approximate_frontend, approximate_first=approximate_first, **kwargs
@@ -116,6 +119,7 @@ class SolverCompositeChild(
 
 class SolverComposite(
     frontend_mixins.ConstraintFixerMixin,
+    frontend_mixins.OutliningMixin,
     frontend_mixins.ConcreteHandlerMixin,
     frontend_mixins.EagerResolutionMixin,
     frontend_mixins.ConstraintFilterMixin,
@@ -127,11 +131,15 @@ class SolverComposite(
     frontend_mixins.CompositedCacheMixin,
     frontends.CompositeFrontend
 ):
-    def __init__(self, template_solver=None, track=False, template_solver_string=None, **kwargs):
-        template_solver = SolverCompositeChild(track=track) if template_solver is None else template_solver
-        template_solver_string = SolverCompositeChild(track=track, backend=backends.z3) if \
+    def __init__(self, template_solver=None, track=False, template_solver_string=None, simplify_method=None, **kwargs):
+        # the children do the actual simplification
+        template_solver = SolverCompositeChild(track=track, simplify_method=simplify_method) if \
+            template_solver is None else template_solver
+        template_solver_string = SolverCompositeChild(track=track, backend=backends.z3, simplify_method=simplify_method) if \
             template_solver_string is None else template_solver_string
-        super(SolverComposite, self).__init__(template_solver, template_solver_string, track=track, **kwargs)
+        super(SolverComposite, self).__init__(
+            template_solver, template_solver_string, track=track, simplify_method=simplify_method, **kwargs
+        )
 
     def __repr__(self):
         return "<SolverComposite %x, %d children>" % (id(self), len(self._solver_list))
@@ -1,7 +1,15 @@
+import logging
+import os
+import subprocess
+import sys
+import threading
+
 import nose.tools
 
 import claripy
 
+l = logging.getLogger('claripy.test.ast')
+
 
 def test_lite_repr():
     one = claripy.BVV(1, 8)
@@ -43,6 +51,479 @@ def test_associativity():
                             '<BV8 x * (y / (z % w))>')
 
 
+_STABLE_HASH_SCRIPT = """
+import claripy
+x = claripy.BVS('x', 32, explicit_name=True)
+y = claripy.BVS('y', 32, explicit_name=True)
+f = claripy.FPS('f', claripy.FSORT_DOUBLE, explicit_name=True)
+e = claripy.If(x > y, (x + 1) * y, claripy.Extract(31, 0, claripy.Concat(x, y)))
+print(x._hash, e._hash, (f + claripy.FPV(1.5, claripy.FSORT_DOUBLE))._hash)
+
+class Tag(claripy.Annotation):
+    def __init__(self, tags):
+        self.tags = tags
+a = x.annotate(claripy.SimplificationAvoidanceAnnotation(), Tag(frozenset(('a', 'b', 'c', 'd'))))
+print(a._hash, (a + 1)._hash)
+"""
+
+def test_stable_hash():
+    hashes = set()
+    for seed in ('1', '2', '1337'):
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        hashes.add(subprocess.check_output([sys.executable, '-c', _STABLE_HASH_SCRIPT], env=env))
+    nose.tools.assert_equal(len(hashes), 1)
+
+    x = claripy.BVS('x', 32, explicit_name=True)
+    y = claripy.BVS('y', 32, explicit_name=True)
+    e = claripy.If(x > y, (x + 1) * y, claripy.Extract(31, 0, claripy.Concat(x, y)))
+    nose.tools.assert_equal(hashes.pop().split()[:2], [str(x._hash).encode(), str(e._hash).encode()])
+
+    # annotations that compare by identity are hashed by their state, and still tell their ASTs apart
+    class Tag(claripy.Annotation):
+        def __init__(self, tags):
+            self.tags = tags
+    a, b = x.annotate(Tag({'a'})), x.annotate(Tag({'a'}))
+    nose.tools.assert_equal(a._hash, b._hash)
+    nose.tools.assert_is_not(a, b)
+    nose.tools.assert_is_not(a + 1, b + 1)
+    nose.tools.assert_is(a + 1, a + 1)
+
+
+_HASH_ENGINE_SCRIPT = """
+import claripy
+from claripy.ast.bv import BV
+x = claripy.BVS('x', 64, explicit_name=True)
+a = BV('__add__', (x, claripy.BVV(1, 64)), length=64)
+assert BV('__add__', (x, claripy.BVV(1, 64)), length=64) is a
+assert BV('__add__', (x, claripy.BVV(2, 64)), length=64) is not a
+print(claripy.ast.base.Base._hash_engine.name)
+"""
+
+def test_hash_engines():
+    # every engine can be selected, and hash-conses the ASTs it builds
+    for engine in claripy.ast.base.hash_engines:
+        env = dict(os.environ, CLARIPY_HASH_ENGINE=engine)
+        out = subprocess.check_output([sys.executable, '-c', _HASH_ENGINE_SCRIPT], env=env)
+        nose.tools.assert_equal(out.decode().strip(), engine)
+
+def test_compact_layout():
+    from claripy.ast.base import _side_table
+
+    x = claripy.BVS('x', 32)
+    nose.tools.assert_false(hasattr(x, '__dict__'))
+    nose.tools.assert_true(x.symbolic)
+    nose.tools.assert_false(claripy.BVV(1, 32).symbolic)
+    nose.tools.assert_false(x.uninitialized)
+    nose.tools.assert_true(claripy.BVS('u', 32, uninitialized=True).uninitialized)
+    nose.tools.assert_is(claripy.BoolS('b').uninitialized, None)
+
+    e = (x + 1) * 3
+    nose.tools.assert_equal(e._simplified, 0)
+    e._simplified = claripy.ast.Base.FULL_SIMPLIFY
+    nose.tools.assert_equal(e._simplified, claripy.ast.Base.FULL_SIMPLIFY)
+    nose.tools.assert_true(e.symbolic)
+    nose.tools.assert_equal(e._errored, frozenset())
+
+    # errored backends are inherited by parents
+    e._set_errored(claripy.backends.concrete)
+    nose.tools.assert_equal(e._errored, { claripy.backends.concrete })
+    nose.tools.assert_true((e + 1)._is_errored(claripy.backends.concrete))
+    nose.tools.assert_false((e + 1)._is_errored(claripy.backends.z3))
+
+    # backends past the width of the flags record errors in the side table
+    from claripy.backends import BackendConcrete, _ERRORED_FLAG_WIDTH
+    extra = [ BackendConcrete() for _ in range(_ERRORED_FLAG_WIDTH + 1) ]
+    nose.tools.assert_equal(extra[-1]._errored_flag, 0)
+    nose.tools.assert_true(all(b._errored_flag < 1 << 30 for b in extra))
+    f = x * 5
+    nose.tools.assert_raises(claripy.BackendError, extra[-1].convert, f)
+    nose.tools.assert_true(f._is_errored(extra[-1]))
+    nose.tools.assert_false(f._is_errored(extra[-2]))
+    nose.tools.assert_equal(f._errored, { extra[-1] })
+    del f
+
+    # rare fields live in the side table, and are dropped together with their node
+    y = claripy.BVS('y', 32)
+    nose.tools.assert_is(y._uc_alloc_depth, None)
+    size = len(_side_table)
+    y._uc_alloc_depth = 3
+    y._excavated = y
+    nose.tools.assert_equal(y.uc_alloc_depth, 3)
+    nose.tools.assert_is(y.ite_excavated, y)
+    nose.tools.assert_equal(len(_side_table), size + 1)
+    del y
+    nose.tools.assert_equal(len(_side_table), size)
+
+    # cache keys are created on demand, and then kept
+    z = claripy.BVS('z', 32)
+    nose.tools.assert_is(z.cache_key, z.cache_key)
+    nose.tools.assert_is(z.cache_key.ast, z)
+
+    # encoded names are computed on demand, and do not take a side-table entry
+    size = len(_side_table)
+    nose.tools.assert_equal(z._encoded_name, z.args[0].encode())
+    nose.tools.assert_equal(len(_side_table), size)
+
+def test_cache_stats():
+    x = claripy.BVS('x', 32)
+    claripy.ast.reset_cache_stats()
+
+    e = (x + 1) * 3
+    stats = claripy.ast.cache_stats()
+    nose.tools.assert_equal(stats['live'], stats['live_leaves'] + stats['live_interior'])
+    nose.tools.assert_greater_equal(stats['by_op']['__mul__'], 1)
+    nose.tools.assert_greater_equal(stats['by_type']['BV'], 3)
+    nose.tools.assert_greater_equal(stats['interior_misses'], 2)
+
+    hits = stats['interior_hits']
+    nose.tools.assert_is((x + 1) * 3, e)
+    nose.tools.assert_equal(claripy.ast.cache_stats(by_op=False)['interior_hits'], hits + 2)
+
+def test_keepalive():
+    def churn():
+        # builds the same subexpressions over and over, dropping them in between
+        for _ in range(10):
+            for i in range(20):
+                claripy.BVS('y', 32, explicit_name=True) * (i + 1000)
+
+    old = claripy.ast.set_keepalive_size(0)
+    try:
+        claripy.ast.reset_cache_stats()
+        churn()
+        misses_without = claripy.ast.cache_stats(by_op=False)['interior_misses']
+
+        claripy.ast.set_keepalive_size(1000)
+        churn()
+        claripy.ast.reset_cache_stats()
+        churn()
+        stats = claripy.ast.cache_stats(by_op=False)
+        nose.tools.assert_equal(stats['interior_misses'], 0)
+        nose.tools.assert_greater(misses_without, 0)
+        nose.tools.assert_less_equal(stats['keepalive_count'], 1000)
+
+        claripy.ast.set_keepalive_size(5)
+        nose.tools.assert_equal(claripy.ast.cache_stats(by_op=False)['keepalive_count'], 5)
+    finally:
+        claripy.ast.set_keepalive_size(old)
+
+def test_fast_path_equivalence():
+    from claripy.ast.bv import BV
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+
+    # the same AST, built through the fast path and (because of the explicit keywords) through the general path
+    fast = BV('__add__', (x, y), length=32)
+    slow = BV('__add__', (x, y), length=32, symbolic=True, variables=x.variables | y.variables)
+    nose.tools.assert_is(fast, slow)
+    nose.tools.assert_equal(fast.depth, 2)
+    nose.tools.assert_is(fast.variables, (y + x).variables)
+
+    # annotated arguments are still handled by the general path
+    class Relocatable(claripy.Annotation):
+        eliminatable = False
+        relocatable = True
+    a = x.annotate(Relocatable())
+    e = BV('__add__', (a, y), length=32)
+    nose.tools.assert_equal(e.annotations, a.annotations)
+    nose.tools.assert_is_not(e, fast)
+
+def test_interned_constants():
+    from claripy.ast.bv import _bvv_cache
+
+    # interned constants are found by their value, whatever form it is given in
+    nose.tools.assert_is(claripy.BVV(-1, 32), claripy.BVV(0xffffffff, 32))
+    nose.tools.assert_is(claripy.BVV(-1, 32), _bvv_cache[(0xffffffff, 32)])
+    nose.tools.assert_is(claripy.BVV(b'\x80', 8), claripy.BVV(-128, 8))
+    nose.tools.assert_is(claripy.BVV(0x100000001, 32), claripy.BVV(1, 32))
+    nose.tools.assert_equal(claripy.BVV(-1, 64).args, (0xffffffffffffffff, 64))
+    nose.tools.assert_is(claripy.BoolV(True), claripy.true)
+    nose.tools.assert_is(claripy.BoolV(False), claripy.false)
+
+    # the table survives a reset
+    claripy.reset()
+    nose.tools.assert_in((-1, 32), _bvv_cache)
+
+def test_precompiled_arg_fixing():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+
+    # ints are converted to BVVs of the other argument's length, on either side
+    nose.tools.assert_is(x + 1, x + claripy.BVV(1, 32))
+    nose.tools.assert_is(1 + x, claripy.BVV(1, 32) + x)
+    nose.tools.assert_is(1 - x, claripy.BVV(1, 32) - x)
+    nose.tools.assert_is((x & 0xff).args[1], claripy.BVV(0xff, 32))
+    nose.tools.assert_is(claripy.Extract(7, 0, x), x[7:0])
+    nose.tools.assert_equal(claripy.Concat(x, y, x).length, 96)
+    nose.tools.assert_is((x == 3).args[1], claripy.BVV(3, 32))
+    nose.tools.assert_is(claripy.And(x == 1, True).op, '__eq__')
+
+    # arguments the precompiled fixers do not handle still go through the generic one
+    f = claripy.FPS('f', claripy.FSORT_DOUBLE)
+    nose.tools.assert_is(f + 1, f + claripy.FPV(1.0, claripy.FSORT_DOUBLE))
+    nose.tools.assert_is(claripy.fpAdd(claripy.fp.RM.default(), f, f), claripy.fpAdd(f, f))
+    nose.tools.assert_raises(claripy.ClaripyTypeError, claripy.Extract, 7, 0)
+
+def test_size_metrics():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    nose.tools.assert_equal((x.tree_size, x.dag_size), (1, 1))
+
+    a = x + y
+    e = a * a
+    nose.tools.assert_equal(a.tree_size, 3)
+    nose.tools.assert_equal(e.tree_size, 7)
+    nose.tools.assert_equal(e.dag_size, 4)
+    nose.tools.assert_equal(e[7:0].dag_size, 5)
+
+    # sharing makes the tree size exponential in the depth, but it is still cheap to get
+    for _ in range(100):
+        e = claripy.LShR(e, e)
+    nose.tools.assert_equal(e.tree_size, 2 ** 100 * 8 - 1)
+    nose.tools.assert_equal(e.dag_size, 104)
+
+_HASH_COLLISION_SCRIPT = """
+import gc
+import claripy
+from claripy.ast.base import HashEngine, set_hash_engine
+from claripy.ast.bv import BV
+
+class ConstantHashEngine(HashEngine):
+    def hash(self, op, args, keywords):
+        return 12345
+
+set_hash_engine(ConstantHashEngine())
+x = claripy.BVS('x', 32)
+y = claripy.BVS('y', 32)
+assert x._hash == y._hash == 12345
+
+# colliding ASTs are chained under the same hash, so their hashes do not depend on the order they are built in
+a = BV('__add__', (x, y), length=32)
+b = BV('__sub__', (x, y), length=32)
+c = BV('__mul__', (x, y), length=32)
+assert a._hash == b._hash == c._hash == 12345
+assert (a.op, b.op, c.op) == ('__add__', '__sub__', '__mul__')
+assert BV('__add__', (x, y), length=32) is a
+assert BV('__mul__', (x, y), length=32) is c
+
+# the colliding ASTs are still found when the first one is gone
+del a
+gc.collect()
+assert BV('__sub__', (x, y), length=32) is b
+assert BV('__mul__', (x, y), length=32) is c
+assert BV('__add__', (x, y), length=32).op == '__add__'
+
+# the simplification cache tells colliding arguments apart
+assert claripy.simplifications.simpleton._cache_size
+assert (x ^ x) is claripy.BVV(0, 32)
+assert (x ^ y).op == '__xor__'
+assert (y ^ y) is claripy.BVV(0, 32)
+print('ok')
+"""
+
+def test_hash_collision_detection():
+    # the engine can only be switched when no other ASTs are alive, so this runs in a fresh process
+    out = subprocess.check_output([sys.executable, '-c', _HASH_COLLISION_SCRIPT])
+    nose.tools.assert_equal(out.split(), [b'ok'])
+
+    x = claripy.BVS('x', 32)
+    e = x + 1
+    nose.tools.assert_raises(claripy.ClaripyOperationError, claripy.ast.base.set_hash_engine, 'md5')
+    assert e.args[0] is x
+
+def test_interned_variables():
+    from claripy.ast.base import VariableSet, EMPTY_VARIABLES
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+
+    # ASTs with the same variables share the same set
+    a = (x + 1) * 2
+    nose.tools.assert_is(a.variables, x.variables)
+    nose.tools.assert_is((x + y).variables, (y - x).variables)
+    nose.tools.assert_is((x + y).variables, ((x + y) & x).variables)
+    nose.tools.assert_is(claripy.BVV(1, 32).variables, EMPTY_VARIABLES)
+
+    v = (x + y).variables
+    nose.tools.assert_is(type(v), VariableSet)
+    nose.tools.assert_equal(v, { x.args[0], y.args[0] })
+    nose.tools.assert_is(claripy.BVS('z', 32, explicit_name=True).variables,
+                         claripy.BVS('z', 64, explicit_name=True).variables)
+
+    # they survive pickling as interned sets
+    import pickle
+    nose.tools.assert_is(pickle.loads(pickle.dumps(v)), v)
+
+    # sets that could not be interned (because their hashes collide in the table) still match on hash-consing
+    e = x + y
+    uninterned = VariableSet(v)
+    assert uninterned is not v
+    assert e._hashcons_matches(e.op, e.args, { 'symbolic': True, 'variables': uninterned, 'annotations': e.annotations })
+
+    # splitting constraints still produces independent groups
+    z = claripy.BVS('z', 32)
+    s = claripy.Solver()
+    s.add(x > 1)
+    s.add(x + y == 5)
+    s.add(z < 3)
+    s.add(x < 10)
+    groups = sorted((sorted(vs), len(cs)) for vs, cs in s.independent_constraints())
+    nose.tools.assert_equal(groups, sorted([ (sorted(v), 3), ([ z.args[0] ], 1) ]))
+
+
+def _build_trace(prefix, n):
+    xs = [ claripy.BVS(prefix + str(i), 32, explicit_name=True) for i in range(8) ]
+    out = [ ]
+    for i in range(n):
+        e = (xs[i % 8] + i) ^ xs[(i * 3) % 8]
+        out.append(claripy.If(e[15:0] == i, e * 3, e - xs[(i + 1) % 8]))
+    return out
+
+def test_threaded_hashcons(threads=8, n=300):
+    """
+    Threads that build the same new expressions at the same time must end up with the same ASTs.
+    """
+    barrier = threading.Barrier(threads)
+    results = [ None ] * threads
+
+    def work(t):
+        barrier.wait()
+        results[t] = _build_trace('threaded_hashcons_', n)
+
+    workers = [ threading.Thread(target=work, args=(t,)) for t in range(threads) ]
+    for w in workers: w.start()
+    for w in workers: w.join()
+
+    for r in results[1:]:
+        assert len(r) == n
+        assert all(a is b for a, b in zip(results[0], r))
+        assert all(a.variables is b.variables for a, b in zip(results[0], r))
+
+def test_threaded_keepalive(threads=8, n=200):
+    """
+    Threads that churn through the keep-alive tier while it is resized must not corrupt it.
+    """
+    barrier = threading.Barrier(threads + 1)
+    errors = [ ]
+
+    def work(t):
+        barrier.wait()
+        try:
+            _build_trace('threaded_keepalive_%d_' % (t % 2), n)
+        except Exception as e: #pylint:disable=broad-except
+            errors.append(e)
+
+    old = claripy.ast.set_keepalive_size(16)
+    try:
+        workers = [ threading.Thread(target=work, args=(t,)) for t in range(threads) ]
+        for w in workers: w.start()
+        barrier.wait()
+        for size in (0, 8, 32, 16):
+            claripy.ast.set_keepalive_size(size)
+        for w in workers: w.join()
+
+        assert not errors
+        assert claripy.ast.cache_stats(by_op=False)['keepalive_count'] <= 16
+    finally:
+        claripy.ast.set_keepalive_size(old)
+
+def test_commutative_normalization():
+    from claripy.operations import set_commutative_normalization
+    import claripy.operations
+
+    a, b, c = (claripy.BVS(n, 32) for n in 'abc')
+    x, y, z = (claripy.BoolS(n) for n in 'xyz')
+    assert a + b is not b + a
+
+    old = set_commutative_normalization(True)
+    try:
+        assert a + b is b + a
+        assert (a & b) is (b & a)
+        assert a + (b + c) is (c + a) + b
+        nose.tools.assert_equal(len((a + (b + c)).args), 3)
+        assert claripy.And(x, claripy.And(y, z)) is claripy.And(claripy.And(z, y), x)
+        assert claripy.Or(x, y) is claripy.Or(y, x)
+        assert (a == 1) is (1 == a)
+        assert (a - b) is not (b - a)
+
+        # nested ASTs are only flattened up to the limit
+        limit = claripy.operations.NORMALIZATION_FLATTEN_LIMIT
+        wide = [ claripy.BVS('n%d' % i, 32) for i in range(limit) ]
+        nose.tools.assert_equal(len(claripy.operations._normalize_args('__add__', (a, b + c))), 3)
+        nose.tools.assert_equal(len(claripy.operations._normalize_args('__add__', wide + [ b + c ])), limit + 1)
+
+        s = claripy.Solver()
+        s.add(b + a == 10)
+        s.add(a == 3)
+        nose.tools.assert_equal(s.eval(a + b, 2), (10,))
+        nose.tools.assert_equal(s.eval(b - a, 2), (4,))
+    finally:
+        set_commutative_normalization(old)
+
+def _permuted_constraints(n):
+    xs = [ claripy.BVS('permuted_%d' % i, 32, explicit_name=True) for i in range(4) ]
+    out = [ ]
+    for i in range(n):
+        a, b, c = xs[i % 4], xs[(i + 1) % 4], xs[(i + 2) % 4]
+        k = i % 8
+        # the same constraint, written with its operands in a different order every time
+        if i % 3 == 0:
+            out.append(claripy.And(a + b + c > k, (a ^ c) != k))
+        elif i % 3 == 1:
+            out.append(claripy.And((c ^ a) != k, c + (b + a) > k))
+        else:
+            out.append(claripy.And((a ^ c) != k, (b + c) + a > k))
+    return out
+
+def test_commutative_normalization_sharing():
+    """
+    Checks the sharing gained by normalizing commutative operations, on constraints that are built with their operands
+    in varying orders.
+    """
+    from claripy.ast.traversal import postorder
+    from claripy.operations import set_commutative_normalization
+
+    results = { }
+    for normalized in (False, True):
+        old = set_commutative_normalization(normalized)
+        old_size = claripy.simplifications.simpleton.set_cache_size(0)
+        try:
+            claripy.ast.reset_cache_stats()
+            constraints = _permuted_constraints(240)
+            stats = claripy.ast.cache_stats(by_op=False)
+            s = claripy.Solver()
+            for c in constraints:
+                s.add(c)
+            results[normalized] = {
+                'nodes': len({ id(a) for a in postorder(constraints) }),
+                'constraints': len(set(constraints)),
+                'solver_constraints': len(s.constraints),
+                'interior_hit_rate': stats['interior_hit_rate'],
+            }
+        finally:
+            claripy.simplifications.simpleton.set_cache_size(old_size)
+            set_commutative_normalization(old)
+
+    nose.tools.assert_less(results[True]['nodes'], results[False]['nodes'])
+    nose.tools.assert_less(results[True]['constraints'], results[False]['constraints'])
+    nose.tools.assert_less_equal(results[True]['solver_constraints'], results[False]['solver_constraints'])
+    nose.tools.assert_greater_equal(results[True]['interior_hit_rate'], results[False]['interior_hit_rate'])
+
 if __name__ == '__main__':
     test_lite_repr()
     test_associativity()
+    test_stable_hash()
+    test_hash_engines()
+    test_hash_collision_detection()
+    test_interned_variables()
+    test_compact_layout()
+    test_cache_stats()
+    test_keepalive()
+    test_fast_path_equivalence()
+    test_interned_constants()
+    test_precompiled_arg_fixing()
+    test_size_metrics()
+    test_threaded_hashcons()
+    test_threaded_keepalive()
+    test_commutative_normalization()
+    test_commutative_normalization_sharing()
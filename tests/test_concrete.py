@@ -1,3 +1,7 @@
+import subprocess
+import sys
+import threading
+
 import claripy
 import nose
 
@@ -26,6 +30,100 @@ def test_concrete_fp():
     f = claripy.FPV(1.0, claripy.FSORT_FLOAT)
     nose.tools.assert_equal(claripy.backends.concrete.eval(f, 2), (1.0,))
 
+def _unfolded_pool(n):
+    # the operations are built without eager evaluation, so that concrete subexpressions are not folded into BVVs and
+    # the backend has to convert (and cache) the interior nodes themselves
+    from claripy.ast.bv import BV
+    def op(name, *args):
+        return BV(name, args, length=32, eager_backends=None)
+
+    pool = [ ]
+    e = claripy.BVV(1, 32)
+    for i in range(n):
+        e = op('__xor__', op('__add__', op('__mul__', e, claripy.BVV(3, 32)), claripy.BVV(i, 32)), claripy.BVV(i << 8, 32))
+        pool.append(e)
+    return pool
+
+def test_shared_object_cache(n_threads=8):
+    bc = claripy.backends.concrete
+    pool = _unfolded_pool(200)
+    nose.tools.assert_true(all(p.depth > 1 for p in pool))
+    expected = [ bc.convert(p).value for p in pool ]
+
+    nose.tools.assert_equal(bc.set_shared_object_cache_size(4000), 0)
+    try:
+        # converting the deepest expression caches all of its interior nodes, which the others then hit
+        nose.tools.assert_equal(bc.convert(pool[-1]).value, expected[-1])
+        st = bc.shared_object_cache_stats()
+        nose.tools.assert_equal(st['hits'], 0)
+        misses = st['misses']
+        nose.tools.assert_equal(bc.convert_list(pool[:100])[99].value, expected[99])
+        st = bc.shared_object_cache_stats()
+        nose.tools.assert_equal((st['hits'], st['misses']), (100, misses))
+
+        bc.set_shared_object_cache_size(4000)
+        results = [ None ] * n_threads
+        def work(k):
+            results[k] = [ bc.convert(p).value for p in pool ]
+        threads = [ threading.Thread(target=work, args=(k,)) for k in range(n_threads) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for r in results:
+            nose.tools.assert_equal(r, expected)
+
+        # the threads converted the pool once between them
+        st = bc.shared_object_cache_stats()
+        nose.tools.assert_less_equal(st['entries'], 4000)
+        nose.tools.assert_greater(st['hits'], st['misses'])
+
+        # the cache is bounded
+        bc.set_shared_object_cache_size(64, shards=4)
+        nose.tools.assert_equal([ bc.convert(p).value for p in pool ], expected)
+        st = bc.shared_object_cache_stats()
+        nose.tools.assert_less_equal(st['entries'], 64)
+        nose.tools.assert_greater(st['evictions'], 0)
+    finally:
+        nose.tools.assert_equal(bc.set_shared_object_cache_size(0), 64)
+    nose.tools.assert_is_none(bc.shared_object_cache_stats())
+
+    # z3 objects belong to the contexts of their threads
+    nose.tools.assert_raises(claripy.BackendError, claripy.backends.z3.set_shared_object_cache_size, 1000)
+    nose.tools.assert_raises(ValueError, bc.set_shared_object_cache_size, 64, shards=3)
+
+_COLLISION_SCRIPT = """
+import claripy
+from claripy.ast.base import HashEngine, set_hash_engine
+from claripy.ast.bv import BV
+
+class ConstantHashEngine(HashEngine):
+    def hash(self, op, args, keywords):
+        return 1
+
+set_hash_engine(ConstantHashEngine())
+bc = claripy.backends.concrete
+bc.set_shared_object_cache_size(64)
+one, two = claripy.BVV(1, 32), claripy.BVV(2, 32)
+a = BV('__add__', (one, two), length=32, eager_backends=None)
+b = BV('__sub__', (one, two), length=32, eager_backends=None)
+assert a._hash == b._hash and a.cache_key != b.cache_key
+
+# ASTs whose hashes collide get their own objects, from the shared cache and from the per-thread ones
+assert bc.convert(a).value == 3
+assert bc.convert(b).value == 0xffffffff
+assert bc.convert(a).value == 3
+assert bc.shared_object_cache_stats()['entries'] == 4
+print('ok')
+"""
+
+def test_shared_object_cache_collisions():
+    # the hash engine can only be switched when no other ASTs are alive, so this runs in a fresh process
+    out = subprocess.check_output([sys.executable, '-c', _COLLISION_SCRIPT])
+    nose.tools.assert_equal(out.split(), [b'ok'])
+
 if __name__ == '__main__':
     test_concrete()
     test_concrete_fp()
+    test_shared_object_cache()
+    test_shared_object_cache_collisions()
@@ -1,6 +1,9 @@
 # pylint: disable= [no-self-use, missing-class-docstring]
 
+import gc
 import unittest
+import weakref
+
 import nose
 
 import claripy
@@ -392,6 +395,49 @@ class TestExpression(unittest.TestCase):
         assert frozenset.union(*[a.variables for a in y2.recursive_leaf_asts]) == two_names
         assert y1.canonicalize()[-1] is y2.canonicalize()[-1]
 
+    def test_canonical_cache(self):
+        x = claripy.BVS('x', 32)
+        y = claripy.BVS('y', 32)
+        e = (x + y) * x
+
+        var_map, counter, c = e.canonicalize()
+        # the cached form comes with the same variable map
+        var_map2, counter2, c2 = e.canonicalize()
+        assert c2 is c
+        assert var_map2 == var_map
+        assert next(counter2) == next(counter) == 2
+        assert c.canonicalize()[-1] is c
+
+        # the canonical hash only depends on the structure
+        a = claripy.BVS('a', 32)
+        b = claripy.BVS('b', 32)
+        assert ((a + b) * a).canonical_hash == e.canonical_hash
+        assert ((a + b) * b).canonical_hash != e.canonical_hash
+
+        # constraint sets are canonical up to renaming and the order of independent constraints
+        _, cs1, h1 = claripy.canonicalize_constraints([ x > 3, y == 2, x < 10 ])
+        _, cs2, h2 = claripy.canonicalize_constraints([ b == 2, a > 3, a < 10 ])
+        assert h1 == h2
+        assert all(c1 is c2 for c1, c2 in zip(cs1, cs2))
+        _, _, h3 = claripy.canonicalize_constraints([ b == 2, a > 3, b < 10 ])
+        assert h3 != h1
+
+        # cache hits map the original variables too
+        cs = [ x > 3, y == 2, x < 10 ]
+        var_map, cs3, h4 = claripy.canonicalize_constraints(cs)
+        assert set(var_map) == { x.cache_key, y.cache_key }
+        assert h4 == h1
+        var_map_hit, cs4, _ = claripy.canonicalize_constraints(list(cs))
+        assert cs4 is cs3 and var_map_hit == var_map
+
+        # the cache does not keep the constraints alive
+        c = claripy.BVS('z', 32) == 1
+        claripy.canonicalize_constraints([ c ])
+        ref = weakref.ref(c)
+        del c
+        gc.collect()
+        assert ref() is None
+
     def test_depth(self):
         x1 = claripy.BVS('x', 32)
         assert x1.depth == 1
@@ -0,0 +1,128 @@
+import logging
+import random
+
+import nose.tools
+
+import claripy
+from claripy.ast import known_bits
+
+l = logging.getLogger('claripy.test.known_bits')
+
+def test_facts():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+
+    nose.tools.assert_equal(known_bits.known_bits(x), (0, 0))
+    nose.tools.assert_equal(known_bits.known_bits(x & 0xf0), (0xffffff0f, 0))
+    nose.tools.assert_equal(known_bits.known_bits(x | 0x80000001), (0, 0x80000001))
+    nose.tools.assert_equal(known_bits.unsigned_range((x & 0xff) + (y & 0xff)), (0, 0x1fe))
+    nose.tools.assert_equal(known_bits.unsigned_range(claripy.ZeroExt(32, y)), (0, 0xffffffff))
+    nose.tools.assert_equal(known_bits.unsigned_range(claripy.LShR(x, 28)), (0, 0xf))
+    nose.tools.assert_equal(known_bits.unsigned_range(claripy.Concat(claripy.BVV(1, 8), x[7:0])), (0x100, 0x1ff))
+    nose.tools.assert_equal(known_bits.known_bits(x << 4)[0] & 0xf, 0xf)
+    nose.tools.assert_equal(known_bits.unsigned_range(claripy.If(x == 1, claripy.BVV(3, 32), claripy.BVV(5, 32))), (3, 5))
+    nose.tools.assert_equal(known_bits.known_bits(claripy.SignExt(32, x | 0x80000000))[1] >> 31, 0x1ffffffff)
+
+    # comparisons that follow from the facts of their arguments are simplified away...
+    assert ((x & 0xff) < 0x100) is claripy.true
+    assert (claripy.ZeroExt(32, y) >> 40 == 0) is claripy.true
+    assert ((x | 1) == 0) is claripy.false
+    assert claripy.SLT(claripy.ZeroExt(1, x[30:0]), 0) is claripy.false
+    # ... but not the ones that hold no matter what their arguments are, or that do not follow from them
+    assert (claripy.ZeroExt(32, y) >= 0).symbolic
+    assert (x < 5).symbolic
+    assert ((x & 0x1ff) < 0x100).symbolic
+
+    # the frontends decide symbolic queries from the facts too
+    known_bits.reset_stats()
+    assert claripy.Solver().is_true(claripy.ULT(x & 0xff, claripy.ZeroExt(24, y[7:0]) | 0x100))
+    assert claripy.Solver().is_false(claripy.ULT(claripy.ZeroExt(24, y[7:0]) | 0x100, x & 0xff))
+    c = claripy.BoolS('c')
+    nose.tools.assert_equal(claripy.Solver().eval(claripy.If(c, x & 0xf | 8, y & 0xf | 8) & 8, 2), (8,))
+    assert not claripy.Solver().is_true(x < y)
+    st = known_bits.stats.as_dict()
+    nose.tools.assert_equal(st['decided'], 3)
+    nose.tools.assert_greater_equal(st['queries'], 4)
+
+def test_esi():
+    # ESIs are BVVs without a value, so nothing is known about them
+    e = claripy.ESI(32)
+    nose.tools.assert_equal(known_bits.known_bits(e), (0, 0))
+    nose.tools.assert_equal(known_bits.unsigned_range(e), (0, 0xffffffff))
+    nose.tools.assert_equal((e == claripy.BVV(0, 32)).op, '__eq__')
+    nose.tools.assert_equal((e + 1 == 0).op, '__eq__')
+    assert not claripy.is_true(e == 1)
+
+def _random_expression(rng, leaves, depth):
+    if depth == 0 or rng.random() < 0.2:
+        if rng.random() < 0.3:
+            return claripy.BVV(rng.choice([ 0, 1, 0xff, 0x80, rng.getrandbits(16) ]), 16)
+        return rng.choice(leaves)
+    a = _random_expression(rng, leaves, depth - 1)
+    b = _random_expression(rng, leaves, depth - 1)
+    k = rng.randrange(16)
+    return rng.choice([
+        lambda: a & b, lambda: a | b, lambda: a ^ b, lambda: ~a, lambda: a + b, lambda: a - b, lambda: a * b,
+        lambda: a << k, lambda: claripy.LShR(a, k), lambda: a >> k, lambda: a // b, lambda: a % b,
+        lambda: claripy.ZeroExt(8, a)[15:0], lambda: claripy.SignExt(4, a)[19:4],
+        lambda: claripy.Concat(a[7:0], b[15:8]), lambda: claripy.If(a < b, a, b),
+    ])()
+
+def test_soundness(n=200, samples=8):
+    """
+    The facts of random expressions must hold for all the values of their variables that are tried.
+    """
+    rng = random.Random(21)
+    xs = [ claripy.BVS('kb_%d' % i, 16) for i in range(3) ]
+    for _ in range(n):
+        try:
+            e = _random_expression(rng, xs, 4)
+        except claripy.ClaripyZeroDivisionError:
+            continue
+        zeros, ones = known_bits.known_bits(e)
+        lo, hi = known_bits.unsigned_range(e)
+        for _ in range(samples):
+            model = { x.cache_key: claripy.BVV(rng.getrandbits(16), 16) for x in xs }
+            try:
+                v = claripy.backends.concrete.convert(e.replace_dict(model)).value
+            except claripy.ClaripyZeroDivisionError:
+                continue
+            assert v & zeros == 0 and v & ones == ones and lo <= v <= hi, (e, v, zeros, ones, lo, hi)
+
+def test_avoided_solver_calls(n=300):
+    """
+    Checks the solver calls that the facts avoid, on checks of the kind that lifters emit: bounds of masked and
+    extended values, and bits that are shifted out.
+    """
+    rng = random.Random(0)
+    s = claripy.Solver()
+    xs = [ claripy.BVS('kb_bench_%d' % i, 32) for i in range(8) ]
+    s.add(claripy.ULT(xs[0], 0x1000))
+
+    known_bits.reset_stats()
+    avoided = solver_calls = 0
+    for i in range(n):
+        x, y = xs[i % len(xs)], xs[(i + 1) % len(xs)]
+        k = rng.randrange(1, 24)
+        checks = (
+            lambda: claripy.ULT(x & ((1 << k) - 1), rng.randrange(1 << k, 1 << 32)),
+            lambda: claripy.ULE(claripy.LShR(x, k), claripy.ZeroExt(k, y[31:k]) | (1 << (32 - k))),
+            lambda: claripy.Extract(31, 31 - k, x << (32 - k)) == 0,
+            lambda: x + i == 7,
+        )
+        for check in checks:
+            before = known_bits.stats.simplified + known_bits.stats.decided
+            s.is_true(check())
+            if known_bits.stats.simplified + known_bits.stats.decided > before:
+                avoided += 1
+            else:
+                solver_calls += 1
+
+    nose.tools.assert_equal(avoided, 2 * n)
+    nose.tools.assert_equal(solver_calls, 2 * n)
+
+if __name__ == '__main__':
+    test_facts()
+    test_soundness()
+    test_esi()
+    test_avoided_solver_calls()
@@ -74,8 +74,43 @@ def test_branching_replacement_solver():
     #s1b.add(x == 0)
     #assert s1a.satisfiable()
     #assert not s1b.satisfiable()
+def test_replace_dict_many():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    z = claripy.BVS('z', 32)
+
+    shared = (x + y) * 3
+    asts = [ shared + 1, shared - x, shared, y, 5 ]
+    replacements = { x.cache_key: z }
+
+    results = claripy.replace_dict_many(asts, replacements)
+    for old, new in zip(asts, results):
+        if isinstance(old, claripy.ast.Base):
+            assert new is old.replace(x, z)
+        else:
+            assert new == old
+    # the call-scoped memo does not leak into the replacements
+    assert len(replacements) == 1
+
+    # leaf operations, as used by the model cache
+    results = claripy.replace_dict_many(asts[:2], { }, leaf_operation=lambda a: claripy.BVV(2, 32) if a.op == 'BVS' else a)
+    assert [ r.args[0] for r in results ] == [ 13, 10 ]
+
+    var_map, _, (a, b) = claripy.canonicalize_many([ shared + 1, z + y ])
+    assert len(var_map) == 3
+    assert a.variables | b.variables == { 'canonical_0', 'canonical_1', 'canonical_2' }
+
+def test_replacement_solver_lists():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    sr = claripy.SolverReplacement(claripy.Solver(), replace_constraints=True)
+    sr.add(x == 10)
+
+    assert sr.batch_eval([ x + y, (x + y) * 2, x ], 1, extra_constraints=[ y == 1 ]) == [ (11, 22, 10) ]
 
 if __name__ == '__main__':
     test_branching_replacement_solver()
     test_replacement_solver()
     test_contradiction()
+    test_replace_dict_many()
+    test_replacement_solver_lists()
@@ -34,6 +34,30 @@ def test_pickle_frontend():
     s = pickle.loads(ss)
     assert s.eval(x, 10), (1,)
 
+def test_old_frontend_state():
+    # frontends pickled before the simplification method was part of their state still load
+    f = claripy.frontends.FullFrontend(claripy.backends.z3)
+    x = claripy.BVS('x', 32)
+    f.add([ x == 1 ])
+    backend_name, timeout, track, (constraints, variables, finalized, _, base_state) = f.__getstate__()
+
+    old = claripy.frontends.FullFrontend.__new__(claripy.frontends.FullFrontend)
+    old.__setstate__((backend_name, timeout, track, (constraints, variables, finalized, base_state)))
+    assert old.constraints[0] is constraints[0] and old._simplify_method is None
+    assert old.eval(x, 2) == (1,)
+
+def test_old_solver_state():
+    # solvers pickled before outlining was part of their state still load
+    s = claripy.Solver()
+    x = claripy.BVS('x', 32)
+    s.add(x == 1)
+    _, _, base_state = s.__getstate__()
+
+    old = claripy.Solver.__new__(claripy.Solver)
+    old.__setstate__(base_state)
+    assert old._outline_depth is None and not old._definitions
+    assert old.eval(x, 2) == (1,)
+
 def test_identity():
     l.info("Running test_identity")
 
@@ -74,4 +98,6 @@ def test_identity():
 if __name__ == '__main__':
     test_pickle_ast()
     test_pickle_frontend()
+    test_old_frontend_state()
+    test_old_solver_state()
     test_identity()
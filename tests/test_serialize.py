@@ -0,0 +1,150 @@
+import os
+import logging
+import pickle
+import tempfile
+
+import nose.tools
+
+import claripy
+from claripy import serialize
+
+l = logging.getLogger('claripy.test.serialize')
+
+
+class EqAnnotation(claripy.Annotation):
+    def __init__(self, n):
+        self.n = n
+
+    @property
+    def eliminatable(self):
+        return False
+
+    @property
+    def relocatable(self):
+        return True
+
+    def __eq__(self, other):
+        return type(other) is EqAnnotation and self.n == other.n
+
+    def __hash__(self):
+        return hash(('EqAnnotation', self.n))
+
+def _shared_dag(depth):
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    e = x
+    for i in range(depth):
+        e = claripy.If(e[0:0] == 0, e + y, e - i)
+    return e
+
+def test_roundtrip():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    s = claripy.StringS('s', 5)
+    f = claripy.FPS('f', claripy.FSORT_DOUBLE)
+    asts = [
+        claripy.If(x > y, x + 1, y * 3),
+        x[3:0].concat(y[31:28]).sign_extend(8),
+        claripy.BVV(-1, 64) - x.zero_extend(32),
+        f + claripy.FPV(-0.0, claripy.FSORT_DOUBLE),
+        claripy.StrConcat(s, claripy.StringV("ab")),
+        claripy.And(x == 3, claripy.Or(claripy.true, y != x)),
+        claripy.BVV(12345678901234567890, 128),
+    ]
+
+    r = serialize.loads(serialize.dumps(asts))
+    nose.tools.assert_equal(len(r), len(asts))
+    for a, b in zip(r, asts):
+        nose.tools.assert_is(a, b)
+    nose.tools.assert_equal(r[4].string_length, 7)
+
+    # a single AST comes back as a one-element list
+    nose.tools.assert_equal(serialize.loads(serialize.dumps(asts[0])), [ asts[0] ])
+
+def test_shared_dag():
+    e = _shared_dag(60)
+    data = serialize.dumps(e)
+    # each distinct node is written once, despite the 2**60 paths through the AST
+    nose.tools.assert_less(len(data), 60 * 100)
+    nose.tools.assert_is(serialize.loads(data)[0], e)
+
+def test_annotations():
+    x = claripy.BVS('x', 32).annotate(EqAnnotation(1))
+    e = (x + 1).annotate(EqAnnotation(2))
+    r, = serialize.loads(serialize.dumps(e))
+    nose.tools.assert_is(r, e)
+    nose.tools.assert_equal(r.annotations, (EqAnnotation(1), EqAnnotation(2)))
+
+    # annotations that were removed from a node are not brought back from its children
+    stripped = e.remove_annotations({ EqAnnotation(1) })
+    r, = serialize.loads(serialize.dumps(stripped))
+    nose.tools.assert_equal(r.annotations, stripped.annotations)
+
+def test_stream():
+    x = claripy.BVS('x', 32)
+    asts = [ x + i for i in range(10) ]
+
+    with tempfile.TemporaryFile() as f:
+        s = serialize.Serializer(f)
+        for a in asts:
+            s.write(a)
+        s.write(asts[0], asts[1] * 2)
+        s.flush()
+
+        f.seek(0)
+        r = list(serialize.Deserializer(f))
+    nose.tools.assert_equal(len(r), 12)
+    for a, b in zip(r, asts + [ asts[0], asts[1] * 2 ]):
+        nose.tools.assert_is(a, b)
+
+def test_store():
+    x = claripy.BVS('x', 32).annotate(EqAnnotation(1))
+    y = claripy.BVS('y', 32)
+    asts = [ x + y, (x + y) * 2, claripy.StringS('s', 3), _shared_dag(30) ]
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'store')
+        serialize.write_store(path, asts)
+
+        with serialize.ASTStore(path) as store:
+            nose.tools.assert_equal(len(store), len(asts))
+            # opening the store decodes none of its tables
+            nose.tools.assert_equal(len(store._decoder.classes._cache), 0)
+            nose.tools.assert_equal(len(store._decoder.strings._cache), 0)
+            # only the nodes of the requested AST are materialized
+            nose.tools.assert_is(store[1], asts[1])
+            nose.tools.assert_equal(len(store._memo), 5)
+            for a, b in zip(store, asts):
+                nose.tools.assert_is(a, b)
+            nose.tools.assert_equal(store[2].string_length, 3)
+
+        garbage = os.path.join(d, 'garbage')
+        with open(garbage, 'wb') as f:
+            f.write(serialize.dumps(y))
+        nose.tools.assert_raises(claripy.ClaripySerializationError, serialize.ASTStore, garbage)
+
+def test_errors():
+    nose.tools.assert_raises(claripy.ClaripySerializationError, serialize.loads, b'garbage')
+    data = serialize.dumps(claripy.BVS('x', 32) + 1)
+    nose.tools.assert_raises(claripy.ClaripySerializationError, serialize.loads, data[:-3])
+
+def test_smaller_than_pickle():
+    xs = [ claripy.BVS('x%d' % i, 32) for i in range(8) ]
+    asts = [ ]
+    for i in range(200):
+        e = xs[i % 8]
+        for j in range(10):
+            e = claripy.If(e > i + j, e + xs[(i + j) % 8], e * j)
+        asts.append(e)
+
+    nose.tools.assert_less(len(serialize.dumps(asts)), len(pickle.dumps(asts)))
+
+
+if __name__ == '__main__':
+    test_roundtrip()
+    test_shared_dag()
+    test_annotations()
+    test_stream()
+    test_store()
+    test_errors()
+    test_smaller_than_pickle()
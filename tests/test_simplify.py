@@ -1,6 +1,10 @@
+import logging
+
 import claripy
 import nose
 
+l = logging.getLogger('claripy.test.simplify')
+
 def test_bool_simplification():
     def assert_correct(a, b):
         nose.tools.assert_true(claripy.backends.z3.identical(claripy.simplify(a), b))
@@ -236,6 +240,308 @@ def test_zeroext_extract_comparing_against_constant_simplifier():
     expr = claripy.Extract(31, 8, claripy.Concat(claripy.BVV(0, 24), dd)) == claripy.BVV(0xffff, 24)
     assert expr is not (dd == claripy.BVV(0xffff, 23))
 
+def test_simplification_cache():
+    from claripy.simplifications import SimplificationManager
+    sm = SimplificationManager(cache_size=2)
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    concat = claripy.Concat(x, y)
+
+    # a simplification, and a cached negative result
+    assert sm.simplify('Extract', (31, 0, concat)) is y
+    assert sm.simplify('__eq__', (x, y)) is None
+    assert sm.cache_stats()['misses'] == 2
+    assert sm.simplify('Extract', (31, 0, concat)) is y
+    assert sm.simplify('__eq__', (x, y)) is None
+    stats = sm.cache_stats()
+    assert stats['hits'] == 2 and stats['entries'] == 2 and stats['hit_rate'] == 0.5
+
+    # ops without simplifiers are not cached
+    assert sm.simplify('__floordiv__', (x, y)) is None
+    assert sm.cache_stats()['entries'] == 2
+
+    # the least recently used result is evicted
+    assert sm.simplify('Extract', (63, 32, concat)) is x
+    stats = sm.cache_stats()
+    assert stats['evictions'] == 1 and stats['entries'] == 2
+    assert sm.simplify('__eq__', (x, y)) is None
+    assert sm.cache_stats()['hits'] == 3
+    assert sm.simplify('Extract', (31, 0, concat)) is y
+    assert sm.cache_stats()['misses'] == 4
+
+    sm.clear_cache()
+    assert sm.cache_stats()['entries'] == 0 and sm.cache_stats()['hits'] == 0
+
+    # the cache does not change what the operations build
+    e = claripy.Concat(x[15:0], y[31:16])[23:8].zero_extend(16) == (x & 0xff)
+    old = claripy.simplifications.simpleton.set_cache_size(0)
+    try:
+        uncached = claripy.Concat(x[15:0], y[31:16])[23:8].zero_extend(16) == (x & 0xff)
+    finally:
+        claripy.simplifications.simpleton.set_cache_size(old)
+    assert e is uncached
+
+def test_simplification_cache_keys():
+    import threading
+    from claripy.simplifications import SimplificationManager
+    sm = SimplificationManager(cache_size=8)
+    x = claripy.BVS('x', 32)
+
+    # equal non-AST arguments of different types are different operations
+    sm._simplifiers['test_typed'] = lambda v, e: e if type(v) is int else None
+    assert sm.simplify('test_typed', (1, x)) is x
+    assert sm.simplify('test_typed', (True, x)) is None
+    assert sm.simplify('test_typed', (1.0, x)) is None
+    assert sm.simplify('test_typed', (1, x)) is x
+
+    # a "simplification" into the operation itself is left to hash-consing
+    one = claripy.BVV(1, 32)
+    e = x + one
+    assert sm.simplify('__add__', (x, one)) is e
+    assert sm.simplify('__add__', (x, one)) is None
+
+    # concurrent lookups neither corrupt the cache nor lose counts
+    sm.clear_cache()
+    threads, n = 4, 300
+    def work():
+        for i in range(n):
+            sm.simplify('Extract', (i % 16 + 15, i % 16, claripy.Concat(x, x)))
+    workers = [ threading.Thread(target=work) for _ in range(threads) ]
+    for w in workers: w.start()
+    for w in workers: w.join()
+    stats = sm.cache_stats()
+    assert stats['hits'] + stats['misses'] == threads * n
+    assert stats['entries'] <= 8
+
+def test_rewrite_rules():
+    from claripy.rewrite_rules import ANY, P, RuleSet, V
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+
+    rules = RuleSet()
+    rules.add(P('__sub__', V('a'), V('a')), lambda a: claripy.BVV(0, a.size()), name='x - x ==> 0')
+    rules.add(P('__add__', P('__neg__', V('a')), V('b')), lambda a, b: b - a)
+    rules.add(P('Extract', 7, 0, P('ZeroExt', V('n'), V('v'), name='e')), lambda n, v, e: v[7:0],
+              guard=lambda n, v, e: v.size() >= 8)
+    rules.add(P('__add__', ANY, ANY), lambda: None)
+
+    # variables that occur twice only match the same argument
+    assert rules.rewrite('__sub__', (x, x)) is claripy.BVV(0, 32)
+    assert rules.rewrite('__sub__', (x, y)) is None
+
+    assert rules.rewrite('__add__', (-x, y)) is y - x
+    assert rules.rewrite('__add__', (x, y)) is None
+    assert [ r.index for r in rules.candidates('__add__', (-x, y)) ] == [ 1, 3 ]
+    assert [ r.index for r in rules.candidates('__add__', (x, y)) ] == [ 3 ]
+
+    # raw values and guards
+    z = claripy.BVS('z', 16)
+    assert rules.rewrite('Extract', (7, 0, z.zero_extend(16))) is z[7:0]
+    assert rules.rewrite('Extract', (8, 1, z.zero_extend(16))) is None
+    assert not rules.candidates('Extract', (15, 0, z.zero_extend(16)))
+    assert rules.rewrite('__mul__', (x, y)) is None
+    assert rules.handles('Extract') and not rules.handles('__mul__')
+
+    # domain rules run before the simplifier functions
+    sm = claripy.simplifications.SimplificationManager()
+    nose.tools.assert_is(sm.simplify('__sub__', (x, claripy.BVV(0, 32))), x)
+    sm.add_rule(P('__sub__', V('a'), P('BVV', 0, ANY)), lambda a: a + 1)
+    nose.tools.assert_is(sm.simplify('__sub__', (x, claripy.BVV(0, 32))), x + 1)
+
+def test_simplifier_profile():
+    import csv
+    sm = claripy.simplifications.simpleton
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+
+    from claripy.ast.base import _side_table
+    import threading
+
+    old = sm.set_cache_size(0)
+    try:
+        with sm.profile() as prof:
+            side_table_size = len(_side_table)
+            claripy.Not(claripy.SLT(x, y))
+            claripy.Concat(x, y)[31:0]
+            x[31:0]
+            # measuring the sizes does not cache them on the ASTs
+            assert len(_side_table) == side_table_size
+            # nor is anything collected from other threads
+            t = threading.Thread(target=lambda: x[15:0] == y[15:0])
+            t.start()
+            t.join()
+        # or outside of the block
+        x[15:0] == y[15:0]
+    finally:
+        sm.set_cache_size(old)
+
+    stats = prof.as_dict()
+    not_rule = stats['Not(SLT(a, b))']
+    assert not_rule['calls'] == 1 and not_rule['successes'] == 1 and not_rule['time'] >= 0
+    assert not_rule['size_before'] == 4 and not_rule['size_after'] == 3 and not_rule['size_reduction'] == 1
+    whole = stats['extracting the whole value']
+    assert whole['calls'] == 2 and whole['successes'] == 1
+    assert stats['extract_simplifier']['successes'] == 1
+    assert stats['extract_simplifier']['size_reduction'] == 3
+    assert 'eq_simplifier' not in prof
+
+    rows = list(csv.DictReader(prof.to_csv().splitlines()))
+    assert { r['simplifier'] for r in rows } == set(stats)
+    assert all(int(r['calls']) >= int(r['successes']) for r in rows)
+
+
+def _random_linear(rng, xs, depth):
+    if depth == 0 or rng.random() < 0.15:
+        return rng.choice(xs) if rng.random() < 0.8 else claripy.BVV(rng.getrandbits(32), 32)
+    a = _random_linear(rng, xs, depth - 1)
+    b = _random_linear(rng, xs, depth - 1)
+    k = rng.choice([ 1, 2, 4, 8, 0xffffffff, rng.getrandbits(32) ])
+    return rng.choice([
+        lambda: a + b, lambda: a - b, lambda: -a, lambda: a * k, lambda: a << rng.randrange(4), lambda: a & b,
+    ])()
+
+def test_linear_normalization():
+    sm = claripy.simplifications.simpleton
+    rsp = claripy.BVS('rsp', 64)
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+
+    old = sm.set_linear_normalization(True)
+    try:
+        assert (rsp - 8) + 16 - 8 is rsp
+        assert x * 4 + x * 4 is x * 8
+        assert (x << 2) + x is x * 5
+        assert (x + y) - (y + x) is claripy.BVV(0, 32)
+        nose.tools.assert_equal((rsp - 8).op, '__sub__')
+        nose.tools.assert_equal((3 - x).op, '__sub__')
+        nose.tools.assert_equal((x * y + 1).op, '__add__')
+
+        # address aliasing is decided without a solver
+        assert ((rsp - 8) == (rsp + 8)) is claripy.false
+        assert ((rsp - 0x10) + 8 != rsp - 8) is claripy.false
+        assert ((x * 4 + x * 4) == x * 8) is claripy.true
+        assert (x == y).symbolic
+    finally:
+        sm.set_linear_normalization(old)
+    assert (x * 4 + x * 4).op == '__add__'
+
+    # the normalized expressions are equivalent to the original ones
+    import random
+    rng = random.Random(22)
+    xs = [ claripy.BVS('lin_%d' % i, 32) for i in range(3) ]
+    for _ in range(60):
+        state = rng.getstate()
+        e = _random_linear(rng, xs, 3)
+        rng.setstate(state)
+        old = sm.set_linear_normalization(True)
+        try:
+            n = _random_linear(rng, xs, 3)
+        finally:
+            sm.set_linear_normalization(old)
+        assert not claripy.Solver().satisfiable(extra_constraints=(e != n,)), (e, n)
+
+def test_linear_normalization_pointers(n=200):
+    """
+    Checks that pointer arithmetic built with linear normalization is smaller than without it, and that more of the
+    aliasing checks between the pointers are decided without a solver.
+    """
+    import random
+    sm = claripy.simplifications.simpleton
+    rsp = claripy.BVS('rsp', 64)
+    idx = claripy.BVS('idx', 64)
+
+    results = { }
+    for normalized in (False, True):
+        rng = random.Random(0)
+        old = sm.set_linear_normalization(normalized)
+        try:
+            pointers = [ ]
+            sp = rsp
+            for i in range(n):
+                # pushes, pops and stack adjustments, and array accesses off the stack pointer
+                k = rng.choice([ 8, 0x10, 0x20 ])
+                sp = sp - k if rng.random() < 0.5 else sp + k
+                pointers.append((sp + idx * 4) + (idx * 4 + rng.randrange(4) * 8) if i % 4 == 0 else sp)
+            checks = [ pointers[i] == pointers[j] for i, j in zip(range(0, n, 2), range(1, n, 2)) ]
+        finally:
+            sm.set_linear_normalization(old)
+        results[normalized] = {
+            'size': sum(p.tree_size for p in pointers),
+            'decided': sum(not c.symbolic for c in checks),
+            'checks': len(checks),
+        }
+
+    nose.tools.assert_less(results[True]['size'], results[False]['size'])
+    nose.tools.assert_greater(results[True]['decided'], results[False]['decided'])
+
+def _lifted_constraints(n, seed=0):
+    """
+    Constraints like the ones that symbolic execution of a small interpreter loop produces, after some of the inputs
+    were concretized with replace_dict().
+    """
+    import random
+    rng = random.Random(seed)
+    regs = [ claripy.BVS('fix_r%d' % i, 32) for i in range(6) ]
+    inputs = list(regs)
+    constraints = [ ]
+    for i in range(n):
+        a, b = rng.sample(range(len(regs)), 2)
+        k = rng.getrandbits(8)
+        regs[a] = rng.choice([
+            lambda: regs[a] + regs[b] * 4,
+            lambda: claripy.If(regs[b] == k, regs[a] ^ k, regs[a] - 1),
+            lambda: claripy.ZeroExt(24, claripy.Extract(7, 0, regs[a] | regs[b])),
+            lambda: claripy.Concat(regs[a][15:0], regs[b][31:16]),
+            lambda: (regs[a] & 0xff) << 8,
+        ])()
+        constraints.append(claripy.ULT(regs[a], regs[b] + k) if i % 2 else regs[a] != k)
+    concrete = { r.cache_key: claripy.BVV(rng.getrandbits(32), 32) for r in inputs[:3] }
+    return [ c.replace_dict(concrete) for c in constraints ]
+
+def test_fixpoint_simplification():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    e = claripy.If(x == 3, (x + 1) * (y + 2), y ^ x).replace_dict({ x.cache_key: claripy.BVV(3, 32) })
+    nose.tools.assert_equal(e.op, 'If')
+    r = claripy.simplify(e, method='rules')
+    nose.tools.assert_equal(r.op, '__mul__')
+    assert claripy.simplify(e, method='rules', max_nodes=0) is e
+    assert claripy.simplify(e, method='rules', timeout=0) is e
+    nose.tools.assert_raises(claripy.ClaripyValueError, claripy.simplify, e, method='magic')
+    nose.tools.assert_raises(claripy.ClaripyValueError, claripy.simplify, x, method='magic')
+
+    # the simplified constraints are equivalent to the original ones
+    constraints = _lifted_constraints(60)
+    simplified = claripy.simplifications.simpleton.fixpoint(constraints)
+    nose.tools.assert_less_equal(sum(c.dag_size for c in simplified), sum(c.dag_size for c in constraints))
+    s = claripy.Solver()
+    for c, sc in zip(constraints, simplified):
+        assert not s.satisfiable(extra_constraints=(c != sc,)), (c, sc)
+
+    # frontends can be told to use it
+    s = claripy.Solver(simplify_method='rules')
+    s.add(e == 8)
+    s.simplify()
+    nose.tools.assert_equal(s.constraints[0].args[0].op, '__mul__')
+    nose.tools.assert_equal(s.branch()._simplify_method, 'rules')
+    nose.tools.assert_equal(set(s.eval(y, 5)), { 0, 0x40000000, 0x80000000, 0xc0000000 })
+
+    # ... including composite and hybrid solvers, whose children and inner frontends do the simplification
+    s = claripy.SolverComposite(simplify_method='rules')
+    s.add(e == 8)
+    s.add(x == 1)
+    nose.tools.assert_equal([ c._simplify_method for c in s._solver_list ], [ 'rules', 'rules' ])
+    s.simplify()
+    assert any(c.op == '__eq__' and c.args[0].op == '__mul__' for c in s.constraints)
+    s = claripy.SolverHybrid(simplify_method='rules')
+    nose.tools.assert_equal(s._exact_frontend._simplify_method, 'rules')
+    nose.tools.assert_equal(s._approximate_frontend._simplify_method, 'rules')
+    nose.tools.assert_equal(s._approximate_frontend._actual_frontend._simplify_method, 'rules')
+    s.add(e == 8)
+    s.simplify()
+    nose.tools.assert_equal(s._exact_frontend.constraints[0].args[0].op, '__mul__')
 
 def perf():
     import timeit  # pylint:disable=import-outside-toplevel
@@ -257,3 +563,9 @@ if __name__ == '__main__':
     test_mask_eq_constant()
     test_and_mask_comparing_against_constant_simplifier()
     test_zeroext_extract_comparing_against_constant_simplifier()
+    test_simplification_cache()
+    test_rewrite_rules()
+    test_simplifier_profile()
+    test_linear_normalization()
+    test_linear_normalization_pointers()
+    test_fixpoint_simplification()
@@ -4,9 +4,32 @@ import unittest
 import logging
 import nose
 import claripy
+from claripy.backends import BackendZ3
 
 l = logging.getLogger('claripy.test.solver')
 
+class CountingZ3(BackendZ3):
+    """
+    A Z3 backend that does not cache converted objects (like BackendZ3Parallel), and counts the operations that it
+    converts.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._cache_objects = False
+        self.calls = 0
+
+    def _call(self, op, args):
+        self.calls += 1
+        return super()._call(op, args)
+
+def _shared_constraints(n):
+    x = claripy.BVS('x', 32)
+    base = x
+    for i in range(20):
+        base = (base * 7 + i) ^ (base >> 3)
+    return [ (base + i)[7:0] != i for i in range(n) ]
+
 class TestSolver(unittest.TestCase):
     def test_solver(self):
         self.raw_solver(claripy.Solver, True)
@@ -640,6 +663,23 @@ class TestSolver(unittest.TestCase):
         s.add(denum == 3)
         assert not s.satisfiable()
 
+    def test_model_cache_replacements(self):
+        from claripy.frontend_mixins.model_cache_mixin import ModelCache
+        x = claripy.BVS('x', 32)
+        y = claripy.BVS('y', 32)
+        shared = x + y
+        m = ModelCache({ next(iter(x.variables)): 1, next(iter(y.variables)): 2 })
+
+        # rewritten subexpressions are remembered across calls
+        assert m.eval_list([ shared * 3 ]) == (9,)
+        assert shared.cache_key in m.replacements
+        assert m.eval_list([ shared ]) == (3,)
+
+        # evaluation stops at the first constraint that is not satisfied
+        unseen = shared * 5 == 15
+        assert not m.eval_constraints([ shared == 4, unseen ])
+        assert unseen.cache_key not in m.replacements
+
     def test_composite_solver_branching_optimizations(self):
         s = claripy.SolverComposite()
         w = claripy.BVS("w", 32)
@@ -683,5 +723,122 @@ class TestSolver(unittest.TestCase):
         s.add(x <= 19)
         assert s.max(x) == 19
 
+    def test_outlining(self):
+        x = claripy.BVS('x', 32)
+        e = x
+        for i in range(1000):
+            e = (e ^ i) + x
+        expected = claripy.Solver().eval(e.replace(x, claripy.BVV(7, 32)), 1)[0]
+
+        for solver_type in (claripy.Solver, claripy.SolverComposite):
+            s = solver_type(outline_depth=32)
+            s.add(x == 7)
+            s.add(e[7:0] == expected & 0xff)
+            assert all(c.depth <= 34 for c in s.constraints)
+            assert s.satisfiable()
+            assert s.eval(e, 2) == (expected,)
+            assert s.solution(e + 1, expected + 1)
+            assert s.eval(e == expected, 2) == (True,)
+            assert not s.satisfiable(extra_constraints=(e != expected,))
+
+            # branches share the definitions of outlined subexpressions
+            n = len(s.constraints)
+            b = s.branch()
+            b.add(e[15:8] == (expected >> 8) & 0xff)
+            assert len(b.constraints) == n + 1
+            assert b.satisfiable()
+
+    def test_outlining_queries(self):
+        # queries do not change the constraints or variables of the solver
+        x = claripy.BVS('x', 32)
+        e = x
+        for i in range(50):
+            e = (e ^ i) + x
+        expected = claripy.Solver().eval(e.replace(x, claripy.BVV(7, 32)), 1)[0]
+
+        for solver_type in (claripy.Solver, claripy.SolverComposite):
+            s = solver_type(outline_depth=8)
+            assert s.satisfiable(extra_constraints=(e == 5,))
+            assert len(s.eval(e, 2)) == 2
+            assert s.max(e + 1, extra_constraints=(x == 7,)) == (expected + 1) & 0xffffffff
+            assert s.solution(e, expected, extra_constraints=(x == 7,))
+            assert not s.constraints and not s.variables
+
+            # the definitions of the outlined variables are added with the constraint, and only the query's own
+            # definitions are passed with a query
+            s.add(e[7:0] == expected & 0xff)
+            n = len(s.constraints)
+            assert n > 1
+            assert s._outline_query((), ()) == ((), ())
+            assert s.variables == set(x.variables)
+            assert not s.satisfiable(extra_constraints=(x == 7, e != expected))
+            assert s.eval(e, 2, extra_constraints=(x == 7,)) == (expected,)
+            assert len(s.constraints) == n and s.variables == set(x.variables)
+
+    def test_outlining_copies(self):
+        x = claripy.BVS('x', 32)
+        e = x
+        for i in range(50):
+            e = (e ^ i) + x
+        expected = claripy.Solver().eval(e.replace(x, claripy.BVV(7, 32)), 1)[0]
+
+        for solver_type in (claripy.Solver, claripy.SolverComposite):
+            s = solver_type(outline_depth=8)
+            s.add(x == 7)
+            s.add(e == expected + 1)
+            assert not s.satisfiable()
+
+            # copies, combinations and merges keep the definitions of the outlined variables
+            c = s.blank_copy()
+            c.add(s.constraints)
+            assert not c.satisfiable()
+            assert not s.combine([ solver_type() ]).satisfiable()
+            assert not solver_type().combine([ s ]).satisfiable()
+            cond = claripy.BoolS('cond')
+            _, m = s.merge([ solver_type(outline_depth=8) ], [ cond, claripy.Not(cond) ])
+            assert m._definitions == s._definitions
+            if solver_type is claripy.Solver:
+                assert not m.satisfiable(extra_constraints=(cond,))
+            else:
+                # the outlined constraints stay with the variables that they depend on
+                assert len(s._solver_list) == 1
+
+    def test_convert_list(self):
+        b = CountingZ3()
+        cs = _shared_constraints(10)
+        expected = [ b.convert(c) for c in cs ]
+        separate = b.calls
+
+        b.calls = 0
+        converted = b.convert_list(cs)
+        assert [ c.eq(e) for c, e in zip(converted, expected) ] == [ True ] * len(cs)
+        # the subexpressions that the constraints share are converted once
+        assert b.calls * 5 < separate
+
+        # numbers are left as they are
+        converted = b.convert_list([ 1, cs[0], 2.5 ])
+        assert converted[0] == 1 and converted[1].eq(expected[0]) and converted[2] == 2.5
+        assert b.convert_list([ ]) == [ ]
+
+        # a failed conversion fails the whole batch, and marks the AST that could not be converted
+        bc = claripy.backends.concrete
+        bad = cs[0] & cs[1]
+        self.assertRaises(claripy.BackendError, bc.convert_list, [ claripy.BVV(1, 32) == 1, bad ])
+        assert bad._flags & bc._errored_flag
+
+        # the concrete backend converts constants like convert() does, and batches the rest
+        v = claripy.BVV(5, 32)
+        unfolded = claripy.ast.bv.BV('__add__', (v, claripy.BVV(1, 32)), length=32, eager_backends=None)
+        converted = bc.convert_list([ v, claripy.true, 3, unfolded ])
+        assert converted[0] is bc.convert(v) and converted[1] is True and converted[2] == 3
+        assert converted[3] == 6
+
+        # solvers add their constraints in one batch
+        x = claripy.BVS('x', 32)
+        shared = (x * 7 + 1) ^ (x >> 3)
+        s = claripy.Solver()
+        s.add([ shared != i for i in range(3) ])
+        assert s.satisfiable()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,121 @@
+import logging
+import time
+
+import nose.tools
+
+import claripy
+from claripy.ast import traversal
+
+l = logging.getLogger('claripy.test.traversal')
+
+
+def _shared_dag(depth):
+    """
+    Builds an AST with 2**depth paths from the root to its leaves, but only O(depth) distinct nodes.
+    """
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    e = x
+    for i in range(depth):
+        e = claripy.If(e[0:0] == 0, e + y, e - i)
+    return x, y, e
+
+def test_orders():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    a = x + y
+    e = a * a - x
+
+    post = list(traversal.postorder(e))
+    nose.tools.assert_equal(len(post), len({ id(n) for n in post }))
+    nose.tools.assert_is(post[-1], e)
+    position = { id(n): i for i, n in enumerate(post) }
+    for i, n in enumerate(post):
+        for c in n.args:
+            if isinstance(c, claripy.ast.Base):
+                nose.tools.assert_less(position[id(c)], i)
+
+    pre = list(traversal.preorder(e))
+    nose.tools.assert_is(pre[0], e)
+    nose.tools.assert_equal({ id(n) for n in pre }, { id(n) for n in post })
+
+    nose.tools.assert_equal(set(n.cache_key for n in traversal.leaves(e)), { x.cache_key, y.cache_key })
+
+    # variable-set cutoff
+    z = claripy.BVS('z', 32)
+    f = (x + 1) * (y + z)
+    nose.tools.assert_equal(set(n.cache_key for n in traversal.postorder(f, variables=z.variables)),
+                            { f.cache_key, (y + z).cache_key, z.cache_key })
+
+def test_shared_dag():
+    x, y, e = _shared_dag(60)
+    z = claripy.BVS('z', 32)
+
+    # each of these would walk 2**60 paths if it did not account for sharing
+    nose.tools.assert_less(len(list(traversal.postorder(e))), 60 * 10)
+    nose.tools.assert_equal(set(n.cache_key for n in e.leaf_asts()) - { x.cache_key, y.cache_key },
+                            { n.cache_key for n in e.leaf_asts() if n.op == 'BVV' })
+    nose.tools.assert_true(e.structurally_match(e))
+
+    r = e.replace(y, z)
+    nose.tools.assert_equal(r.variables, x.variables | z.variables)
+    nose.tools.assert_is(r.replace(z, y), e)
+
+def test_replacement_keys_and_leaf_order():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+
+    # replacements keyed by cache keys that were built directly
+    nose.tools.assert_is((x + 1).replace_dict({ claripy.ast.base.ASTCacheKey(x): y }), y + 1)
+
+    # leaf_asts() goes from the last argument to the first, which also decides the canonical names
+    nose.tools.assert_equal([ a.cache_key for a in (x * 2 + y).leaf_asts() ],
+                            [ y.cache_key, claripy.BVV(2, 32).cache_key, x.cache_key ])
+    var_map, _, _ = (x * 2 + y).canonicalize()
+    nose.tools.assert_equal(var_map[y.cache_key].args[0], 'canonical_0')
+    nose.tools.assert_equal(var_map[x.cache_key].args[0], 'canonical_1')
+
+def test_rewriter():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    e = (x + y) * (x + y) + 3
+
+    # turn every addition into a subtraction
+    calls = [ ]
+    def add_to_sub(ast):
+        calls.append(ast)
+        return ast.make_like('__sub__', ast.args)
+
+    rw = traversal.Rewriter().register('__add__', add_to_sub)
+    r = rw.rewrite(e)
+    nose.tools.assert_is(r, (x - y) * (x - y) - 3)
+    # the shared x + y is only rewritten once
+    nose.tools.assert_equal(len(calls), 2)
+
+    # pre-callbacks replace whole subexpressions
+    r = traversal.rewrite(e, pre=lambda ast: claripy.BVV(1, 32) if ast is x + y else None)
+    nose.tools.assert_is(r, claripy.BVV(1, 32) * claripy.BVV(1, 32) + 3)
+
+    # a shared memo carries over between calls
+    memo = { }
+    seen = [ ]
+    rw = traversal.Rewriter(post=lambda ast: seen.append(ast))
+    rw.rewrite(e, memo=memo)
+    n = len(seen)
+    rw.rewrite_many([ e, x + y ], memo=memo)
+    nose.tools.assert_equal(len(seen), n)
+
+def test_excavate_shared():
+    x, y, e = _shared_dag(40)
+    start = time.perf_counter()
+    excavated = e.ite_excavated
+    l.info("excavated a shared DAG in %f seconds", time.perf_counter() - start)
+    nose.tools.assert_equal(excavated.op, 'If')
+
+
+if __name__ == '__main__':
+    test_orders()
+    test_shared_dag()
+    test_rewriter()
+    test_excavate_shared()
+    test_replacement_keys_and_leaf_order()